@@ -2,9 +2,12 @@
 # IMPORTS AND INITIAL SETUP
 # =============================================================================
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session,jsonify, Response
+from flask import Flask, render_template, request, redirect, url_for, flash, session,jsonify, Response, send_file, abort, g, has_request_context
+import click
 from pocketbase import PocketBase
 from pocketbase.client import ClientResponseError
+from pocketbase.services.record_service import RecordService
+from pocketbase.models.record import Record
 from apscheduler.schedulers.background import BackgroundScheduler
 import smtplib
 from email.mime.text import MIMEText
@@ -13,8 +16,44 @@ import requests
 from datetime import datetime, timedelta, timezone
 import requests
 import os
+import re
+import sys
+import json
+import base64
+import copy
+import time
+import uuid
+import queue
+import sqlite3
+import fcntl
+import atexit
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import gzip
+import zlib
+import hashlib
+import mimetypes
+import tempfile
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from math import ceil
 from functools import wraps
+from urllib.parse import urlsplit
+from werkzeug.utils import secure_filename
+from markupsafe import escape
+from jinja2 import nodes, FileSystemBytecodeCache
+from jinja2.ext import Extension
+from jinja2.utils import LRUCache
+import numpy as np
+import thumbnails
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 from flask_login import login_required, LoginManager, UserMixin, login_user, logout_user, current_user
 
 app = Flask(__name__)
@@ -42,7 +81,707 @@ PRODUCTS_PER_PAGE = 7
 INQUIRIES_PER_PAGE = 7
 SUPPLIERS_PER_PAGE = 7
 
-pb = PocketBase(POCKETBASE_URL)
+# Lists page on (created, id) cursors; set True to also skip the count query
+# behind the totals they show (?skipTotal=1 does the same per request)
+PAGINATION_SKIP_TOTAL = (os.getenv('PAGINATION_SKIP_TOTAL') or 'False') == 'True'
+
+# Local on-disk cache for proxied PocketBase files (product documents/photos)
+FILE_CACHE_DIR = os.getenv('FILE_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'files')
+FILE_CACHE_MAX_BYTES = int(os.getenv('FILE_CACHE_MAX_MB') or '512') * 1024 * 1024
+FILE_CACHE_MAX_AGE = 365 * 24 * 60 * 60  # PocketBase file names are content-unique
+PROXIED_FILE_COLLECTIONS = {PRODUCT_COLLECTION}
+
+# Thumbnails for uploaded documents, rendered in a background process pool
+PREVIEW_CACHE_DIR = os.getenv('PREVIEW_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'previews')
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv('PREVIEW_CACHE_MAX_MB') or '64') * 1024 * 1024
+PREVIEW_MAX_SIZE = 240  # px, longest edge
+PREVIEW_WORKERS = int(os.getenv('PREVIEW_WORKERS') or '2')
+PREVIEW_WAIT_SECONDS = 10
+
+# Compiled template bytecode (shared by all workers) and rendered row fragments
+TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'jinja')
+FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE') or '5000')
+
+# On-the-fly compression of HTML/JSON responses
+COMPRESSION_ENABLED = (os.getenv('COMPRESSION_ENABLED') or 'True') == 'True'
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES') or '1024')
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL') or '6')
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY') or '4')
+COMPRESSIBLE_RESPONSE_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv',
+    'application/json', 'application/javascript', 'image/svg+xml',
+}
+
+# Let a fronting nginx/apache stream cached files itself
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'False') == 'True'
+
+# Optional bearer token required to scrape /metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Logging: queue-backed so request threads never block on stdout
+LOG_LEVEL = (os.getenv('LOG_LEVEL') or ('DEBUG' if DEV_MODE else 'INFO')).upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS') or ''  # e.g. "rbl.suppliers=DEBUG,rbl.files=WARNING"
+LOG_FORMAT = os.getenv('LOG_FORMAT') or 'text'  # text | json
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE') or '1.0')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE') or '10000')
+
+# Users/roles are cached per worker; staff edits on this worker invalidate
+# immediately, other workers pick changes up within the TTL
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL') or '300')
+
+# Supplier -> products index; product writes on this worker update it
+# immediately, other workers' writes are picked up within the TTL
+SUPPLIER_INDEX_TTL = int(os.getenv('SUPPLIER_INDEX_TTL') or '300')
+
+# Bulk repricing and status changes: parallel PocketBase writes per request,
+# and the largest repricing selection allowed
+BULK_WRITE_CONCURRENCY = int(os.getenv('BULK_WRITE_CONCURRENCY') or '8')
+REPRICE_MAX_PRODUCTS = int(os.getenv('REPRICE_MAX_PRODUCTS') or '2000')
+
+# Deletes with more dependents than this finish in a background thread;
+# the orphan sweep runs every ORPHAN_SWEEP_HOURS (0, the default = only via the CLI)
+CASCADE_INLINE_LIMIT = int(os.getenv('CASCADE_INLINE_LIMIT') or '200')
+ORPHAN_SWEEP_HOURS = float(os.getenv('ORPHAN_SWEEP_HOURS') or '0')
+
+# Duplicate-customer lookup keys; customer writes on this worker update them
+CUSTOMER_MATCH_TTL = int(os.getenv('CUSTOMER_MATCH_TTL') or '300')
+
+# Optional read-only access to PocketBase's own SQLite file (pb_data/data.db)
+# for aggregate queries; empty = everything goes over HTTP. The app must be
+# able to read the -wal/-shm files next to it.
+PB_SQLITE_PATH = os.getenv('PB_SQLITE_PATH') or ''
+PB_SQLITE_POOL_SIZE = int(os.getenv('PB_SQLITE_POOL_SIZE') or '4')
+PB_SQLITE_RETRY_SECONDS = int(os.getenv('PB_SQLITE_RETRY_SECONDS') or '60')
+
+# Local SQLite replica of products/suppliers/customers (empty path disables it)
+REPLICA_PATH = os.getenv('REPLICA_PATH') or ''
+REPLICA_SYNC_SECONDS = int(os.getenv('REPLICA_SYNC_SECONDS') or '15')
+REPLICA_MAX_LAG_SECONDS = int(os.getenv('REPLICA_MAX_LAG_SECONDS') or '300')
+REPLICA_RECONCILE_EVERY = int(os.getenv('REPLICA_RECONCILE_EVERY') or '40')
+
+# Dashboard figures and customer counters: served from memory, refreshed in
+# the background once older than the soft TTL, recomputed inline past the hard TTL
+SUMMARY_SOFT_TTL = int(os.getenv('SUMMARY_SOFT_TTL') or '60')
+SUMMARY_HARD_TTL = int(os.getenv('SUMMARY_HARD_TTL') or '900')
+
+# Columnar inquiry snapshot behind /api/reports, rebuilt in the background
+ANALYTICS_REFRESH_SECONDS = int(os.getenv('ANALYTICS_REFRESH_SECONDS') or '300')
+
+# Identical PocketBase reads in flight at the same time share one call;
+# waiters give up after SINGLE_FLIGHT_WAIT_SECONDS and query on their own
+SINGLE_FLIGHT = (os.getenv('SINGLE_FLIGHT') or 'True') == 'True'
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv('SINGLE_FLIGHT_WAIT_SECONDS') or '30')
+
+# Outbound PocketBase calls share three pools: light for page views, heavy
+# for bulk/report routes, background for threads outside a request. Requests
+# arriving while their pool's queue is full get 503 + Retry-After right away;
+# light requests that make more than BULKHEAD_LIGHT_CALL_BUDGET calls continue
+# in the heavy pool. Background calls never time out, they only wait their turn
+BULKHEAD = (os.getenv('BULKHEAD') or 'True') == 'True'
+BULKHEAD_LIGHT_CONCURRENCY = int(os.getenv('BULKHEAD_LIGHT_CONCURRENCY') or '16')
+BULKHEAD_LIGHT_QUEUE = int(os.getenv('BULKHEAD_LIGHT_QUEUE') or '64')
+BULKHEAD_HEAVY_CONCURRENCY = int(os.getenv('BULKHEAD_HEAVY_CONCURRENCY') or '4')
+BULKHEAD_HEAVY_QUEUE = int(os.getenv('BULKHEAD_HEAVY_QUEUE') or '16')
+BULKHEAD_BACKGROUND_CONCURRENCY = int(os.getenv('BULKHEAD_BACKGROUND_CONCURRENCY') or '8')
+BULKHEAD_WAIT_SECONDS = float(os.getenv('BULKHEAD_WAIT_SECONDS') or '10')
+BULKHEAD_LIGHT_CALL_BUDGET = int(os.getenv('BULKHEAD_LIGHT_CALL_BUDGET') or '25')
+BULKHEAD_RETRY_AFTER = int(os.getenv('BULKHEAD_RETRY_AFTER') or '5')
+
+# Per-request PocketBase call tracing (profiling mode, on by default in DEV_MODE)
+PB_TRACE = (os.getenv('PB_TRACE') or str(DEV_MODE)) == 'True'
+PB_TRACE_PANEL = (os.getenv('PB_TRACE_PANEL') or 'False') == 'True'
+PB_TRACE_REPEAT_THRESHOLD = int(os.getenv('PB_TRACE_REPEAT_THRESHOLD') or '3')
+PB_TRACE_HISTORY = int(os.getenv('PB_TRACE_HISTORY') or '200')
+
+# =============================================================================
+# METRICS AND INSTRUMENTATION
+# =============================================================================
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Metric:
+    """Thread-safe counter, gauge or histogram rendered in Prometheus text format."""
+
+    registry = []
+
+    def __init__(self, name, help_text, kind, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+        Metric.registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @staticmethod
+    def _labels(names, values):
+        if not names:
+            return ''
+        escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+        return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            if self.kind != 'histogram':
+                lines.append(f"{self.name}{self._labels(self.labelnames, key)} {value}")
+                continue
+            for bound, count in zip(self.buckets, value):
+                lines.append(f"{self.name}_bucket{self._labels(self.labelnames + ('le',), key + (bound,))} {count}")
+            lines.append(f"{self.name}_bucket{self._labels(self.labelnames + ('le',), key + ('+Inf',))} {value[-1]}")
+            lines.append(f"{self.name}_sum{self._labels(self.labelnames, key)} {value[-2]}")
+            lines.append(f"{self.name}_count{self._labels(self.labelnames, key)} {value[-1]}")
+        return '\n'.join(lines)
+
+def render_metrics():
+    return '\n'.join(metric.render() for metric in Metric.registry) + '\n'
+
+HTTP_REQUEST_DURATION = Metric('http_request_duration_seconds', 'Flask request latency by route.', 'histogram', ('method', 'route', 'status'))
+HTTP_REQUESTS_IN_FLIGHT = Metric('http_requests_in_flight', 'Requests currently being handled, by route.', 'gauge', ('route',))
+PB_CALL_DURATION = Metric('pocketbase_call_duration_seconds', 'PocketBase SDK/requests call latency by collection and operation.', 'histogram', ('collection', 'operation', 'status'))
+PB_CALLS = Metric('pocketbase_calls_total', 'PocketBase SDK/requests calls by collection and operation.', 'counter', ('collection', 'operation', 'status'))
+PB_HTTP_REQUESTS = Metric('pocketbase_http_requests_total', 'HTTP round trips to PocketBase (get_full_list pages count separately).', 'counter', ('collection', 'method'))
+SMTP_SEND_DURATION = Metric('smtp_send_duration_seconds', 'Time to send one reminder email.', 'histogram', ('status',))
+REMINDER_JOB_DURATION = Metric('reminder_job_duration_seconds', 'Duration of check_and_send_reminders runs.', 'histogram', ('status',))
+REMINDERS_SENT = Metric('reminders_sent_total', 'Reminder emails sent.', 'counter')
+
+_PB_PATH_COLLECTION = re.compile(r'/api/(?:collections|files)/([^/?]+)')
+
+def pocketbase_collection_from_path(path):
+    match = _PB_PATH_COLLECTION.search(path)
+    return match.group(1) if match else 'other'
+
+def record_pocketbase_call(collection, operation, seconds, status, params=None):
+    """Record one logical PocketBase call (an SDK method or a raw requests call)."""
+    PB_CALLS.inc(collection=collection, operation=operation, status=status)
+    PB_CALL_DURATION.observe(seconds, collection=collection, operation=operation, status=status)
+    if has_request_context() and 'pb_trace' in g:
+        trace_pocketbase_call(collection, operation, seconds, status, params)
+
+# Query parameters are traced verbatim; anything else (record bodies, form
+# data) is reduced to its keys so passwords and notes never reach the trace
+_TRACE_QUERY_KEYS = {'filter', 'sort', 'expand', 'fields', 'page', 'perPage', 'skipTotal'}
+_TRACE_SKIPPED_KWARGS = {'headers', 'files', 'timeout', 'stream'}
+_TRACE_REDACTED_OPERATIONS = {'auth_with_password', 'request_password_reset'}
+_TRACE_LITERAL = re.compile(r'"[^"]*"|\'[^\']*\'|\b[a-z0-9]{15}\b|\b\d+(?:\.\d+)?\b')
+
+def _describe_trace_value(value):
+    if isinstance(value, dict):
+        return '{' + ', '.join(
+            f"{k}={value[k]}" if k in _TRACE_QUERY_KEYS else str(k) for k in value
+        ) + '}'
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return str(value)[:200]
+    return type(value).__name__
+
+def describe_pocketbase_params(operation, args, kwargs):
+    """Summarise call arguments for the tracer."""
+    if operation in _TRACE_REDACTED_OPERATIONS:
+        return '<redacted>'
+    parts = [_describe_trace_value(arg) for arg in args]
+    parts += [f"{k}={_describe_trace_value(v)}" for k, v in kwargs.items() if k not in _TRACE_SKIPPED_KWARGS]
+    return ', '.join(parts)
+
+def trace_pocketbase_call(collection, operation, seconds, status, params):
+    """Append a call to the current request's trace; same-shape calls share a key."""
+    params = params or ''
+    g.pb_trace.append({
+        'collection': collection,
+        'operation': operation,
+        'params': params,
+        'shape': f"{collection}.{operation}({_TRACE_LITERAL.sub('?', params)})",
+        'start_ms': round((time.perf_counter() - seconds - g.metrics_start) * 1000, 2),
+        'duration_ms': round(seconds * 1000, 2),
+        'status': status,
+    })
+
+_pb_call_state = threading.local()
+
+def _instrument_pb_operation(operation, method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Only the outermost call is recorded (get_full_list calls get_list)
+        depth = getattr(_pb_call_state, 'depth', 0)
+        _pb_call_state.depth = depth + 1
+        # Described up front: get_full_list mutates query_params while paging
+        params = describe_pocketbase_params(operation, args, kwargs) if PB_TRACE and depth == 0 else None
+        start = time.perf_counter()
+        status = 'ok'
+        collection = self.collection_id_or_name
+        key = single_flight_key(collection, operation, args, kwargs) \
+            if SINGLE_FLIGHT and depth == 0 and operation in _COALESCED_OPERATIONS else None
+        try:
+            if depth > 0:
+                return method(self, *args, **kwargs)
+            call = lambda: bulkhead_call(lambda: method(self, *args, **kwargs))
+            if key is None:
+                return call()
+            result, shared = pb_single_flight.do(key, call)
+            if shared:
+                PB_COALESCED_CALLS.inc(collection=collection, operation=operation)
+                return _copy_records(result)
+            return result
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            _pb_call_state.depth = depth
+            if operation in ('create', 'update', 'delete'):
+                pb_single_flight.forget(collection)
+            if depth == 0:
+                record_pocketbase_call(self.collection_id_or_name, operation, time.perf_counter() - start, status, params)
+    return wrapper
+
+class InstrumentedRecordService(RecordService):
+    pass
+
+for _operation in ('get_full_list', 'get_list', 'get_one', 'get_first_list_item',
+                   'create', 'update', 'delete', 'auth_with_password', 'request_password_reset'):
+    setattr(InstrumentedRecordService, _operation,
+            _instrument_pb_operation(_operation, getattr(RecordService, _operation)))
+
+class InstrumentedPocketBase(PocketBase):
+    """PocketBase client whose record services and HTTP calls feed the metrics."""
+
+    def collection(self, id_or_name):
+        if id_or_name not in self.record_services:
+            self.record_services[id_or_name] = InstrumentedRecordService(self, id_or_name)
+        return self.record_services[id_or_name]
+
+    def _send(self, path, req_config):
+        PB_HTTP_REQUESTS.inc(collection=pocketbase_collection_from_path(path), method=req_config.get('method', 'GET'))
+        return super()._send(path, req_config)
+
+class InstrumentedSession(requests.Session):
+    """requests session for direct PocketBase REST calls, with metrics."""
+
+    def request(self, method, url, *args, **kwargs):
+        collection = pocketbase_collection_from_path(url)
+        start = time.perf_counter()
+        status = 'error'
+        key = None
+        if SINGLE_FLIGHT and method.upper() == 'GET' and not kwargs.get('stream') and '/api/collections/' in url:
+            key = single_flight_key(collection, 'requests.get', (url,) + args, kwargs)
+        try:
+            if key is None:
+                PB_HTTP_REQUESTS.inc(collection=collection, method=method.upper())
+                response = bulkhead_call(lambda: super(InstrumentedSession, self).request(method, url, *args, **kwargs))
+            else:
+                def fetch():
+                    PB_HTTP_REQUESTS.inc(collection=collection, method='GET')
+                    return _read_response(bulkhead_call(
+                        lambda: super(InstrumentedSession, self).request(method, url, *args, **kwargs)))
+                response, shared = pb_single_flight.do(key, fetch)
+                if shared:
+                    PB_COALESCED_CALLS.inc(collection=collection, operation='requests.get')
+            status = 'ok' if response.status_code < 400 else 'error'
+            return response
+        finally:
+            if method.upper() != 'GET':
+                pb_single_flight.forget(collection)
+            operation = f"requests.{method.lower()}"
+            record_pocketbase_call(
+                collection, operation, time.perf_counter() - start, status,
+                params=describe_pocketbase_params(operation, (urlsplit(url).path,), kwargs) if PB_TRACE else None
+            )
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_start = time.perf_counter()
+    HTTP_REQUESTS_IN_FLIGHT.inc(route=g.metrics_route)
+
+@app.after_request
+def record_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if 'metrics_start' not in g:
+        return
+    HTTP_REQUESTS_IN_FLIGHT.dec(route=g.metrics_route)
+    HTTP_REQUEST_DURATION.observe(
+        time.perf_counter() - g.metrics_start,
+        method=request.method, route=g.metrics_route, status=g.get('metrics_status', 500)
+    )
+
+# =============================================================================
+# READ COALESCING
+# =============================================================================
+# Identical reads that overlap in time (a dozen staff opening the dashboard
+# at 9am) share one PocketBase call: the first caller makes it and the rest
+# wait for its result or exception. Waiters give up after
+# SINGLE_FLIGHT_WAIT_SECONDS and make the call themselves. Any write to a
+# collection detaches the reads in flight on it, so a read that starts after
+# a write never gets data from before it. Works per worker. Waiters get
+# shallow copies of the records, so attributes set in one request stay there.
+
+coalesce_log = logging.getLogger('rbl.coalesce')
+
+PB_COALESCED_CALLS = Metric('pocketbase_coalesced_calls_total', 'PocketBase reads answered by an identical call already in flight.', 'counter', ('collection', 'operation'))
+
+_COALESCED_OPERATIONS = {'get_full_list', 'get_list', 'get_one', 'get_first_list_item'}
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """At most one call per key in flight; concurrent callers with the same key share its outcome."""
+
+    def __init__(self, wait):
+        self.wait = wait
+        self.lock = threading.Lock()
+        self.flights = {}  # (collection, operation, arguments) -> _Flight
+
+    def do(self, key, fn):
+        """(result, shared): shared is True when another caller's call produced the result."""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+        if not leader:
+            if flight.done.wait(self.wait):
+                if flight.error is not None:
+                    if isinstance(flight.error, BackendBusy) and has_request_context():
+                        g.backend_busy = True  # answered 503 like the caller that hit the bulkhead
+                    raise flight.error
+                return flight.result, True
+            coalesce_log.warning("Gave up waiting %gs for %s.%s, querying directly", self.wait, key[0], key[1])
+            return fn(), False
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+            flight.done.set()
+
+    def forget(self, collection):
+        """Let later reads of `collection` start their own call instead of joining one in flight."""
+        with self.lock:
+            for key in [key for key in self.flights if key[0] == collection]:
+                del self.flights[key]
+
+pb_single_flight = SingleFlight(SINGLE_FLIGHT_WAIT_SECONDS)
+
+# Query parameters that only defeat caches; PocketBase ignores them, so reads
+# that differ only in these still share one call
+_CACHE_BUSTER_PARAMS = ('_ts',)
+
+def single_flight_key(collection, operation, args, kwargs):
+    """Hashable key for a read, or None if its arguments can't be normalised."""
+    kwargs = {name: {k: v for k, v in value.items() if k not in _CACHE_BUSTER_PARAMS}
+              if name in ('params', 'query_params') and isinstance(value, dict) else value
+              for name, value in kwargs.items()}
+    try:
+        return collection, operation, json.dumps([args, kwargs], sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return None
+
+def _copy_records(result):
+    """Shallow copy of an SDK read result (a record, a list of them, or a ListResult)."""
+    if isinstance(result, list):
+        return [copy.copy(record) for record in result]
+    if isinstance(getattr(result, 'items', None), list):
+        result = copy.copy(result)
+        result.items = [copy.copy(record) for record in result.items]
+        return result
+    return copy.copy(result)
+
+def _read_response(response):
+    response.content  # read the body once so every waiter can parse it
+    return response
+
+# =============================================================================
+# LOGGING
+# =============================================================================
+
+LOG_RECORDS_DROPPED = Metric('log_records_dropped_total', 'Log records dropped because the log queue was full.', 'counter')
+
+# Attributes every LogRecord has; anything else came in via `extra=`
+_STANDARD_LOG_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request ID (runs in the logging thread's caller)."""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id', '-') if has_request_context() else '-'
+        return True
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hand records to the listener thread; drop (and count) them when the queue is full."""
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only flatten args that
+        # may not survive until then (exceptions are rendered eagerly)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _STANDARD_LOG_ATTRS})
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def configure_logging():
+    """Route the `rbl` logger tree through a bounded queue to a stdout listener thread."""
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        stream.setFormatter(JsonLogFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(DebugSamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+    listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger('rbl')
+    for existing in list(root.handlers):
+        root.removeHandler(existing)  # app.py reloaded in the same process
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    for item in filter(None, (part.strip() for part in LOG_LEVELS.split(','))):
+        name, _, level = item.partition('=')
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+    return listener
+
+log_listener = configure_logging()
+log = logging.getLogger('rbl')
+
+@app.before_request
+def assign_request_id():
+    # Reuse an ID from the fronting proxy so its access log lines up with ours
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+
+@app.after_request
+def expose_request_id(response):
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    return response
+
+# =============================================================================
+# BULKHEADS
+# =============================================================================
+# Every outbound PocketBase call takes a slot in one of three pools, so routes
+# that pull whole collections can't use up the connections that page views
+# need. Requests to HEAVY_ENDPOINTS (and inquiry searches) use the heavy
+# pool. A light request that goes past BULKHEAD_LIGHT_CALL_BUDGET calls moves
+# to the heavy pool for the rest of its calls. Calls made outside a request
+# (bulk-write worker threads, cascade and summary jobs, the scheduler) use
+# the background pool, so a reprice or bulk status change never holds the
+# slots report queries are waiting for. When a pool's wait queue is full, new
+# requests for it are turned away with 503 + Retry-After before they do any
+# work, and a call from an admitted request that finds the queue full or
+# waits longer than BULKHEAD_WAIT_SECONDS fails the same way. Background
+# calls have no queue limit and always wait. Slots are held per call, not per
+# request, and a coalesced read only takes a slot for the caller that makes it.
+
+bulkhead_log = logging.getLogger('rbl.bulkhead')
+
+BULKHEAD_ACTIVE = Metric('pocketbase_bulkhead_active', 'PocketBase calls holding a bulkhead slot, by pool.', 'gauge', ('pool',))
+BULKHEAD_QUEUED = Metric('pocketbase_bulkhead_queued', 'PocketBase calls waiting for a bulkhead slot, by pool.', 'gauge', ('pool',))
+BULKHEAD_REJECTIONS = Metric('pocketbase_bulkhead_rejections_total', 'Requests or calls turned away by a bulkhead (queue_full, timeout).', 'counter', ('pool', 'reason'))
+BULKHEAD_BUDGET_EXCEEDED = Metric('pocketbase_call_budget_exceeded_total', 'Light requests moved to the heavy pool after exceeding their call budget.', 'counter', ('route',))
+
+HEAVY_ENDPOINTS = {
+    'reprice_preview', 'reprice_apply', 'bulk_update_inquiry_status', 'customer_duplicates',
+    'inquiry_funnel', 'reports_index', 'report_by', 'delete_product', 'delete_supplier', 'delete_customer',
+}
+_BULKHEAD_EXEMPT_ENDPOINTS = {'static', 'fingerprinted_asset', 'metrics', 'pb_trace_list', 'pb_trace_detail'}
+
+class BackendBusy(Exception):
+    """No PocketBase slot could be had in time; answered with 503 + Retry-After."""
+
+class Bulkhead:
+    """At most `limit` concurrent calls, with at most `queue_limit` callers waiting for a slot."""
+
+    def __init__(self, name, limit, queue_limit, wait):
+        self.name = name
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.wait = wait
+        self.cond = threading.Condition()
+        self.active = 0
+        self.queued = 0
+
+    def full(self):
+        """True when every slot is taken and the wait queue is at its limit."""
+        return self.active >= self.limit and self.queued >= self.queue_limit
+
+    def reject(self, reason):
+        BULKHEAD_REJECTIONS.inc(pool=self.name, reason=reason)
+        raise BackendBusy(f"PocketBase {self.name} pool is busy ({reason})")
+
+    def acquire(self, bounded=True):
+        """Wait for a slot; raises BackendBusy if the queue is full or after `wait` seconds, unless unbounded."""
+        with self.cond:
+            if self.active >= self.limit:
+                if bounded and self.queued >= self.queue_limit:
+                    self.reject('queue_full')
+                deadline = time.monotonic() + self.wait
+                self.queued += 1
+                BULKHEAD_QUEUED.set(self.queued, pool=self.name)
+                try:
+                    while self.active >= self.limit:
+                        remaining = deadline - time.monotonic() if bounded else None
+                        if remaining is not None and remaining <= 0:
+                            self.reject('timeout')
+                        self.cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+                    BULKHEAD_QUEUED.set(self.queued, pool=self.name)
+            self.active += 1
+            BULKHEAD_ACTIVE.set(self.active, pool=self.name)
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            BULKHEAD_ACTIVE.set(self.active, pool=self.name)
+            self.cond.notify()
+
+light_bulkhead = Bulkhead('light', BULKHEAD_LIGHT_CONCURRENCY, BULKHEAD_LIGHT_QUEUE, BULKHEAD_WAIT_SECONDS)
+heavy_bulkhead = Bulkhead('heavy', BULKHEAD_HEAVY_CONCURRENCY, BULKHEAD_HEAVY_QUEUE, BULKHEAD_WAIT_SECONDS)
+background_bulkhead = Bulkhead('background', BULKHEAD_BACKGROUND_CONCURRENCY, 0, 0)
+
+def request_bulkhead():
+    """Pool for the current request, from its endpoint and arguments."""
+    if request.endpoint in HEAVY_ENDPOINTS or (request.endpoint == 'get_inquiries' and request.args.get('search')):
+        return heavy_bulkhead
+    return light_bulkhead
+
+def bulkhead_call(fn):
+    """Run one outbound PocketBase call in a slot of the caller's pool."""
+    if not BULKHEAD:
+        return fn()
+    if has_request_context():
+        pool = g.get('bulkhead') or light_bulkhead
+        g.bulkhead_calls = g.get('bulkhead_calls', 0) + 1
+        if pool is light_bulkhead and g.bulkhead_calls > BULKHEAD_LIGHT_CALL_BUDGET:
+            bulkhead_log.info("%s went past %s PocketBase calls, moving to the heavy pool",
+                              g.get('metrics_route', request.path), BULKHEAD_LIGHT_CALL_BUDGET)
+            BULKHEAD_BUDGET_EXCEEDED.inc(route=g.get('metrics_route', 'unmatched'))
+            pool = g.bulkhead = heavy_bulkhead
+        try:
+            pool.acquire()
+        except BackendBusy:
+            g.backend_busy = True  # routes that catch every exception still answer 503
+            raise
+    else:
+        pool = background_bulkhead
+        pool.acquire(bounded=False)
+    try:
+        return fn()
+    finally:
+        pool.release()
+
+@app.before_request
+def admit_request():
+    if not BULKHEAD or request.endpoint in _BULKHEAD_EXEMPT_ENDPOINTS:
+        return None
+    g.bulkhead = request_bulkhead()
+    if g.bulkhead.full():
+        BULKHEAD_REJECTIONS.inc(pool=g.bulkhead.name, reason='queue_full')
+        return backend_busy_response()
+    return None
+
+@app.errorhandler(BackendBusy)
+def backend_busy(error):
+    bulkhead_log.warning("%s %s: %s", request.method, request.path, error)
+    return backend_busy_response()
+
+@app.after_request
+def busy_errors_to_503(response):
+    if g.get('backend_busy') and response.status_code >= 500:
+        return backend_busy_response()
+    return response
+
+def backend_busy_response():
+    message = "The server is busy, please try again in a few seconds."
+    if request.path.startswith('/api/') or request.accept_mimetypes.best == 'application/json':
+        response = app.make_response(json_response(message=message, success=False, status_code=503))
+    else:
+        response = app.make_response((render_template('500.html', current_year=datetime.now().year,
+                                                      status_code=503, title="Server Busy", message=message), 503))
+    response.headers['Retry-After'] = str(BULKHEAD_RETRY_AFTER)
+    return response
+
+# =============================================================================
+# POCKETBASE CLIENT
+# =============================================================================
+
+pb = InstrumentedPocketBase(POCKETBASE_URL)
+pb_http = InstrumentedSession()  # pooled connections for direct REST calls
 
 # =============================================================================
 # TEMPLATE CONTEXT PROCESSORS
@@ -52,6 +791,93 @@ pb = PocketBase(POCKETBASE_URL)
 def inject_version():
     return dict(version=VERSION) 
 
+# =============================================================================
+# TEMPLATE CACHING
+# =============================================================================
+
+fragment_cache = LRUCache(FRAGMENT_CACHE_SIZE)
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache "name", key1, key2 %}...{% endcache %}
+
+    Caches the rendered block in memory under the given key parts. Keys
+    should include the record ID and its `updated` timestamp (plus anything
+    else the block shows) so edits produce a new entry.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.List(key_parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        if DEV_MODE:
+            return caller()  # templates reload in dev mode; keep output fresh
+        key = tuple(str(part) for part in key_parts)
+        rendered = fragment_cache.get(key)
+        if rendered is None:
+            rendered = caller()
+            fragment_cache[key] = rendered
+        return rendered
+
+app.jinja_env.add_extension(FragmentCacheExtension)
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+# =============================================================================
+# STATIC ASSET PIPELINE
+# =============================================================================
+
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+COMPRESSIBLE_ASSET_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+def build_asset_manifest(static_dir):
+    """Fingerprint every static file and precompress the text ones once."""
+    manifest = {}  # "js/notifications.js" -> "js/notifications.<hash>.js"
+    assets = {}    # fingerprinted name -> mimetype, etag and encoded bodies
+    for dirpath, _, filenames in os.walk(static_dir):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, ext = os.path.splitext(rel_path)
+            hashed_path = f"{stem}.{digest}{ext}"
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+            variants = {'identity': data}
+            if mimetype.startswith(COMPRESSIBLE_ASSET_TYPES):
+                gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(gzipped) < len(data):
+                    variants['gzip'] = gzipped
+                if brotli is not None:
+                    brotlied = brotli.compress(data, quality=11)
+                    if len(brotlied) < len(data):
+                        variants['br'] = brotlied
+
+            manifest[rel_path] = hashed_path
+            assets[hashed_path] = {'mimetype': mimetype, 'etag': digest, 'variants': variants}
+    return manifest, assets
+
+asset_manifest, asset_files = build_asset_manifest(app.static_folder)
+
+@app.template_global()
+def static_url(filename):
+    """URL of the fingerprinted copy of a static file (plain /static/ in dev mode)."""
+    hashed_path = asset_manifest.get(filename)
+    if DEV_MODE or hashed_path is None:
+        return url_for('static', filename=filename)
+    return url_for('fingerprinted_asset', filename=hashed_path)
+
 # =============================================================================
 # UTILITY FUNCTIONS
 # =============================================================================
@@ -71,15 +897,17 @@ def parse_iso_datetime_with_tz(dt_str):
     return dt
 
 def build_file_urls(record):
-    """Build file URLs for uploaded documents in a PocketBase record."""
-    base_url = f"{POCKETBASE_URL}/api/files/{COLLECTION}/{record['id']}"
+    """Build proxied file URLs for uploaded documents in a PocketBase record."""
     files = record.get('uploaded_docs', [])
     if not isinstance(files, list):
         files = [files]
-    return [f"{base_url}/{f}" for f in files]
+    return [
+        url_for('proxy_file', collection=COLLECTION, record_id=record['id'], filename=f)
+        for f in files if f
+    ]
 
 def generate_next_product_id():
-    res = requests.get(f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records", headers=HEADERS, params={"perPage": 100})
+    res = pb_http.get(f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records", headers=HEADERS, params={"perPage": 100})
     res.raise_for_status()
     products = res.json().get("items", [])
 
@@ -98,7 +926,7 @@ def generate_next_product_id():
     return f"{prefix}{str(next_num).zfill(4)}"
 
 def generate_next_customer_id():
-    res = requests.get(f"{POCKETBASE_URL}/api/collections/{CUSTOMER_COLLECTION}/records", headers=HEADERS, params={"perPage": 100})
+    res = pb_http.get(f"{POCKETBASE_URL}/api/collections/{CUSTOMER_COLLECTION}/records", headers=HEADERS, params={"perPage": 100})
     res.raise_for_status()
     products = res.json().get("items", [])
 
@@ -116,6 +944,1258 @@ def generate_next_customer_id():
     next_num = max_num + 1
     return f"{prefix}{str(next_num).zfill(4)}"
 
+# =============================================================================
+# KEYSET PAGINATION
+# =============================================================================
+# Newest-first lists are paged on (created, id) instead of page offsets: each
+# page asks for the rows strictly after (or before) the boundary row of the
+# last one, so deep pages cost the same as the first and rows don't shift when
+# new records arrive. Cursor tokens are opaque base64 JSON of
+# [direction, created, id]. Raw JSON is used because the SDK truncates
+# `created` to whole seconds, which would reorder ties.
+
+_CURSOR_CREATED = re.compile(r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(\.\d+)?Z$')
+_CURSOR_ID = re.compile(r'^[A-Za-z0-9_]+$')
+
+def encode_cursor(direction, created, record_id):
+    raw = json.dumps([direction, created, record_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """(direction, created, id) from a cursor token, or None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        direction, created, record_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    # Both values end up inside a filter expression
+    if (direction not in ('next', 'prev') or not isinstance(created, str) or not isinstance(record_id, str)
+            or not _CURSOR_CREATED.match(created) or not _CURSOR_ID.match(record_id)):
+        return None
+    return direction, created, record_id
+
+def skip_total_requested():
+    value = request.args.get('skipTotal')
+    if value is None:
+        return PAGINATION_SKIP_TOTAL
+    return value.lower() in ('1', 'true')
+
+def count_records(collection, filter_str=''):
+    params = {"page": 1, "perPage": 1, "fields": "id"}
+    if filter_str:
+        params["filter"] = filter_str
+    res = pb_http.get(f"{POCKETBASE_URL}/api/collections/{collection}/records", headers=HEADERS, params=params)
+    res.raise_for_status()
+    return res.json().get("totalItems", 0)
+
+def filter_literal(text):
+    """`text` as a double-quoted PocketBase filter string."""
+    return '"' + str(text).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def search_filter(fields, text):
+    """PocketBase filter matching `text` in any of `fields`, or '' when there is nothing to search."""
+    return ' || '.join(f'{field} ~ {filter_literal(text)}' for field in fields) if text else ''
+
+def _pocketbase_page(collection, per_page, position, filter_str, skip_total, params):
+    filters = [f'({filter_str})'] if filter_str else []
+    sort = '-created,-id'
+    if position:
+        direction, created, record_id = position
+        if direction == 'next':
+            filters.append(f'(created < "{created}" || (created = "{created}" && id < "{record_id}"))')
+        else:
+            filters.append(f'(created > "{created}" || (created = "{created}" && id > "{record_id}"))')
+            sort = 'created,id'
+
+    # Only the first page gets its total for free; later pages count separately
+    query = dict(params or {}, page=1, perPage=per_page + 1, sort=sort,
+                 skipTotal='true' if skip_total or position else 'false')
+    if filters:
+        query["filter"] = " && ".join(filters)
+    res = pb_http.get(f"{POCKETBASE_URL}/api/collections/{collection}/records", headers=HEADERS, params=query)
+    res.raise_for_status()
+    data = res.json()
+
+    if skip_total:
+        total = None
+    elif position:
+        total = count_records(collection, filter_str)
+    else:
+        total = data.get("totalItems", 0)
+    return data.get("items", []), total
+
+def keyset_page(collection, per_page, cursor=None, filter_str='', skip_total=False, params=None,
+                search_fields=(), search=''):
+    """One newest-first page of raw records next to `cursor`.
+
+    Returns {"items", "next", "prev", "total"}: next/prev are cursor tokens
+    (None at either end) and total is None when skip_total is set. `search`
+    matches any of `search_fields` like PocketBase's `~`. Collections in the
+    local replica are paged from it unless a filter_str is given as well.
+    """
+    position = decode_cursor(cursor)
+    if not filter_str and replica.serves(collection):
+        rows, total = replica.page(collection, per_page + 1, position, search_fields, search, count=not skip_total)
+    else:
+        combined = " && ".join(f'({f})' for f in (filter_str, search_filter(search_fields, search)) if f)
+        try:
+            rows, total = _pocketbase_page(collection, per_page, position, combined, skip_total, params)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 400:
+                raise
+            # A search PocketBase can't parse matches nothing
+            log.warning("PocketBase rejected the filter for %s: %s", collection, combined)
+            return {"items": [], "next": None, "prev": None, "total": None if skip_total else 0}
+
+    if position and not rows:
+        # Everything past the boundary was deleted; start over
+        return keyset_page(collection, per_page, None, filter_str, skip_total, params, search_fields, search)
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if position and position[0] == 'prev':
+        rows.reverse()
+        has_newer, has_older = more, True
+    else:
+        has_newer, has_older = position is not None, more
+
+    return {
+        "items": rows,
+        "next": encode_cursor('next', rows[-1]['created'], rows[-1]['id']) if rows and has_older else None,
+        "prev": encode_cursor('prev', rows[0]['created'], rows[0]['id']) if rows and has_newer else None,
+        "total": total,
+    }
+
+def keyset_slice(records, per_page, cursor=None):
+    """keyset_page over an already filtered, newest-first list of SDK records."""
+    position = decode_cursor(cursor)
+    created_at = lambda r: _pb_datetime(getattr(r, 'created', ''))
+    start, end = 0, per_page
+    if position:
+        direction, created, record_id = position
+        index = next((i for i, r in enumerate(records) if r.id == record_id), None)
+        if direction == 'next':
+            if index is None:
+                index = next((i for i, r in enumerate(records) if created_at(r) < created), len(records)) - 1
+            start = index + 1
+            end = start + per_page
+        else:
+            if index is None:
+                index = next((i for i, r in enumerate(records) if created_at(r) <= created), len(records))
+            end = index
+            start = max(end - per_page, 0)
+    rows = records[start:end]
+    return {
+        "items": rows,
+        "next": encode_cursor('next', created_at(rows[-1]), rows[-1].id) if rows and end < len(records) else None,
+        "prev": encode_cursor('prev', created_at(rows[0]), rows[0].id) if rows and start > 0 else None,
+        "total": len(records),
+    }
+
+# =============================================================================
+# FILE CACHE
+# =============================================================================
+
+_SAFE_RECORD_ID = re.compile(r'^[A-Za-z0-9_]+$')
+
+class FileCache:
+    """Size-bounded LRU cache of PocketBase files kept on local disk."""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # path -> size, least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.fetch_locks = {}  # path -> [lock, threads using it]
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU index from files left by a previous run."""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if '.tmp-' in name:
+                    os.remove(path)
+                    continue
+                st = os.stat(path)
+                found.append((st.st_mtime, path, st.st_size))
+        for _, path, size in sorted(found):
+            self.entries[path] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            path, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def path_for(self, collection, record_id, filename):
+        return os.path.join(self.root, collection, record_id, filename)
+
+    def get(self, path):
+        """Return path if cached, marking it as most recently used."""
+        with self.lock:
+            if path not in self.entries:
+                return None
+            self.entries.move_to_end(path)
+        return path
+
+    def fetch(self, collection, record_id, filename):
+        """Return a local path for the file, downloading it from PocketBase on a miss."""
+        path = self.path_for(collection, record_id, filename)
+        if self.get(path):
+            return path
+
+        # One download per file, even when several requests miss at once; the
+        # lock is dropped only after its last waiter, so a latecomer can't
+        # start a second download with a fresh lock
+        with self.lock:
+            entry = self.fetch_locks.setdefault(path, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                if not self.get(path):
+                    self._download(collection, record_id, filename, path)
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.fetch_locks[path]
+        return path
+
+    def _download(self, collection, record_id, filename, path):
+        url = f"{POCKETBASE_URL}/api/files/{collection}/{record_id}/{filename}"
+        with pb_http.get(url, headers=HEADERS, stream=True, timeout=30) as resp:
+            resp.raise_for_status()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    for chunk in resp.iter_content(chunk_size=64 * 1024):
+                        out.write(chunk)
+                os.replace(tmp_path, path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+        self.add(path)
+
+    def add(self, path):
+        """Account for a file written into the cache directory."""
+        size = os.path.getsize(path)
+        with self.lock:
+            self.total_bytes += size - self.entries.pop(path, 0)
+            self.entries[path] = size
+            self._evict()
+
+    def forget(self, path):
+        """Drop an entry whose file is already gone (evicted by another worker sharing the directory)."""
+        with self.lock:
+            self.total_bytes -= self.entries.pop(path, 0)
+
+    def discard_record(self, collection, record_id):
+        """Drop every cached file belonging to a record."""
+        prefix = os.path.join(self.root, collection, record_id) + os.sep
+        with self.lock:
+            for path in [p for p in self.entries if p.startswith(prefix)]:
+                self.total_bytes -= self.entries.pop(path)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+file_cache = FileCache(FILE_CACHE_DIR, FILE_CACHE_MAX_BYTES)
+
+# =============================================================================
+# DOCUMENT PREVIEWS
+# =============================================================================
+
+preview_log = logging.getLogger('rbl.previews')
+
+preview_cache = FileCache(PREVIEW_CACHE_DIR, PREVIEW_CACHE_MAX_BYTES)
+
+# Threads fetch originals and wait on a process pool that does the CPU-heavy
+# decoding and resizing away from the request threads. The pool is started
+# on the first preview, from a fork server (see thumbnails.start_pool), not at
+# import: daemon processes such as benchmarks/loadtest.py may not have
+# children, and forking the running app would copy locks held by its threads.
+# Under `python app.py` each worker imports app.py once more as __mp_main__,
+# as multiprocessing does for its entry script. A pool whose worker died is
+# replaced on the next preview.
+_preview_jobs = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix='preview')
+_preview_futures = {}
+_preview_lock = threading.Lock()
+_preview_pool = None
+_preview_pool_lock = threading.Lock()
+
+def _get_preview_pool():
+    global _preview_pool
+    with _preview_pool_lock:
+        if _preview_pool is None:
+            _preview_pool = thumbnails.start_pool(PREVIEW_WORKERS)
+        return _preview_pool
+
+def _discard_preview_pool(pool):
+    global _preview_pool
+    with _preview_pool_lock:
+        if _preview_pool is pool:
+            _preview_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def preview_path_for(collection, record_id, filename):
+    return preview_cache.path_for(collection, record_id, filename + '.jpg')
+
+def _build_preview(collection, record_id, filename):
+    dst_path = preview_path_for(collection, record_id, filename)
+    if preview_cache.get(dst_path):
+        return dst_path
+    src_path = file_cache.fetch(collection, record_id, filename)
+    pool = _get_preview_pool()
+    try:
+        pool.submit(thumbnails.render_preview, src_path, dst_path, PREVIEW_MAX_SIZE).result()
+    except BrokenProcessPool:
+        preview_log.warning("Preview worker died, starting a new pool on the next preview")
+        _discard_preview_pool(pool)
+        raise
+    preview_cache.add(dst_path)
+    return dst_path
+
+def _preview_done(dst_path, future):
+    with _preview_lock:
+        _preview_futures.pop(dst_path, None)
+    if future.exception():
+        preview_log.warning("Error generating preview %s: %s", dst_path, future.exception())
+
+def schedule_preview(collection, record_id, filename):
+    """Queue thumbnail generation for a file; returns a Future of the preview path."""
+    dst_path = preview_path_for(collection, record_id, filename)
+    with _preview_lock:
+        future = _preview_futures.get(dst_path)
+        is_new = future is None
+        if is_new:
+            future = _preview_jobs.submit(_build_preview, collection, record_id, filename)
+            _preview_futures[dst_path] = future
+    if is_new:
+        future.add_done_callback(lambda f: _preview_done(dst_path, f))
+    return future
+
+def schedule_record_previews(collection, record):
+    """Queue thumbnails for every previewable document on a record."""
+    files = record.get('uploaded_docs', [])
+    if not isinstance(files, list):
+        files = [files]
+    for f in files:
+        if f and thumbnails.can_preview(f):
+            schedule_preview(collection, record['id'], f)
+
+def build_preview_urls(record):
+    """Preview URLs aligned with build_file_urls() (None where no preview is possible)."""
+    files = record.get('uploaded_docs', [])
+    if not isinstance(files, list):
+        files = [files]
+    return [
+        url_for('preview_file', collection=COLLECTION, record_id=record['id'], filename=f)
+        if thumbnails.can_preview(f) else None
+        for f in files if f
+    ]
+
+# =============================================================================
+# ANALYTICS SNAPSHOT
+# =============================================================================
+# Inquiries joined with their product, supplier and customer as NumPy
+# columns. Foreign keys are dictionary-encoded as int32 codes (0 = unknown)
+# so group-bys are a single np.bincount over the snapshot.
+
+REPORT_DIMENSIONS = ('customer', 'supplier', 'product', 'status', 'month')
+
+def _to_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _first_id(value):
+    if isinstance(value, list):
+        return value[0] if value else ''
+    return value or ''
+
+class AnalyticsSnapshot:
+    """Immutable columnar view of all inquiries, built from four full-list reads."""
+
+    def __init__(self, inquiries, products, customers, suppliers, statuses):
+        self.built_at = datetime.now(timezone.utc)
+
+        self.customer_ids = [''] + [c.id for c in customers]
+        self.customer_labels = ['Unknown'] + [getattr(c, 'name', '') or c.id for c in customers]
+        self.supplier_ids = [''] + [s.id for s in suppliers]
+        self.supplier_labels = ['Unknown'] + [getattr(s, 'name', '') or s.id for s in suppliers]
+        self.product_ids = [''] + [p.id for p in products]
+        self.product_labels = ['Unknown'] + [getattr(p, 'name', '') or p.id for p in products]
+        self.status_ids = list(statuses) + ['Other']
+        self.status_labels = self.status_ids
+
+        self.customer_code = customer_code = {cid: i for i, cid in enumerate(self.customer_ids) if cid}
+        product_code = {pid: i for i, pid in enumerate(self.product_ids) if pid}
+        supplier_code = {sid: i for i, sid in enumerate(self.supplier_ids) if sid}
+        self.status_code = status_code = {status: i for i, status in enumerate(statuses)}
+
+        # Per-product attributes, indexed by product code
+        self.product_price = np.array([0.0] + [_to_float(getattr(p, 'price', 0)) for p in products])
+        self.product_buying = np.array([0.0] + [_to_float(getattr(p, 'buying_rate', 0)) for p in products])
+        self.product_selling = np.array([0.0] + [_to_float(getattr(p, 'selling_rate', 0)) for p in products])
+        self.product_supplier = np.array(
+            [0] + [supplier_code.get(_first_id(getattr(p, 'supplier', '')), 0) for p in products], dtype=np.int32
+        )
+
+        n = len(inquiries)
+        self.customer = np.fromiter((customer_code.get(getattr(i, 'customer_id', ''), 0) for i in inquiries), np.int32, n)
+        self.product = np.fromiter((product_code.get(getattr(i, 'product_id', ''), 0) for i in inquiries), np.int32, n)
+        self.supplier = self.product_supplier[self.product]
+        self.status = np.fromiter(
+            (status_code.get(getattr(i, 'status', ''), len(statuses)) for i in inquiries), np.int16, n
+        )
+        # Same fallback as the dashboard always used: a missing quantity counts as 1
+        self.quantity = np.fromiter((int(_to_float(getattr(i, 'quantity', 1)) or 1) for i in inquiries), np.int64, n)
+        self.created = np.array([str(getattr(i, 'created', ''))[:10] or 'NaT' for i in inquiries], dtype='datetime64[D]')
+
+        self.revenue = self.quantity * self.product_price[self.product]
+        self.cost = self.quantity * self.product_buying[self.product]
+        self.quoted = self.quantity * self.product_selling[self.product]
+
+    def __len__(self):
+        return len(self.quantity)
+
+    def mask(self, start=None, end=None, status=None, customer_id=None):
+        """Boolean row filter; dates are inclusive YYYY-MM-DD strings."""
+        keep = np.ones(len(self), dtype=bool)
+        if start:
+            keep &= self.created >= np.datetime64(start, 'D')
+        if end:
+            keep &= self.created <= np.datetime64(end, 'D')
+        if status:
+            keep &= self.status == self.status_code.get(status, -1)
+        if customer_id:
+            keep &= self.customer == self.customer_code.get(customer_id, -1)
+        return keep
+
+    def group_by(self, dimension, keep, sort='revenue', limit=None):
+        """Sum the measures per dimension value over the rows selected by `keep`.
+
+        Returns (rows, totals); rows are sorted by `sort` ('key' or a measure)
+        and cut to `limit` before any per-row Python work is done.
+        """
+        if dimension == 'month':
+            months, codes = np.unique(self.created[keep].astype('datetime64[M]'), return_inverse=True)
+            ids = labels = [str(m) for m in months]
+        else:
+            codes = getattr(self, dimension)[keep]
+            ids = getattr(self, f"{dimension}_ids")
+            labels = getattr(self, f"{dimension}_labels")
+
+        size = len(ids)
+        sums = {
+            'inquiries': np.bincount(codes, minlength=size),
+            'quantity': np.bincount(codes, weights=self.quantity[keep], minlength=size),
+            'revenue': np.bincount(codes, weights=self.revenue[keep], minlength=size),
+            'cost': np.bincount(codes, weights=self.cost[keep], minlength=size),
+            'quoted': np.bincount(codes, weights=self.quoted[keep], minlength=size),
+        }
+        sums['margin'] = sums['revenue'] - sums['cost']
+
+        present = np.flatnonzero(sums['inquiries'])
+        if sort == 'key':
+            order = sorted(present, key=lambda i: ids[i])
+        else:
+            order = present[np.argsort(-sums[sort][present], kind='stable')]
+        if limit:
+            order = order[:limit]
+
+        rows = []
+        for i in order:
+            revenue, margin = float(sums['revenue'][i]), float(sums['margin'][i])
+            rows.append({
+                'key': ids[i],
+                'label': labels[i],
+                'inquiries': int(sums['inquiries'][i]),
+                'quantity': int(sums['quantity'][i]),
+                'revenue': round(revenue, 2),
+                'cost': round(float(sums['cost'][i]), 2),
+                'margin': round(margin, 2),
+                'margin_pct': round(margin / revenue * 100, 2) if revenue else None,
+                'quoted': round(float(sums['quoted'][i]), 2),
+            })
+
+        totals = {key: round(float(values.sum()), 2) for key, values in sums.items()}
+        totals['inquiries'] = int(totals['inquiries'])
+        totals['margin_pct'] = round(totals['margin'] / totals['revenue'] * 100, 2) if totals['revenue'] else None
+        return rows, totals
+
+_analytics_snapshot = None
+_analytics_lock = threading.Lock()
+_analytics_refreshing = threading.Event()
+
+def build_analytics_snapshot():
+    inquiry_fields = 'id,customer_id,product_id,quantity,status,created'
+    return AnalyticsSnapshot(
+        pb.collection(INQUIRY_COLLECTION).get_full_list(batch=1000, query_params={"fields": inquiry_fields}),
+        pb.collection(PRODUCT_COLLECTION).get_full_list(batch=1000),
+        pb.collection(CUSTOMER_COLLECTION).get_full_list(batch=1000),
+        pb.collection(SUPPLIER_COLLECTION).get_full_list(batch=1000),
+        [status for status, _, _ in status_order],
+    )
+
+def _refresh_analytics_snapshot():
+    global _analytics_snapshot
+    try:
+        _analytics_snapshot = build_analytics_snapshot()
+    except Exception:
+        log.exception("Error rebuilding analytics snapshot")
+    finally:
+        _analytics_refreshing.clear()
+
+def get_analytics_snapshot():
+    """Current snapshot; built inline the first time, then refreshed in the background when stale."""
+    global _analytics_snapshot
+    snapshot = _analytics_snapshot
+    if snapshot is None:
+        with _analytics_lock:
+            if _analytics_snapshot is None:
+                _analytics_snapshot = build_analytics_snapshot()
+            return _analytics_snapshot
+
+    age = (datetime.now(timezone.utc) - snapshot.built_at).total_seconds()
+    if age > ANALYTICS_REFRESH_SECONDS:
+        with _analytics_lock:
+            if not _analytics_refreshing.is_set():
+                _analytics_refreshing.set()
+                threading.Thread(target=_refresh_analytics_snapshot, daemon=True).start()
+    return snapshot
+
+# =============================================================================
+# CUSTOMER SUMMARIES
+# =============================================================================
+# Denormalised per-customer figures stored on the Customers collection
+# (number fields inquiry_count, open_count, total_amount; date field
+# last_inquiry_at). PocketBase has no cross-collection transactions, so each
+# inquiry write queues a recompute of the affected customer from its own
+# inquiries, run after the response; that stays correct when writes race.
+# A product price change does the same for every customer with an inquiry
+# on that product, since total_amount is price × quantity.
+# `flask rebuild-customer-summaries` recomputes every customer in bulk and
+# repairs any drift.
+
+summary_log = logging.getLogger('rbl.customers.summary')
+
+SUMMARY_FIELDS = ('inquiry_count', 'open_count', 'total_amount', 'last_inquiry_at')
+SUMMARY_INQUIRY_FIELDS = 'id,customer_id,product_id,quantity,status,created'
+SUMMARY_ID_CHUNK = 50  # ids per `id = "..." || ...` filter, keeps URLs short
+
+def _pb_datetime(value):
+    """PocketBase date string; the SDK parses dates to whole seconds."""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S.000Z')
+    return value or ''
+
+def empty_customer_summary():
+    return {'inquiry_count': 0, 'open_count': 0, 'total_amount': 0.0, 'last_inquiry_at': ''}
+
+def summarize_customer_inquiries(inquiries, prices):
+    """Summary fields per customer id; amounts are price × quantity, as on the dashboard."""
+    summaries = {}
+    for inquiry in inquiries:
+        customer_id = getattr(inquiry, 'customer_id', '')
+        if not customer_id:
+            continue
+        summary = summaries.get(customer_id)
+        if summary is None:
+            summary = summaries[customer_id] = empty_customer_summary()
+        summary['inquiry_count'] += 1
+        if getattr(inquiry, 'status', '') != 'Closed':
+            summary['open_count'] += 1
+        quantity = int(_to_float(getattr(inquiry, 'quantity', 1)) or 1)
+        summary['total_amount'] += quantity * prices.get(getattr(inquiry, 'product_id', ''), 0.0)
+        created = _pb_datetime(getattr(inquiry, 'created', ''))
+        if created > summary['last_inquiry_at']:
+            summary['last_inquiry_at'] = created
+    for summary in summaries.values():
+        summary['total_amount'] = round(summary['total_amount'], 2)
+    return summaries
+
+def product_prices(product_ids=None):
+    """Price per product id, for the given products or (None) all of them."""
+    query = {"fields": "id,price"}
+    if product_ids is None:
+        products = pb.collection(PRODUCT_COLLECTION).get_full_list(batch=1000, query_params=query)
+    else:
+        ids = sorted(set(filter(None, product_ids)))
+        products = []
+        for start in range(0, len(ids), SUMMARY_ID_CHUNK):
+            chunk = ids[start:start + SUMMARY_ID_CHUNK]
+            products += pb.collection(PRODUCT_COLLECTION).get_full_list(query_params=dict(
+                query, filter=" || ".join(f'id = "{product_id}"' for product_id in chunk)
+            ))
+    return {p.id: _to_float(getattr(p, 'price', 0)) for p in products}
+
+def refresh_customer_summaries(*customer_ids):
+    """Recompute and store the summary of each given customer; failures are logged, never raised."""
+    for customer_id in {c for c in customer_ids if c}:
+        try:
+            inquiries = pb.collection(INQUIRY_COLLECTION).get_full_list(batch=500, query_params={
+                "filter": f'customer_id = "{customer_id}"',
+                "fields": SUMMARY_INQUIRY_FIELDS,
+            })
+            prices = product_prices(getattr(i, 'product_id', '') for i in inquiries)
+            summary = summarize_customer_inquiries(inquiries, prices).get(customer_id) or empty_customer_summary()
+            pb.collection(CUSTOMER_COLLECTION).update(customer_id, summary)
+            replica.reload(CUSTOMER_COLLECTION, customer_id)
+        except ClientResponseError as e:
+            summary_log.warning("Could not refresh summary of customer %s: %s", customer_id, e)
+
+# Inquiry writes refresh summaries after the response: a couple of threads
+# work through the queue, and a customer already waiting in it isn't added twice
+_summary_jobs = ThreadPoolExecutor(max_workers=2, thread_name_prefix='summaries')
+_summary_pending = set()
+_summary_pending_lock = threading.Lock()
+
+def schedule_summary_refresh(*customer_ids):
+    """Queue refresh_customer_summaries() for the given customers on a background thread."""
+    with _summary_pending_lock:
+        queued = {c for c in customer_ids if c} - _summary_pending
+        _summary_pending.update(queued)
+    for customer_id in queued:
+        _summary_jobs.submit(_run_summary_refresh, customer_id)
+
+def _run_summary_refresh(customer_id):
+    # Leave the queue before reading, so a write made meanwhile queues another pass
+    with _summary_pending_lock:
+        _summary_pending.discard(customer_id)
+    refresh_customer_summaries(customer_id)
+
+def schedule_price_refresh(*product_ids):
+    """After a price change, queue a summary refresh for every customer with an inquiry on these products."""
+    product_ids = sorted({p for p in product_ids if p})
+    if product_ids:
+        _summary_jobs.submit(_run_price_refresh, product_ids)
+
+def _run_price_refresh(product_ids):
+    customer_ids = set()
+    for start in range(0, len(product_ids), SUMMARY_ID_CHUNK):
+        chunk = product_ids[start:start + SUMMARY_ID_CHUNK]
+        try:
+            inquiries = pb.collection(INQUIRY_COLLECTION).get_full_list(batch=500, query_params={
+                "filter": " || ".join(f'product_id = "{product_id}"' for product_id in chunk),
+                "fields": "customer_id",
+            })
+        except ClientResponseError as e:
+            summary_log.warning("Could not find customers of repriced products: %s", e)
+            continue
+        customer_ids.update(getattr(i, 'customer_id', '') for i in inquiries)
+    schedule_summary_refresh(*customer_ids)
+
+def _summary_matches(customer, summary):
+    return (
+        int(_to_float(getattr(customer, 'inquiry_count', None))) == summary['inquiry_count']
+        and int(_to_float(getattr(customer, 'open_count', None))) == summary['open_count']
+        and round(_to_float(getattr(customer, 'total_amount', None)), 2) == summary['total_amount']
+        and _pb_datetime(getattr(customer, 'last_inquiry_at', '')) == summary['last_inquiry_at']
+    )
+
+def rebuild_customer_summaries():
+    """Recompute every customer's summary from three full-list reads; returns (checked, updated)."""
+    inquiries = pb.collection(INQUIRY_COLLECTION).get_full_list(
+        batch=1000, query_params={"fields": SUMMARY_INQUIRY_FIELDS}
+    )
+    summaries = summarize_customer_inquiries(inquiries, product_prices())
+    customers = pb.collection(CUSTOMER_COLLECTION).get_full_list(
+        batch=1000, query_params={"fields": "id," + ",".join(SUMMARY_FIELDS)}
+    )
+    updated = 0
+    for customer in customers:
+        summary = summaries.get(customer.id) or empty_customer_summary()
+        if not _summary_matches(customer, summary):
+            pb.collection(CUSTOMER_COLLECTION).update(customer.id, summary)
+            updated += 1
+    if updated and replica.enabled:
+        # Replica-backed customer pages would otherwise show the old figures until the next sync
+        replica.sync(CUSTOMER_COLLECTION)
+    return len(customers), updated
+
+@app.cli.command('rebuild-customer-summaries')
+def rebuild_customer_summaries_command():
+    """Recompute inquiry_count, open_count, total_amount and last_inquiry_at for all customers."""
+    ensure_admin_auth()
+    checked, updated = rebuild_customer_summaries()
+    click.echo(f"{checked} customers checked, {updated} summaries updated")
+
+# =============================================================================
+# REPORT QUERIES
+# =============================================================================
+# Aggregates behind the dashboard, customer list and supplier pages. Two
+# stores answer the same calls: HttpReportStore over the REST API, and
+# SqliteReportStore, which runs them as SQL against PocketBase's data file
+# opened read-only (writes always go through the API). report_query() uses
+# SQLite when configured and healthy, and falls back to HTTP on any error.
+
+report_log = logging.getLogger('rbl.reports')
+
+def _id_chunks(ids, size):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+class HttpReportStore:
+    """Report queries over the PocketBase REST API."""
+
+    name = 'http'
+
+    def count(self, collection, since=None):
+        """Records in `collection`, optionally only those created at or after `since`."""
+        return count_records(collection, f'created >= "{_pb_datetime(since)}"' if since else '')
+
+    def inquiry_counts(self, customer_ids):
+        counts = dict.fromkeys(customer_ids, 0)
+        for chunk in _id_chunks(counts, SUMMARY_ID_CHUNK):
+            inquiries = pb.collection(INQUIRY_COLLECTION).get_full_list(batch=1000, query_params={
+                "filter": " || ".join(f'customer_id = "{customer_id}"' for customer_id in chunk),
+                "fields": "customer_id",
+            })
+            for inquiry in inquiries:
+                counts[inquiry.customer_id] += 1
+        return counts
+
+    def top_customers(self, limit):
+        """Dashboard chart rows: ([{customer, inquiries}], [{customer, amount}])."""
+        try:
+            customers = pb.collection(CUSTOMER_COLLECTION)
+            by_count = customers.get_list(1, limit, {
+                "filter": "inquiry_count > 0", "sort": "-inquiry_count", "fields": "name,inquiry_count",
+            }).items
+            by_amount = customers.get_list(1, limit, {
+                "filter": "total_amount > 0", "sort": "-total_amount", "fields": "name,total_amount",
+            }).items
+            return (
+                [{'customer': c.name, 'inquiries': int(c.inquiry_count)} for c in by_count],
+                [{'customer': c.name, 'amount': round(_to_float(c.total_amount), 2)} for c in by_amount],
+            )
+        except ClientResponseError:
+            # Summary fields not added yet: fall back to the columnar snapshot
+            snapshot = get_analytics_snapshot()
+            # Code 0 collects inquiries whose customer no longer exists
+            known = snapshot.customer != 0
+            by_count, _ = snapshot.group_by('customer', known, sort='inquiries', limit=limit)
+            by_amount, _ = snapshot.group_by('customer', known, sort='revenue', limit=limit)
+            return (
+                [{'customer': row['label'], 'inquiries': row['inquiries']} for row in by_count],
+                [{'customer': row['label'], 'amount': row['revenue']} for row in by_amount],
+            )
+
+    def supplier_products(self, supplier_id):
+        """Products of a supplier, newest first, as dicts."""
+        products = pb.collection(PRODUCT_COLLECTION).get_full_list(query_params={
+            "filter": f'supplier ?= "{supplier_id}"',
+            "sort": "-created",
+        })
+        return [vars(product) for product in products]
+
+def _sql_name(name):
+    return '"' + name.replace('"', '""') + '"'
+
+# A missing or zero quantity counts as 1, as in the snapshot and summaries
+_SQL_QUANTITY = "COALESCE(NULLIF(CAST(i.quantity AS INTEGER), 0), 1)"
+
+# Ranked by one of these, keeping only customers where it is non-zero like
+# the HTTP store's `> 0` filters. HAVING and ORDER BY repeat the expression:
+# a bare `amount` in HAVING is the inquiries column of that name, not the alias
+_TOP_CUSTOMERS_MEASURES = {
+    'inquiries': "COUNT(*)",
+    'amount': f"ROUND(SUM({_SQL_QUANTITY} * COALESCE(CAST(p.price AS REAL), 0)), 2)",
+}
+_TOP_CUSTOMERS_SQL = f"""
+    SELECT c.name AS customer, {_TOP_CUSTOMERS_MEASURES['inquiries']} AS inquiries,
+           {_TOP_CUSTOMERS_MEASURES['amount']} AS amount
+    FROM {_sql_name(INQUIRY_COLLECTION)} i
+    JOIN {_sql_name(CUSTOMER_COLLECTION)} c ON c.id = i.customer_id
+    LEFT JOIN {_sql_name(PRODUCT_COLLECTION)} p ON p.id = i.product_id
+    GROUP BY c.id
+    HAVING {{measure}} > 0
+    ORDER BY {{measure}} DESC, c.id
+    LIMIT ?
+"""
+
+class SqliteReportStore:
+    """The same queries as SQL against PocketBase's data file, opened read-only with a small pool."""
+
+    name = 'sqlite'
+
+    def __init__(self, path, pool_size, retry_seconds):
+        self.path = path
+        self.pool_size = pool_size
+        self.retry_seconds = retry_seconds
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+
+    def available(self):
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self):
+        """Stop using SQLite for a while; idle connections are closed."""
+        self.down_until = time.monotonic() + self.retry_seconds
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def _connect(self):
+        if not os.path.exists(self.path):
+            raise sqlite3.OperationalError(f"{self.path} not found")
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            open_new = self.opened < self.pool_size
+            if open_new:
+                self.opened += 1
+        if not open_new:
+            try:
+                return self.idle.get(timeout=5)
+            except queue.Empty:
+                raise sqlite3.OperationalError("connection pool exhausted")
+        try:
+            return self._connect()
+        except Exception:
+            with self.lock:
+                self.opened -= 1
+            raise
+
+    def _discard(self, conn):
+        conn.close()
+        with self.lock:
+            self.opened -= 1
+
+    def _query(self, sql, params=()):
+        conn = self._acquire()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except Exception:
+            self._discard(conn)
+            raise
+        self.idle.put(conn)
+        return rows
+
+    def count(self, collection, since=None):
+        sql = f"SELECT COUNT(*) FROM {_sql_name(collection)}"
+        if since:
+            return self._query(sql + " WHERE created >= ?", (_pb_datetime(since),))[0][0]
+        return self._query(sql)[0][0]
+
+    def inquiry_counts(self, customer_ids):
+        counts = dict.fromkeys(customer_ids, 0)
+        for chunk in _id_chunks(counts, 500):  # SQLite allows 999 bound parameters
+            rows = self._query(
+                f"SELECT customer_id, COUNT(*) FROM {_sql_name(INQUIRY_COLLECTION)} "
+                f"WHERE customer_id IN ({','.join('?' * len(chunk))}) GROUP BY customer_id",
+                chunk,
+            )
+            counts.update({customer_id: n for customer_id, n in rows})
+        return counts
+
+    def top_customers(self, limit):
+        by_count, by_amount = (
+            self._query(_TOP_CUSTOMERS_SQL.format(measure=_TOP_CUSTOMERS_MEASURES[measure]), (limit,))
+            for measure in ('inquiries', 'amount')
+        )
+        return (
+            [{'customer': row['customer'], 'inquiries': row['inquiries']} for row in by_count],
+            [{'customer': row['customer'], 'amount': row['amount']} for row in by_amount],
+        )
+
+    def supplier_products(self, supplier_id):
+        # A single relation is stored as the bare id, a multiple one as a JSON array
+        rows = self._query(
+            f"SELECT * FROM {_sql_name(PRODUCT_COLLECTION)} p WHERE p.supplier = ? "
+            f"OR (json_valid(p.supplier) AND json_type(p.supplier) = 'array' "
+            f"AND EXISTS (SELECT 1 FROM json_each(p.supplier) WHERE value = ?)) "
+            f"ORDER BY p.created DESC",
+            (supplier_id, supplier_id),
+        )
+        return [dict(row) for row in rows]
+
+http_reports = HttpReportStore()
+sqlite_reports = SqliteReportStore(PB_SQLITE_PATH, PB_SQLITE_POOL_SIZE, PB_SQLITE_RETRY_SECONDS) if PB_SQLITE_PATH else None
+
+def report_query(name, *args):
+    """Run a report query on SQLite when it is configured and healthy, else over HTTP."""
+    if sqlite_reports is not None and sqlite_reports.available():
+        try:
+            return getattr(sqlite_reports, name)(*args)
+        except sqlite3.Error as e:
+            report_log.warning("SQLite report query %s failed, using HTTP for %ss: %s",
+                               name, sqlite_reports.retry_seconds, e)
+            sqlite_reports.mark_down()
+    return getattr(http_reports, name)(*args)
+
+class StaleWhileRevalidate:
+    """Per-worker cache that answers from memory and refreshes stale values off the request path."""
+
+    def __init__(self, soft_ttl, hard_ttl):
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.lock = threading.Lock()
+        self.entries = {}     # key -> (value, computed_at epoch seconds)
+        self.refreshing = set()
+        self.key_locks = {}   # key -> lock held while computing inline
+
+    def get(self, key, compute):
+        """(value, computed_at); `compute` runs inline only when there is nothing younger than the hard TTL."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            age = time.time() - entry[1]
+            if age < self.soft_ttl:
+                return entry
+            if age < self.hard_ttl:
+                self._refresh_in_background(key, compute)
+                return entry
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another request may have computed it while this one waited
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[1] < self.hard_ttl:
+                return entry
+            return self._store(key, compute())
+
+    def _store(self, key, value):
+        entry = (value, time.time())
+        self.entries[key] = entry
+        return entry
+
+    def _refresh_in_background(self, key, compute):
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def refresh():
+            try:
+                self._store(key, compute())
+            except Exception as e:
+                report_log.warning("Background refresh of %s failed, serving the old value: %s", key, e)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"refresh-{key}", daemon=True).start()
+
+summary_cache = StaleWhileRevalidate(SUMMARY_SOFT_TTL, SUMMARY_HARD_TTL)
+
+# =============================================================================
+# LOCAL REPLICA
+# =============================================================================
+# Products, suppliers and customers mirrored into a SQLite file on this host
+# so list and detail pages read from local disk. The first sync copies each
+# collection in (updated, id) order; later syncs only fetch rows updated since
+# the stored cursor. Deletions never show up in that feed, so the remote count
+# is compared after each sync and the id sets are reconciled when it differs
+# (and every REPLICA_RECONCILE_EVERY syncs regardless). Workers share the
+# file and a lock file lets one of them sync at a time. Writes still go to
+# PocketBase and are applied to the replica straight away. Reads use the API
+# until a collection's first sync has finished, or whenever it lags by more
+# than REPLICA_MAX_LAG_SECONDS.
+
+replica_log = logging.getLogger('rbl.replica')
+
+REPLICA_COLLECTIONS = (PRODUCT_COLLECTION, SUPPLIER_COLLECTION, CUSTOMER_COLLECTION)
+REPLICA_BATCH = 500
+
+_REPLICA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    created TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS records_created ON records (collection, created, id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    collection TEXT PRIMARY KEY,
+    cursor TEXT NOT NULL DEFAULT '',
+    synced_at REAL,
+    syncs INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Never let an older copy (e.g. from a sync that started before a write)
+# replace a newer one
+_REPLICA_UPSERT = (
+    "INSERT INTO records (collection, id, created, updated, data) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (collection, id) DO UPDATE SET created = excluded.created, "
+    "updated = excluded.updated, data = excluded.data WHERE excluded.updated >= records.updated"
+)
+
+class LocalReplica:
+    """SQLite copy of REPLICA_COLLECTIONS, kept current by polling `updated`."""
+
+    def __init__(self, path, interval, max_lag, reconcile_every):
+        self.path = path
+        self.interval = interval
+        self.max_lag = max_lag
+        self.reconcile_every = max(reconcile_every, 1)
+        self._local = threading.local()
+        self._start_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._thread_pid = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(_REPLICA_SCHEMA)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    # -- sync -----------------------------------------------------------------
+
+    def start(self):
+        """Start this process's background sync thread (again after a fork)."""
+        if not self.enabled or self._thread_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._sync_lock = threading.Lock()
+            threading.Thread(target=self._run, name='replica-sync', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync_all()
+            except Exception:
+                replica_log.exception("Replica sync failed")
+            time.sleep(self.interval)
+
+    def sync_all(self):
+        """Sync every collection unless another worker on this host is already doing it."""
+        self._db()  # creates the directory for the lock file
+        with open(self.path + '.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                for collection in REPLICA_COLLECTIONS:
+                    try:
+                        self.sync(collection)
+                    except (requests.RequestException, sqlite3.Error) as e:
+                        replica_log.warning("Replica sync of %s failed: %s", collection, e)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return True
+
+    def _fetch(self, collection, params):
+        res = pb_http.get(f"{POCKETBASE_URL}/api/collections/{collection}/records", headers=HEADERS, params=params)
+        res.raise_for_status()
+        return res.json().get("items", [])
+
+    def _upsert(self, collection, rows):
+        db = self._db()
+        with db:
+            db.executemany(_REPLICA_UPSERT, [
+                (collection, r['id'], r.get('created', ''), r.get('updated', ''), json.dumps(r)) for r in rows
+            ])
+
+    def sync(self, collection):
+        """Pull rows updated since the cursor, then look for deletions; returns (fetched, removed)."""
+        with self._sync_lock:
+            db = self._db()
+            state = db.execute('SELECT cursor, syncs FROM sync_state WHERE collection = ?', (collection,)).fetchone()
+            cursor, syncs = state or ('', 0)
+
+            fetched, newest, last = 0, cursor, None
+            while True:
+                params = {"page": 1, "perPage": REPLICA_BATCH, "sort": "updated,id", "skipTotal": "true"}
+                if last:
+                    params["filter"] = f'updated > "{last[0]}" || (updated = "{last[0]}" && id > "{last[1]}")'
+                elif cursor:
+                    # >= so rows written in the cursor's own millisecond are not missed
+                    params["filter"] = f'updated >= "{cursor}"'
+                rows = self._fetch(collection, params)
+                self._upsert(collection, rows)
+                fetched += len(rows)
+                if rows:
+                    newest = max(newest, rows[-1].get('updated', ''))
+                if len(rows) < REPLICA_BATCH:
+                    break
+                last = rows[-1].get('updated', ''), rows[-1]['id']
+
+            syncs += 1
+            removed = 0
+            local = db.execute('SELECT COUNT(*) FROM records WHERE collection = ?', (collection,)).fetchone()[0]
+            if local != count_records(collection) or syncs % self.reconcile_every == 0:
+                removed = self._reconcile(collection)
+
+            with db:
+                db.execute(
+                    "INSERT INTO sync_state (collection, cursor, synced_at, syncs) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (collection) DO UPDATE SET cursor = max(cursor, excluded.cursor), "
+                    "synced_at = excluded.synced_at, syncs = excluded.syncs",
+                    (collection, newest, time.time(), syncs),
+                )
+            if not cursor:
+                replica_log.info("Replica copied %s records of %s", fetched, collection)
+            elif fetched or removed:
+                replica_log.debug("Replica %s: %s changed, %s removed", collection, fetched, removed)
+            return fetched, removed
+
+    def _reconcile(self, collection):
+        """Delete local rows whose ids PocketBase no longer has; returns how many."""
+        remote_ids, last_id = set(), None
+        while True:
+            params = {"page": 1, "perPage": REPLICA_BATCH, "sort": "id", "fields": "id", "skipTotal": "true"}
+            if last_id:
+                params["filter"] = f'id > "{last_id}"'
+            rows = self._fetch(collection, params)
+            remote_ids.update(r['id'] for r in rows)
+            if len(rows) < REPLICA_BATCH:
+                break
+            last_id = rows[-1]['id']
+
+        db = self._db()
+        local_ids = {row[0] for row in db.execute('SELECT id FROM records WHERE collection = ?', (collection,))}
+        stale = local_ids - remote_ids
+        if stale:
+            with db:
+                db.executemany('DELETE FROM records WHERE collection = ? AND id = ?',
+                               [(collection, record_id) for record_id in stale])
+        return len(stale)
+
+    # -- writes made on this host -------------------------------------------
+
+    def put(self, collection, record):
+        """Apply a raw record returned by a PocketBase write."""
+        if not self.enabled or collection not in REPLICA_COLLECTIONS:
+            return
+        try:
+            self._upsert(collection, [record])
+        except sqlite3.Error as e:
+            replica_log.warning("Could not apply %s/%s to the replica: %s", collection, record.get('id'), e)
+
+    def reload(self, collection, record_id):
+        """Re-read one record after an SDK write, whose Record has lost the raw timestamps."""
+        if not self.enabled or collection not in REPLICA_COLLECTIONS:
+            return
+        try:
+            res = pb_http.get(f"{POCKETBASE_URL}/api/collections/{collection}/records/{record_id}", headers=HEADERS)
+            res.raise_for_status()
+            self._upsert(collection, [res.json()])
+        except (requests.RequestException, sqlite3.Error) as e:
+            replica_log.warning("Could not reload %s/%s into the replica: %s", collection, record_id, e)
+
+    def discard(self, collection, record_id):
+        if not self.enabled or collection not in REPLICA_COLLECTIONS:
+            return
+        try:
+            db = self._db()
+            with db:
+                db.execute('DELETE FROM records WHERE collection = ? AND id = ?', (collection, record_id))
+        except sqlite3.Error as e:
+            replica_log.warning("Could not remove %s/%s from the replica: %s", collection, record_id, e)
+
+    # -- reads ----------------------------------------------------------------
+
+    def serves(self, collection):
+        """True if reads of `collection` can come from the replica right now."""
+        if not self.enabled or collection not in REPLICA_COLLECTIONS:
+            return False
+        self.start()
+        try:
+            state = self._db().execute('SELECT synced_at FROM sync_state WHERE collection = ?',
+                                       (collection,)).fetchone()
+        except sqlite3.Error as e:
+            replica_log.warning("Replica unavailable: %s", e)
+            return False
+        return bool(state and state[0] and time.time() - state[0] <= self.max_lag)
+
+    def page(self, collection, limit, position=None, search_fields=(), search='', count=True):
+        """Up to `limit` rows in keyset_page order next to `position`, and the match total (None unless count)."""
+        where, args = ['collection = ?'], [collection]
+        if search:
+            pattern = '%' + re.sub(r'([\\%_])', r'\\\1', search) + '%'
+            where.append('(' + ' OR '.join(
+                f"json_extract(data, '$.{field}') LIKE ? ESCAPE '\\'" for field in search_fields
+            ) + ')')
+            args += [pattern] * len(search_fields)
+        db = self._db()
+        total = db.execute(f"SELECT COUNT(*) FROM records WHERE {' AND '.join(where)}", args).fetchone()[0] if count else None
+
+        order = 'DESC'
+        if position:
+            direction, created, record_id = position
+            where.append('(created, id) < (?, ?)' if direction == 'next' else '(created, id) > (?, ?)')
+            args += [created, record_id]
+            if direction == 'prev':
+                order = 'ASC'
+        rows = db.execute(
+            f"SELECT data FROM records WHERE {' AND '.join(where)} ORDER BY created {order}, id {order} LIMIT ?",
+            args + [limit],
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows], total
+
+    def get(self, collection, record_id):
+        row = self._db().execute('SELECT data FROM records WHERE collection = ? AND id = ?',
+                                 (collection, record_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, collection, record_ids):
+        found = {}
+        for chunk in _id_chunks(set(record_ids), 500):
+            rows = self._db().execute(
+                f"SELECT id, data FROM records WHERE collection = ? AND id IN ({','.join('?' * len(chunk))})",
+                [collection] + chunk,
+            )
+            found.update((record_id, json.loads(data)) for record_id, data in rows)
+        return found
+
+    def all(self, collection):
+        rows = self._db().execute('SELECT data FROM records WHERE collection = ? ORDER BY created DESC, id DESC',
+                                  (collection,))
+        return [json.loads(row[0]) for row in rows]
+
+replica = LocalReplica(REPLICA_PATH, REPLICA_SYNC_SECONDS, REPLICA_MAX_LAG_SECONDS, REPLICA_RECONCILE_EVERY)
+
+@app.cli.command('sync-replica')
+def sync_replica_command():
+    """Copy or catch up the local replica once (e.g. before starting workers)."""
+    if not replica.enabled:
+        raise click.ClickException("REPLICA_PATH is not set")
+    for collection in REPLICA_COLLECTIONS:
+        fetched, removed = replica.sync(collection)
+        click.echo(f"{collection}: {fetched} fetched, {removed} removed")
+
 # =============================================================================
 # NOTIFICATION HELPER FUNCTIONS
 # =============================================================================
@@ -138,6 +2218,8 @@ def json_response(data=None, message=None, success=True, status_code=200):
 # EMAIL CONFIGURATION AND FUNCTIONS
 # =============================================================================
 
+email_log = logging.getLogger('rbl.email')
+
 SMTP_SERVER = os.getenv('HOST')
 SMTP_PORT = os.getenv('PORT')
 SMTP_USERNAME = os.getenv('LOGIN')
@@ -150,15 +2232,22 @@ def send_email(to_email, subject, body):
     msg["From"] = SMTP_FROM
     msg["To"] = to_email
 
+    start = time.perf_counter()
     try:
         with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
             server.starttls()
             server.login(SMTP_USERNAME, SMTP_PASSWORD)
             server.send_message(msg)
+        SMTP_SEND_DURATION.observe(time.perf_counter() - start, status='ok')
+        return True
     except Exception as e:
-        print(f"Failed to send email to {to_email}: {e}")
+        SMTP_SEND_DURATION.observe(time.perf_counter() - start, status='error')
+        email_log.error("Failed to send email to %s: %s", to_email, e)
+        return False
 
 def check_and_send_reminders():
+    start = time.perf_counter()
+    status = 'ok'
     try:
         now = datetime.now(timezone.utc)
         reminders = pb.collection("reminders").get_full_list()
@@ -195,13 +2284,17 @@ def check_and_send_reminders():
                 f"Regards,\nRBL Sourcing Reminder Service"
             )
 
-            send_email(to_email, subject, body)
+            if send_email(to_email, subject, body):
+                REMINDERS_SENT.inc()
 
             # Mark reminder as sent
             pb.collection("reminders").update(reminder.id, {"sent": True})
 
     except Exception as e:
-        print(f"Error checking/sending reminders: {e}")
+        status = 'error'
+        email_log.exception("Error checking/sending reminders")
+    finally:
+        REMINDER_JOB_DURATION.observe(time.perf_counter() - start, status=status)
 
 # =============================================================================
 # POCKETBASE AUTHENTICATION AND CONFIGURATION
@@ -218,6 +2311,10 @@ HEADERS = {
     "Authorization": f"Bearer {token}"
 }
 
+# Record ids as PocketBase generates them; ids taken from request bodies and
+# URLs are checked against this before they reach a filter or a record URL
+_RECORD_ID = re.compile(r'^[a-z0-9]{15}$')
+
 def ensure_admin_auth():
     """Ensure PocketBase client is authenticated as admin"""
     try:
@@ -226,7 +2323,7 @@ def ensure_admin_auth():
             os.getenv('POCKETBASE_ADMIN_PASSWORD')
         )
     except Exception as e:
-        print(f"Warning: Could not authenticate as admin: {e}")
+        log.warning("Could not authenticate as admin: %s", e)
 
 status_order = [
     ("Inquiry", "🟡", "bg-yellow-500"),
@@ -253,15 +2350,93 @@ class User(UserMixin):
         self.email = email
         self.name = name
 
+class IdentityCache:
+    """TTL'd copy of the users collection, shared by all requests in this worker."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.users = {}
+        self.loaded_at = None
+        self.generation = 0  # bumped by invalidate(); a load started earlier can't count as fresh
+        self.lock = threading.Lock()       # guards users/loaded_at, never held across a network call
+        self.load_lock = threading.Lock()  # one refresh at a time
+
+    def _fresh(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def _load(self):
+        # Listing users needs the admin token, which staff logins can replace
+        ensure_admin_auth()
+        return {user.id: user for user in pb.collection('users').get_full_list()}
+
+    def _refresh(self, wait):
+        """Reload if stale. Without `wait`, a thread that finds a refresh running keeps the old map."""
+        if self._fresh():
+            return
+        if not self.load_lock.acquire(blocking=wait):
+            return
+        try:
+            if self._fresh():
+                return
+            generation = self.generation
+            users = self._load()
+            with self.lock:
+                self.users = users
+                if generation == self.generation:
+                    self.loaded_at = time.monotonic()
+        finally:
+            self.load_lock.release()
+
+    def all(self):
+        self._refresh(wait=True)
+        with self.lock:
+            return list(self.users.values())
+
+    def get(self, user_id):
+        try:
+            # Only the first load is waited for; later ones serve the stale map meanwhile
+            self._refresh(wait=not self.users)
+        except Exception as e:
+            log.warning("Could not refresh identity cache: %s", e)
+        with self.lock:
+            user = self.users.get(user_id)
+        if user is None:
+            # Created on another worker since our last refresh
+            try:
+                user = pb.collection('users').get_one(user_id)
+            except ClientResponseError:
+                return None
+            self.remember(user)
+        return user
+
+    def remember(self, user):
+        with self.lock:
+            self.users[user.id] = user
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = None
+            self.generation += 1
+
+identity_cache = IdentityCache(IDENTITY_CACHE_TTL)
+
+def current_role():
+    """Role of the logged-in user from the identity cache (not the session cookie)."""
+    user_id = session.get('user_id')
+    user = identity_cache.get(user_id) if user_id else None
+    if user is None:
+        return None
+    return getattr(user, 'role', None) or 'staff'
+
+@app.context_processor
+def inject_user_role():
+    return dict(user_role=current_role())
+
 @login_manager.user_loader
 def load_user(user_id):
-    # Fetch user from PocketBase by ID
-    try:
-        user = pb.collection("users").get_one(user_id)
-        if user:
-            return User(user.id, user.email, getattr(user, 'name', user.email.split('@')[0]))
-    except Exception:
-        pass
+    user = identity_cache.get(user_id)
+    if user:
+        return User(user.id, user.email, getattr(user, 'name', user.email.split('@')[0]))
     return None
 
 def login_required(f):
@@ -295,6 +2470,7 @@ def login():
             session['user_name'] = getattr(auth_data.record, 'name', auth_data.record.email.split('@')[0])
             session['user_role'] = getattr(auth_data.record, 'role', 'staff')  # Get user role
             session['auth_token'] = auth_data.token
+            identity_cache.remember(auth_data.record)
             return redirect(url_for('dashboard'))
         except Exception as e:
             flash('Invalid credentials', 'error')
@@ -338,131 +2514,62 @@ def index():
 def home():
     return render_template('welcome.html')
 
-@app.route("/dashboard")
-@login_required
-def dashboard():
-    # Existing code...
-    customers_last_30 = pb.collection("customers").get_full_list()
-    recent_customers_count = len(customers_last_30)
-
-    inquiries_last_30 = pb.collection("inquiries").get_full_list()
-    new_inquiries_count = len(inquiries_last_30)
-
-    suppliers_last_30 = pb.collection("suppliers").get_full_list()
-    supplier_count = len(suppliers_last_30)
+def dashboard_figures():
+    """Counts and top-10 chart data behind the dashboard."""
+    # Counts only; the records themselves are never needed here
+    figures = {
+        "recent_customers": report_query('count', CUSTOMER_COLLECTION),
+        "new_inquiries": report_query('count', INQUIRY_COLLECTION),
+        "orders": report_query('count', SUPPLIER_COLLECTION),
+    }
 
-    # New chart data preparation
+    # Top-10 customer charts
     try:
-        # Get all customers and their inquiries
-        all_customers = pb.collection("customers").get_full_list()
-        all_inquiries = pb.collection("inquiries").get_full_list()
-        all_products = pb.collection("products").get_full_list()
-        
-        # Create product price lookup
-        product_prices = {}
-        for product in all_products:
-            try:
-                price = float(getattr(product, 'price', 0) or 0)
-                product_prices[product.id] = price
-            except:
-                product_prices[product.id] = 0
-        
-        # Prepare customer inquiry data
-        customer_inquiry_data = []
-        customer_amount_data = []
-        
-        for customer in all_customers:
-            customer_name = getattr(customer, 'name', 'Unknown')
-            customer_inquiries = [inq for inq in all_inquiries if getattr(inq, 'customer_id', '') == customer.id]
-            inquiry_count = len(customer_inquiries)
-            
-            # Calculate total amount for this customer
-            total_amount = 0
-            for inquiry in customer_inquiries:
-                product_id = getattr(inquiry, 'product_id', '')
-                quantity = getattr(inquiry, 'quantity', 1) or 1
-                price = product_prices.get(product_id, 0)
-                total_amount += price * quantity
-            
-            if inquiry_count > 0:  # Only include customers with inquiries
-                customer_inquiry_data.append({
-                    'customer': customer_name,
-                    'inquiries': inquiry_count
-                })
-                customer_amount_data.append({
-                    'customer': customer_name,
-                    'amount': total_amount
-                })
-        
-        # Sort by inquiry count for better visualization
-        customer_inquiry_data.sort(key=lambda x: x['inquiries'], reverse=True)
-        customer_amount_data.sort(key=lambda x: x['amount'], reverse=True)
-        
-        # Take top 10 for better chart readability
-        customer_inquiry_data = customer_inquiry_data[:10]
-        customer_amount_data = customer_amount_data[:10]
-        
+        figures["customer_inquiry_data"], figures["customer_amount_data"] = report_query('top_customers', 10)
     except Exception as e:
-        print(f"Error preparing chart data: {e}")
-        customer_inquiry_data = []
-        customer_amount_data = []
+        log.exception("Error preparing chart data")
+        figures["customer_inquiry_data"] = []
+        figures["customer_amount_data"] = []
+    return figures
 
+@app.route("/dashboard")
+@login_required
+def dashboard():
+    figures, computed_at = summary_cache.get('dashboard', dashboard_figures)
     return render_template(
         "dashboard.html",
-        recent_customers=recent_customers_count,
-        new_inquiries=new_inquiries_count,
-        orders=supplier_count,
-        customer_inquiry_data=customer_inquiry_data,
-        customer_amount_data=customer_amount_data
+        as_of=datetime.fromtimestamp(computed_at, timezone.utc),
+        **figures
     )
 
 # =============================================================================
 # PRODUCT MANAGEMENT ROUTES
 # =============================================================================
 
+product_log = logging.getLogger('rbl.products')
+
 @app.route('/product')
 @login_required
 def product_list():
     search_query = request.args.get('search', '').strip()
-    page = request.args.get('page', 1, type=int)
-
-    filter_str = ''
-    if search_query:
-        filter_str = (
-            f'product_id ~ "{search_query}" || '
-            f'name ~ "{search_query}" || '
-            f'model ~ "{search_query}"'
-        )
-
-    params = {
-        "page": page,
-        "perPage": PRODUCTS_PER_PAGE,
-        "sort": "-created",  # newest first
-        "_ts": datetime.utcnow().timestamp()  # avoid cache
-    }
-    if filter_str:
-        params["filter"] = filter_str
-
-    # Fetch products from PocketBase
-    res = requests.get(
-        f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records",
-        headers=HEADERS,
-        params=params
+    cursor = request.args.get('cursor')
+
+    # Fetch products newest first (from the local replica when it is current)
+    pager = keyset_page(
+        COLLECTION, PRODUCTS_PER_PAGE, cursor=cursor,
+        search_fields=('product_id', 'name', 'model'), search=search_query,
+        skip_total=skip_total_requested(),
+        params={"_ts": datetime.utcnow().timestamp()}  # avoid cache
     )
-    res.raise_for_status()
-    data = res.json()
-    products = data.get("items", [])
-    total_products = data.get("totalItems", 0)
-
-    total_pages = ceil(total_products / PRODUCTS_PER_PAGE)
-
-    # Fetch all suppliers for mapping and full details
-    suppliers_res = requests.get(f"{POCKETBASE_URL}/api/collections/suppliers/records", headers=HEADERS)
-    suppliers_res.raise_for_status()
-    suppliers_data = suppliers_res.json().get("items", [])
+    products = pager["items"]
 
     # Map supplier id → name and full data
-    supplier_map = {s["id"]: s for s in suppliers_data}
+    if replica.serves(SUPPLIER_COLLECTION):
+        supplier_map = replica.get_many(SUPPLIER_COLLECTION, (_first_id(p.get("supplier")) for p in products))
+    else:
+        suppliers_res = pb_http.get(f"{POCKETBASE_URL}/api/collections/suppliers/records", headers=HEADERS)
+        suppliers_res.raise_for_status()
+        supplier_map = {s["id"]: s for s in suppliers_res.json().get("items", [])}
 
     products_full = []
     for p in products:
@@ -505,14 +2612,16 @@ def product_list():
             "model": p.get("model", ""),
             "code": p.get("code", ""),
             "price": p.get("price", ""),
-            "files": build_file_urls(p)
+            "updated": p.get("updated", ""),
+            "supplier_updated": supplier_info.get("updated", ""),
+            "files": build_file_urls(p),
+            "previews": build_preview_urls(p)
         })
 
     return render_template(
         "product_list.html",
         products=products_full,
-        current_page=page,
-        total_pages=total_pages,
+        pager=pager,
         search_query=search_query
     )
 
@@ -522,8 +2631,11 @@ def add_product():
     product_id = request.args.get('id')
 
     # Fetch all suppliers for dropdown
-    suppliers_resp = requests.get(f"{POCKETBASE_URL}/api/collections/suppliers/records", headers=HEADERS)
-    suppliers = suppliers_resp.json().get("items", []) if suppliers_resp.status_code == 200 else []
+    if replica.serves(SUPPLIER_COLLECTION):
+        suppliers = replica.all(SUPPLIER_COLLECTION)
+    else:
+        suppliers_resp = pb_http.get(f"{POCKETBASE_URL}/api/collections/suppliers/records", headers=HEADERS)
+        suppliers = suppliers_resp.json().get("items", []) if suppliers_resp.status_code == 200 else []
 
     product = None
     supplier_name_for_product = None
@@ -531,12 +2643,12 @@ def add_product():
     # Editing an existing product
     if product_id:
         pb_url = f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records/{product_id}"
-        resp = requests.get(pb_url, headers=HEADERS)
+        resp = pb_http.get(pb_url, headers=HEADERS)
         if resp.status_code == 200:
             product = resp.json()
             supplier_id = product.get("supplier")
             if supplier_id:
-                supplier_resp = requests.get(f"{POCKETBASE_URL}/api/collections/suppliers/records/{supplier_id}", headers=HEADERS)
+                supplier_resp = pb_http.get(f"{POCKETBASE_URL}/api/collections/suppliers/records/{supplier_id}", headers=HEADERS)
                 if supplier_resp.status_code == 200:
                     supplier_data = supplier_resp.json()
                     supplier_name_for_product = supplier_data.get("name")
@@ -601,17 +2713,22 @@ def add_product():
         # Send request to PocketBase
         if product_id:
             pb_url = f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records/{product_id}"
-            resp = requests.patch(pb_url, data=pb_data, files=files_payload, headers=HEADERS)
+            resp = pb_http.patch(pb_url, data=pb_data, files=files_payload, headers=HEADERS)
         else:
             pb_url = f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records"
-            resp = requests.post(pb_url, data=pb_data, files=files_payload, headers=HEADERS)
+            resp = pb_http.post(pb_url, data=pb_data, files=files_payload, headers=HEADERS)
 
-        # Debug output to terminal
-        print("PocketBase Response:", resp.status_code, resp.text)
+        product_log.debug("PocketBase response %s for product save", resp.status_code)
 
         if resp.status_code in (200, 201):
+            schedule_record_previews(COLLECTION, resp.json())
+            supplier_product_index.put(resp.json())
+            replica.put(COLLECTION, resp.json())
+            if product and _to_float(product.get("price")) != _to_float(resp.json().get("price")):
+                schedule_price_refresh(product_id)
             return flash_and_redirect("Product saved successfully!", "success", "product_list")
         else:
+            product_log.warning("Error saving product: HTTP %s %s", resp.status_code, resp.text)
             return flash_and_redirect(f"Error saving product: {resp.text}", "error", "add_product")
 
     # Render form
@@ -625,13 +2742,10 @@ def add_product():
 @app.route('/delete_product/<product_id>', methods=['POST'])
 @login_required
 def delete_product(product_id):
-    pb_url = f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records/{product_id}"
-    resp = requests.delete(pb_url, headers=HEADERS)
-
-    if resp.status_code == 204:
-        flash("Product deleted successfully!", "success")
-    else:
-        flash(f"Failed to delete product: {resp.text}", "error")
+    try:
+        flash(*cascade_message(cascade_delete(COLLECTION, product_id), "product"))
+    except (ClientResponseError, requests.RequestException) as e:
+        flash(f"Failed to delete product: {e}", "error")
 
     return redirect(url_for('product_list'))
 
@@ -639,14 +2753,16 @@ def delete_product(product_id):
 @login_required
 def product_detail(product_id):
     # Fetch product details
-    pb_url = f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records/{product_id}"
-    resp = requests.get(pb_url, headers=HEADERS)
-    
-    if resp.status_code != 200:
-        flash("Product not found!", "error")
-        return redirect(url_for('product_list'))
-    
-    product = resp.json()
+    product = replica.get(COLLECTION, product_id) if replica.serves(COLLECTION) else None
+    if product is None:
+        pb_url = f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records/{product_id}"
+        resp = pb_http.get(pb_url, headers=HEADERS)
+
+        if resp.status_code != 200:
+            flash("Product not found!", "error")
+            return redirect(url_for('product_list'))
+
+        product = resp.json()
     
     # Fetch supplier details if product has a supplier
     supplier_info = None
@@ -656,16 +2772,18 @@ def product_detail(product_id):
         if isinstance(supplier_id, list):
             supplier_id = supplier_id[0] if supplier_id else None
         
-        if supplier_id:
+        if supplier_id and replica.serves(SUPPLIER_COLLECTION):
+            supplier_info = replica.get(SUPPLIER_COLLECTION, supplier_id)
+        if supplier_id and supplier_info is None:
             try:
-                supplier_resp = requests.get(f"{POCKETBASE_URL}/api/collections/suppliers/records/{supplier_id}", headers=HEADERS)
+                supplier_resp = pb_http.get(f"{POCKETBASE_URL}/api/collections/suppliers/records/{supplier_id}", headers=HEADERS)
                 if supplier_resp.status_code == 200:
                     supplier_info = supplier_resp.json()
-                    print(f"DEBUG: Fetched supplier for product {product_id}: {supplier_info}")
+                    product_log.debug("Fetched supplier %s for product %s", supplier_id, product_id)
                 else:
-                    print(f"DEBUG: Supplier request failed with status {supplier_resp.status_code}: {supplier_resp.text}")
+                    product_log.warning("Supplier %s request failed with status %s", supplier_id, supplier_resp.status_code)
             except Exception as e:
-                print(f"DEBUG: Error fetching supplier {supplier_id}: {e}")
+                product_log.warning("Error fetching supplier %s: %s", supplier_id, e)
     
     # Build file URLs
     product_files = build_file_urls(product)
@@ -674,19 +2792,23 @@ def product_detail(product_id):
         'product_detail.html',
         product=product,
         supplier=supplier_info,
-        files=product_files
+        files=product_files,
+        previews=build_preview_urls(product)
     )
 
 @app.route('/product/<product_id>/edit', methods=['GET', 'POST'])
 @login_required
 def product_edit(product_id):
     # Fetch all suppliers for dropdown
-    suppliers_resp = requests.get(f"{POCKETBASE_URL}/api/collections/suppliers/records", headers=HEADERS)
-    suppliers = suppliers_resp.json().get("items", []) if suppliers_resp.status_code == 200 else []
+    if replica.serves(SUPPLIER_COLLECTION):
+        suppliers = replica.all(SUPPLIER_COLLECTION)
+    else:
+        suppliers_resp = pb_http.get(f"{POCKETBASE_URL}/api/collections/suppliers/records", headers=HEADERS)
+        suppliers = suppliers_resp.json().get("items", []) if suppliers_resp.status_code == 200 else []
 
     # Fetch product details
     pb_url = f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records/{product_id}"
-    resp = requests.get(pb_url, headers=HEADERS)
+    resp = pb_http.get(pb_url, headers=HEADERS)
     
     if resp.status_code != 200:
         flash("Product not found!", "error")
@@ -705,7 +2827,7 @@ def product_edit(product_id):
     # Fetch supplier name for display
     supplier_name_for_product = None
     if supplier_id:
-        supplier_resp = requests.get(f"{POCKETBASE_URL}/api/collections/suppliers/records/{supplier_id}", headers=HEADERS)
+        supplier_resp = pb_http.get(f"{POCKETBASE_URL}/api/collections/suppliers/records/{supplier_id}", headers=HEADERS)
         if supplier_resp.status_code == 200:
             supplier_data = supplier_resp.json()
             supplier_name_for_product = supplier_data.get("name")
@@ -787,12 +2909,16 @@ def product_edit(product_id):
 
         # Send PATCH request to PocketBase
         pb_url = f"{POCKETBASE_URL}/api/collections/{COLLECTION}/records/{product_id}"
-        resp = requests.patch(pb_url, data=pb_data, files=files_payload, headers=HEADERS)
+        resp = pb_http.patch(pb_url, data=pb_data, files=files_payload, headers=HEADERS)
 
-        # Debug output to terminal
-        print("PocketBase Response:", resp.status_code, resp.text)
+        product_log.debug("PocketBase response %s for product %s update", resp.status_code, product_id)
 
         if resp.status_code == 200:
+            schedule_record_previews(COLLECTION, resp.json())
+            supplier_product_index.put(resp.json())
+            replica.put(COLLECTION, resp.json())
+            if _to_float(product.get("price")) != _to_float(resp.json().get("price")):
+                schedule_price_refresh(product_id)
             flash("Product updated successfully!", "success")
             return redirect(url_for("product_detail", product_id=product_id))
         else:
@@ -811,14 +2937,333 @@ def product_edit(product_id):
         product_files=product_files
     )
 
+# Bulk repricing: products are selected by supplier/model/HS code, each rate
+# field gets a set/add/percent change, and /preview returns the old and new
+# values without writing anything. Applying re-reads each previewed product
+# and PATCHes only its changed fields, BULK_WRITE_CONCURRENCY products at a
+# time, so a few hundred SKUs take seconds instead of one edit form each.
+# Writes are still one PATCH per product, not a single batched request: the
+# PocketBase SDK used here has no batch call. The worker threads' calls go
+# through the background bulkhead, so BULKHEAD_BACKGROUND_CONCURRENCY caps
+# them too.
+
+REPRICE_FIELDS = ('buying_rate', 'selling_rate', 'price')
+REPRICE_MODES = ('set', 'add', 'percent')
+REPRICE_READ_FIELDS = "id,product_id,name,model,hs_code,supplier," + ",".join(REPRICE_FIELDS)
+
+def parse_reprice_changes(raw):
+    """{field: (mode, amount)} from the request body; raises ValueError if nothing usable is given."""
+    changes = {}
+    for field, change in (raw or {}).items():
+        if field not in REPRICE_FIELDS or not isinstance(change, dict) or not change.get('mode'):
+            continue
+        if change['mode'] not in REPRICE_MODES:
+            raise ValueError(f"Unknown change mode for {field}: {change['mode']}")
+        try:
+            amount = float(change.get('value'))
+        except (TypeError, ValueError):
+            raise ValueError(f"Change for {field} needs a numeric value")
+        if change['mode'] == 'set' and amount < 0:
+            raise ValueError(f"{field} cannot be set below zero")
+        changes[field] = (change['mode'], amount)
+    if not changes:
+        raise ValueError("Choose at least one rate to change")
+    return changes
+
+def repriced_value(current, mode, amount):
+    """New value for one field, or None when the change can't apply (e.g. percent of an empty rate)."""
+    if mode == 'set':
+        value = amount
+    else:
+        try:
+            base = float(current)
+        except (TypeError, ValueError):
+            return None
+        value = base + amount if mode == 'add' else base * (1 + amount / 100)
+    value = round(value, 2)
+    if value < 0:
+        return None
+    # Rates stored as text stay text
+    return f"{value:.2f}" if isinstance(current, str) or current is None else value
+
+def plan_reprice(product, changes):
+    """Row for one product (a dict) with {field: {old, new}} for the fields that would change."""
+    row = {
+        "id": product["id"],
+        "product_id": product.get('product_id', ''),
+        "name": product.get('name', ''),
+        "model": product.get('model', ''),
+        "changes": {},
+        "skipped": [],
+    }
+    for field, (mode, amount) in changes.items():
+        old = product.get(field)
+        new = repriced_value(old, mode, amount)
+        if new is None:
+            row["skipped"].append(field)
+        elif _to_float(new) != _to_float(old) or old in (None, ''):
+            row["changes"][field] = {"old": old, "new": new}
+    return row
+
+def reprice_selection(supplier='', model='', hs_code=''):
+    """Products matching every given criterion; raises ValueError past REPRICE_MAX_PRODUCTS."""
+    filters = []
+    if supplier:
+        filters.append(f'supplier ?= "{supplier}"')
+    if model:
+        filters.append(f'model ~ "{model}"')
+    if hs_code:
+        filters.append(f'hs_code ~ "{hs_code}"')
+    if not filters:
+        raise ValueError("Select products by supplier, model or HS code")
+    filter_str = " && ".join(filters)
+    matched = pb.collection(PRODUCT_COLLECTION).get_list(1, 1, {"filter": filter_str, "fields": "id"}).total_items
+    if matched > REPRICE_MAX_PRODUCTS:
+        raise ValueError(f"{matched} products match; narrow the selection to at most {REPRICE_MAX_PRODUCTS}.")
+    return pb.collection(PRODUCT_COLLECTION).get_full_list(batch=500, query_params={
+        "filter": filter_str, "fields": REPRICE_READ_FIELDS, "sort": "product_id",
+    })
+
+def _reprice_one(product_id, changes):
+    """Re-read one product and PATCH just its changed fields; returns (result row, saved record or None)."""
+    url = f"{POCKETBASE_URL}/api/collections/{PRODUCT_COLLECTION}/records/{product_id}"
+    failed = {"id": product_id, "changes": {}, "skipped": [], "status": "failed"}
+    try:
+        resp = pb_http.get(url, headers=HEADERS, params={"fields": REPRICE_READ_FIELDS})
+        if resp.status_code != 200:
+            return dict(failed, error="Product not found" if resp.status_code == 404 else f"HTTP {resp.status_code}"), None
+        # Planned against current values, not the ones shown in the preview
+        row = plan_reprice(resp.json(), changes)
+        if not row["changes"]:
+            return dict(row, status="unchanged"), None
+        resp = pb_http.patch(url, json={field: change["new"] for field, change in row["changes"].items()},
+                             headers=HEADERS)
+    except requests.RequestException as e:
+        return dict(failed, error=str(e)), None
+    if resp.status_code != 200:
+        return dict(row, status="failed", error=f"HTTP {resp.status_code}: {resp.text[:200]}"), None
+    return dict(row, status="updated"), resp.json()
+
+def apply_reprice(product_ids, changes):
+    """Reprice each product, BULK_WRITE_CONCURRENCY at a time; returns one result row per id, in order."""
+    results = []
+    with ThreadPoolExecutor(max_workers=BULK_WRITE_CONCURRENCY, thread_name_prefix='reprice') as pool:
+        for row, record in pool.map(lambda product_id: _reprice_one(product_id, changes), product_ids):
+            results.append(row)
+            if record:
+                supplier_product_index.put(record)
+                replica.put(PRODUCT_COLLECTION, record)
+    schedule_price_refresh(*(row["id"] for row in results if row["status"] == "updated" and "price" in row["changes"]))
+    return results
+
+@app.route('/products/reprice')
+@login_required
+def reprice_products():
+    if replica.serves(SUPPLIER_COLLECTION):
+        suppliers = replica.all(SUPPLIER_COLLECTION)
+    else:
+        suppliers = [vars(s) for s in pb.collection(SUPPLIER_COLLECTION).get_full_list(
+            batch=500, query_params={"fields": "id,name", "sort": "name"}
+        )]
+    return render_template('reprice.html', suppliers=suppliers, fields=REPRICE_FIELDS,
+                           max_products=REPRICE_MAX_PRODUCTS)
+
+@app.route('/api/products/reprice/preview', methods=['POST'])
+@login_required
+def reprice_preview():
+    data = request.get_json(silent=True) or {}
+    selection = data.get('filter') or {}
+    try:
+        changes = parse_reprice_changes(data.get('changes'))
+        products = reprice_selection(selection.get('supplier', '').strip(), selection.get('model', '').strip(),
+                                     selection.get('hs_code', '').strip())
+    except ValueError as e:
+        return json_response(message=str(e), success=False, status_code=400)
+    except ClientResponseError as e:
+        return json_response(message=str(e), success=False, status_code=500)
+    rows = [plan_reprice(vars(product), changes) for product in products]
+    return json_response(data={
+        "matched": len(rows),
+        "changing": sum(1 for row in rows if row["changes"]),
+        "rows": rows,
+    })
+
+@app.route('/api/products/reprice', methods=['POST'])
+@login_required
+def reprice_apply():
+    data = request.get_json(silent=True) or {}
+    ids = [i for i in data.get('ids') or [] if isinstance(i, str) and _RECORD_ID.match(i)]
+    if not ids:
+        return json_response(message="No products to update", success=False, status_code=400)
+    if len(ids) > REPRICE_MAX_PRODUCTS:
+        return json_response(message=f"At most {REPRICE_MAX_PRODUCTS} products per update",
+                             success=False, status_code=400)
+    try:
+        changes = parse_reprice_changes(data.get('changes'))
+    except ValueError as e:
+        return json_response(message=str(e), success=False, status_code=400)
+
+    started = time.perf_counter()
+    rows = apply_reprice(list(dict.fromkeys(ids)), changes)
+    counts = Counter(row["status"] for row in rows)
+    product_log.info("Repriced %s products (%s failed) in %.1fs", counts["updated"], counts["failed"],
+                     time.perf_counter() - started)
+    return json_response(data={
+        "updated": counts["updated"],
+        "unchanged": counts["unchanged"],
+        "failed": counts["failed"],
+        "seconds": round(time.perf_counter() - started, 2),
+        "rows": rows,
+    })
+
+# =============================================================================
+# INQUIRY STATUS HISTORY
+# =============================================================================
+# Every status change is appended to the `inquiry_status_log` collection
+# (text fields: inquiry_id, from_status, to_status, changed_by; an empty
+# to_status marks a deleted inquiry). Each worker folds log entries into
+# running funnel aggregates, reading only entries created since its last sync.
+
+status_log = logging.getLogger('rbl.inquiries.status')
+
+STATUS_LOG_COLLECTION = "inquiry_status_log"
+STAGE_DURATION_BUCKETS = tuple(60 * 2 ** k for k in range(20))  # seconds, 1 min .. ~1 year
+
+class StageFunnel:
+    """Incrementally maintained per-stage counts, conversion and time-in-stage."""
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.index = {stage: i for i, stage in enumerate(self.stages)}
+        n = len(self.stages)
+        self.current = {}       # inquiry_id -> (stage, entered_at epoch seconds)
+        self.reached_mask = {}  # inquiry_id -> bitmask of stages ever entered
+        self.in_stage = [0] * n
+        self.reached = [0] * n
+        self.duration_count = [0] * n
+        self.duration_sum = [0.0] * n
+        self.duration_max = [0.0] * n
+        self.duration_buckets = [[0] * (len(STAGE_DURATION_BUCKETS) + 1) for _ in range(n)]
+        self.transitions = 0
+        self.cursor = None      # created timestamp of the newest applied entry
+        self.cursor_ids = set() # entries already applied at exactly that timestamp
+        self.synced_at = None
+        self.lock = threading.Lock()
+
+    def apply(self, inquiry_id, to_status, at):
+        """Fold one logged transition into the aggregates."""
+        previous = self.current.pop(inquiry_id, None)
+        i = self.index.get(to_status)
+        if previous:
+            j = self.index[previous[0]]
+            self.in_stage[j] -= 1
+            if i is not None:  # a deleted inquiry never completed its stage
+                self._observe(j, max(at - previous[1], 0.0))
+        if i is None:  # deleted, or a status outside status_order
+            return
+        self.transitions += 1
+        self.current[inquiry_id] = (to_status, at)
+        self.in_stage[i] += 1
+        mask = self.reached_mask.get(inquiry_id, 0)
+        if not mask & (1 << i):
+            self.reached_mask[inquiry_id] = mask | (1 << i)
+            self.reached[i] += 1
+
+    def _observe(self, i, seconds):
+        self.duration_count[i] += 1
+        self.duration_sum[i] += seconds
+        self.duration_max[i] = max(self.duration_max[i], seconds)
+        for b, bound in enumerate(STAGE_DURATION_BUCKETS):
+            if seconds <= bound:
+                self.duration_buckets[i][b] += 1
+                break
+        else:
+            self.duration_buckets[i][-1] += 1
+
+    def _percentile(self, i, q):
+        """Upper bound of the histogram bucket holding the q-th quantile (capped at the max seen)."""
+        target, seen = q * self.duration_count[i], 0
+        for bound, count in zip(STAGE_DURATION_BUCKETS + (float('inf'),), self.duration_buckets[i]):
+            seen += count
+            if seen >= target:
+                return min(bound, self.duration_max[i])
+        return self.duration_max[i]
+
+    def sync(self):
+        """Apply log entries written (by any worker) since the last sync."""
+        with self.lock:
+            query = {"sort": "created,id"}
+            if self.cursor:
+                query["filter"] = f'created >= "{self.cursor}"'
+            entries = pb.collection(STATUS_LOG_COLLECTION).get_full_list(batch=500, query_params=query)
+            for entry in entries:
+                if entry.id in self.cursor_ids:
+                    continue
+                created = entry.created
+                if isinstance(created, str):
+                    created = parse_iso_datetime_with_tz(created.replace('Z', '+00:00'))
+                elif created.tzinfo is None:
+                    created = created.replace(tzinfo=timezone.utc)
+                self.apply(getattr(entry, 'inquiry_id', ''), getattr(entry, 'to_status', ''), created.timestamp())
+
+                cursor = created.strftime('%Y-%m-%d %H:%M:%S')
+                if cursor != self.cursor:
+                    self.cursor, self.cursor_ids = cursor, set()
+                self.cursor_ids.add(entry.id)
+            self.synced_at = datetime.now(timezone.utc)
+
+    def summary(self):
+        with self.lock:
+            stages = []
+            for i, stage in enumerate(self.stages):
+                count = self.duration_count[i]
+                previous = self.reached[i - 1] if i else None
+                stages.append({
+                    'status': stage,
+                    'current': self.in_stage[i],
+                    'reached': self.reached[i],
+                    'conversion_from_previous': round(self.reached[i] / previous, 4) if previous else None,
+                    'conversion_from_start': round(self.reached[i] / self.reached[0], 4) if self.reached[0] else None,
+                    'time_in_stage': {
+                        'completed': count,
+                        'mean_hours': round(self.duration_sum[i] / count / 3600, 2) if count else None,
+                        'p50_hours': round(self._percentile(i, 0.5) / 3600, 2) if count else None,
+                        'p90_hours': round(self._percentile(i, 0.9) / 3600, 2) if count else None,
+                        'max_hours': round(self.duration_max[i] / 3600, 2) if count else None,
+                    },
+                })
+            return {
+                'stages': stages,
+                'transitions': self.transitions,
+                'as_of': self.synced_at.isoformat() if self.synced_at else None,
+            }
+
+stage_funnel = StageFunnel(status for status, _, _ in status_order)
+
+def record_status_transition(inquiry_id, from_status, to_status, changed_by=None):
+    """Append a status change to the log; failures are logged, never raised."""
+    if changed_by is None:
+        changed_by = session.get('user_id', '') if has_request_context() else ''
+    try:
+        pb.collection(STATUS_LOG_COLLECTION).create({
+            "inquiry_id": inquiry_id,
+            "from_status": from_status or "",
+            "to_status": to_status or "",
+            "changed_by": changed_by,
+        })
+    except ClientResponseError as e:
+        status_log.warning("Could not log status change of inquiry %s to %r: %s", inquiry_id, to_status, e)
+
 # =============================================================================
 # INQUIRY MANAGEMENT ROUTES
 # =============================================================================
 
+inquiry_log = logging.getLogger('rbl.inquiries')
+
 @app.route('/inquiries')
 @login_required
 def inquiry_page():
-    return render_template('inquiry.html')
+    return render_template('inquiry.html', statuses=[status for status, _, _ in status_order])
 
 @app.route("/api/inquiries")
 @login_required
@@ -828,6 +3273,9 @@ def get_inquiries():
         per_page = request.args.get("perPage", INQUIRIES_PER_PAGE, type=int)
         customer_id = request.args.get("customer_id", None)
         search_query = request.args.get("search", "").strip()
+        # Cursor paging unless the caller asks for a numbered page
+        cursor = request.args.get("cursor")
+        keyset = "page" not in request.args
 
         # Build filter string
         filters = []
@@ -885,6 +3333,19 @@ def get_inquiries():
                     filtered_inquiries.append(inq)
             
             all_inquiries_sorted = filtered_inquiries
+        elif keyset:
+            # One page straight from PocketBase; stats come from count queries
+            filter_str = " && ".join(filters)
+            skip_total = skip_total_requested()
+            pager = keyset_page(INQUIRY_COLLECTION, per_page, cursor=cursor,
+                                filter_str=filter_str, skip_total=skip_total)
+            all_inquiries_sorted = None
+            if skip_total:
+                stats = None
+            else:
+                closed_filter = " && ".join(filters + ['status = "Closed"'])
+                closed = count_records(INQUIRY_COLLECTION, closed_filter)
+                stats = {"total": pager["total"], "active": pager["total"] - closed, "closed": closed}
         else:
             # Regular filtering without search
             if filters:
@@ -897,13 +3358,27 @@ def get_inquiries():
                 )
             all_inquiries_sorted = all_inquiries
 
-        # Paginate manually
-        start = (page - 1) * per_page
-        end = start + per_page
-        items = all_inquiries_sorted[start:end]
+        if all_inquiries_sorted is not None:
+            stats = {
+                "total": len(all_inquiries_sorted),
+                "active": len([inq for inq in all_inquiries_sorted if getattr(inq, "status", "") != "Closed"]),
+                "closed": len([inq for inq in all_inquiries_sorted if getattr(inq, "status", "") == "Closed"])
+            }
+
+        if keyset:
+            if all_inquiries_sorted is not None:
+                pager = keyset_slice(all_inquiries_sorted, per_page, cursor)
+                items = pager["items"]
+            else:
+                items = [Record(row) for row in pager["items"]]
+        else:
+            # Paginate manually
+            start = (page - 1) * per_page
+            end = start + per_page
+            items = all_inquiries_sorted[start:end]
 
-        total_items = len(all_inquiries_sorted)
-        total_pages = ceil(total_items / per_page) if total_items > 0 else 1
+            total_items = len(all_inquiries_sorted)
+            total_pages = ceil(total_items / per_page) if total_items > 0 else 1
 
         inquiries = []
         for inq in items:
@@ -930,20 +3405,25 @@ def get_inquiries():
                 "status": getattr(inq, "status", ""),
             })
 
+        if keyset:
+            return jsonify({
+                "items": inquiries,
+                "totalItems": pager["total"],
+                "perPage": per_page,
+                "nextCursor": pager["next"],
+                "prevCursor": pager["prev"],
+                "stats": stats
+            })
         return jsonify({
             "items": inquiries,
             "totalItems": total_items,
             "totalPages": total_pages,
             "currentPage": page,
             "perPage": per_page,
-            "stats": {
-                "total": len(all_inquiries_sorted),
-                "active": len([inq for inq in all_inquiries_sorted if getattr(inq, "status", "") != "Closed"]),
-                "closed": len([inq for inq in all_inquiries_sorted if getattr(inq, "status", "") == "Closed"])
-            }
+            "stats": stats
         })
     except Exception as e:
-        print("Error in /api/inquiries:", e)
+        inquiry_log.exception("Error in /api/inquiries")
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/inquiries", methods=["POST"])
@@ -987,7 +3467,7 @@ def create_inquiry():
         return jsonify({"error": f"Error processing customer/product data: {str(e)}"}), 400
 
     try:
-        print(f"Creating inquiry with customer_id={customer_id}, product_id={product_id}, inquiry_no={inquiry_no}")
+        inquiry_log.debug("Creating inquiry %s for customer %s, product %s", inquiry_no, customer_id, product_id)
         record = pb.collection(INQUIRY_COLLECTION).create({
             "inquiry_no": inquiry_no,
             "customer_id": customer_id,
@@ -997,7 +3477,9 @@ def create_inquiry():
             "remarks": data.get("remarks", ""),
             "status": data.get("status", "Inquiry")
         })
-        print(f"Inquiry created: {record}")
+        inquiry_log.info("Inquiry %s created (%s)", record.id, inquiry_no)
+        record_status_transition(record.id, "", record.status)
+        schedule_summary_refresh(customer_id)
         return json_response(data={"id": record.id}, message="Inquiry created", success=True, status_code=201)
     except ClientResponseError as e:
         return json_response(message=str(e), success=False, status_code=500)
@@ -1063,16 +3545,120 @@ def update_inquiry(inquiry_id):
         }
 
         pb.collection(INQUIRY_COLLECTION).update(inquiry_id, update_data)
+        previous_status = getattr(record, "status", "")
+        if status != previous_status:
+            record_status_transition(inquiry_id, previous_status, status)
+        schedule_summary_refresh(getattr(record, "customer_id", ""), customer_id)
         return jsonify({"message": "Inquiry updated"})
     except Exception as e:
-        print("Error in update_inquiry:", e)
+        inquiry_log.exception("Error in update_inquiry")
         return jsonify({"error": str(e)}), 500
 
+INQUIRY_BULK_MAX = 500
+
+def status_change_error(from_status, to_status, allow_backward=False):
+    """Why `from_status` -> `to_status` is not allowed, or None if it is."""
+    stages = [status for status, _, _ in status_order]
+    if to_status not in stages:
+        return f"Unknown status {to_status!r}"
+    # Statuses outside status_order (older records) can move anywhere
+    if not allow_backward and from_status in stages and stages.index(from_status) > stages.index(to_status):
+        return f"Cannot move back from {from_status} to {to_status}"
+    return None
+
+@app.route("/api/inquiries/status", methods=["POST"])
+@login_required
+def bulk_update_inquiry_status():
+    """Move many inquiries to one status: {"ids": [...], "status": ..., "allow_backward": false}."""
+    data = request.get_json(silent=True) or {}
+    target = data.get("status")
+    allow_backward = bool(data.get("allow_backward"))
+    ids = list(dict.fromkeys(i for i in data.get("ids") or [] if isinstance(i, str) and _RECORD_ID.match(i)))
+    if target not in [status for status, _, _ in status_order]:
+        return json_response(message=f"Unknown status {target!r}", success=False, status_code=400)
+    if not ids:
+        return json_response(message="No inquiries selected", success=False, status_code=400)
+    if len(ids) > INQUIRY_BULK_MAX:
+        return json_response(message=f"At most {INQUIRY_BULK_MAX} inquiries at a time", success=False, status_code=400)
+
+    # Current status and customer of every selected inquiry, a chunk of ids per read
+    try:
+        current = {}
+        for chunk in _id_chunks(ids, SUMMARY_ID_CHUNK):
+            current.update((record.id, record) for record in pb.collection(INQUIRY_COLLECTION).get_full_list(
+                batch=500, query_params={
+                    "filter": " || ".join(f'id = "{inquiry_id}"' for inquiry_id in chunk),
+                    "fields": "id,status,customer_id",
+                }
+            ))
+    except ClientResponseError as e:
+        return json_response(message=str(e), success=False, status_code=500)
+
+    results, pending = {}, []
+    for inquiry_id in ids:
+        record = current.get(inquiry_id)
+        if record is None:
+            results[inquiry_id] = {"id": inquiry_id, "outcome": "not_found"}
+            continue
+        from_status = getattr(record, "status", "")
+        result = {"id": inquiry_id, "from": from_status, "to": target}
+        error = status_change_error(from_status, target, allow_backward)
+        if from_status == target:
+            results[inquiry_id] = dict(result, outcome="unchanged")
+        elif error:
+            results[inquiry_id] = dict(result, outcome="rejected", error=error)
+        else:
+            pending.append((record, result))
+
+    changed_by = session.get('user_id', '')
+
+    # One PATCH per inquiry (no batch call in the SDK used here), run
+    # BULK_WRITE_CONCURRENCY at a time in the background bulkhead
+    def apply(item):
+        record, result = item
+        try:
+            resp = pb_http.patch(f"{POCKETBASE_URL}/api/collections/{INQUIRY_COLLECTION}/records/{record.id}",
+                                 json={"status": target}, headers=HEADERS)
+        except requests.RequestException as e:
+            return dict(result, outcome="failed", error=str(e))
+        if resp.status_code != 200:
+            return dict(result, outcome="failed", error=f"HTTP {resp.status_code}: {resp.text[:200]}")
+        record_status_transition(record.id, result["from"], target, changed_by=changed_by)
+        return dict(result, outcome="updated")
+
+    with ThreadPoolExecutor(max_workers=BULK_WRITE_CONCURRENCY, thread_name_prefix='inquiry-status') as pool:
+        for result in pool.map(apply, pending):
+            results[result["id"]] = result
+    # Only open_count depends on status, and only closing or reopening changes it
+    schedule_summary_refresh(*{getattr(current[r["id"]], "customer_id", "") for r in results.values()
+                               if r["outcome"] == "updated" and (r["from"] == "Closed") != (target == "Closed")})
+
+    counts = Counter(r["outcome"] for r in results.values())
+    inquiry_log.info("Bulk status change to %s: %s", target, dict(counts))
+    return json_response(data=dict(
+        {outcome: counts[outcome] for outcome in ("updated", "unchanged", "rejected", "failed", "not_found")},
+        status=target,
+        results=[results[inquiry_id] for inquiry_id in ids],
+    ))
+
+@app.route("/api/inquiries/funnel")
+@login_required
+def inquiry_funnel():
+    """Per-stage counts, conversion rates and time-in-stage from the status log."""
+    try:
+        stage_funnel.sync()
+    except ClientResponseError as e:
+        status_log.warning("Could not sync status log: %s", e)
+    return json_response(data=stage_funnel.summary())
+
 @app.route("/api/inquiries/<inquiry_id>", methods=["DELETE"])
 @login_required
 def delete_inquiry(inquiry_id):
     try:
+        record = pb.collection(INQUIRY_COLLECTION).get_one(inquiry_id, {"fields": "id,customer_id"})
         pb.collection(INQUIRY_COLLECTION).delete(inquiry_id)
+        record_status_transition(inquiry_id, "", "")
+        schedule_summary_refresh(getattr(record, "customer_id", ""))
         return jsonify({"message": "Inquiry deleted"})
     except ClientResponseError as e:
         return jsonify({"error": str(e)}), 500
@@ -1083,6 +3669,9 @@ def delete_inquiry(inquiry_id):
 @login_required
 def get_customers():
     try:
+        if replica.serves(CUSTOMER_COLLECTION):
+            return json_response(data=[{"id": r["id"], "name": r.get("name", "")}
+                                       for r in replica.all(CUSTOMER_COLLECTION)])
         records = pb.collection(CUSTOMER_COLLECTION).get_full_list()
         return json_response(data=[{"id": r.id, "name": r.name} for r in records])
     except ClientResponseError as e:
@@ -1092,6 +3681,9 @@ def get_customers():
 @login_required
 def get_products():
     try:
+        if replica.serves(PRODUCT_COLLECTION):
+            return json_response(data=[{"id": r["id"], "name": r.get("name", ""), "price": r.get("price", 0)}
+                                       for r in replica.all(PRODUCT_COLLECTION)])
         records = pb.collection(PRODUCT_COLLECTION).get_full_list()
         return json_response(data=[{
             "id": r.id, 
@@ -1135,10 +3727,8 @@ def customer_history(customer_id):
 @login_required
 def get_customer_details(customer_id):
     try:
-        print(f"Fetching customer details for ID: {customer_id}")  # Debug print
         customer = pb.collection(CUSTOMER_COLLECTION).get_one(customer_id)
         if not customer:
-            print(f"Customer not found for ID: {customer_id}")  # Debug print
             return jsonify({'error': 'Customer not found'}), 404
         # Convert to dict for JSON response
         cust_dict = {
@@ -1151,10 +3741,9 @@ def get_customer_details(customer_id):
             'notes': getattr(customer, 'notes', ''),
             'created': str(getattr(customer, 'created', '')),
         }
-        print(f"Customer found: {cust_dict}")  # Debug print
         return jsonify({'customer': cust_dict})
     except Exception as e:
-        print(f"Error in /api/customers/<customer_id>/details: {e}")
+        customer_log.warning("Error loading customer %s details: %s", customer_id, e)
         return jsonify({'error': str(e)}), 500
 
 # =============================================================================
@@ -1166,15 +3755,12 @@ def get_customer_details(customer_id):
 @login_required
 def staff():
     # Block access for Staff users
-    if session.get('user_role') == 'staff':
+    if current_role() == 'staff':
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
     
     try:
-        # Ensure admin authentication for fetching all users
-        ensure_admin_auth()
-        # Fetch all users from PocketBase users collection
-        users = pb.collection('users').get_full_list()
+        users = identity_cache.all()
     except ClientResponseError as e:
         flash(f"Error fetching users: {e}", 'error')
         users = []
@@ -1208,6 +3794,7 @@ def add_staff():
             }
             
             pb.collection('users').create(user_data)
+            identity_cache.invalidate()
             flash('Staff member created successfully!', 'success')
             return redirect(url_for('staff'))
             
@@ -1250,6 +3837,7 @@ def edit_staff(user_id):
             
             # Update user in PocketBase
             pb.collection('users').update(user_id, update_data)
+            identity_cache.invalidate()
             flash('Staff member updated successfully!', 'success')
             return redirect(url_for('staff'))
         
@@ -1277,6 +3865,7 @@ def delete_staff():
         
         # Delete user from PocketBase
         pb.collection('users').delete(user_id)
+        identity_cache.invalidate()
         flash(f'Staff member "{user.email}" has been deleted successfully!', 'success')
         
     except ClientResponseError as e:
@@ -1293,6 +3882,8 @@ def delete_staff():
 # REMINDER MANAGEMENT ROUTES
 # =============================================================================
 
+reminder_log = logging.getLogger('rbl.reminders')
+
 from datetime import datetime, timedelta
 
 @app.route('/add_reminder', methods=['POST'])
@@ -1384,14 +3975,7 @@ def edit_reminder(reminder_id):
             if not datetime_str:
                 datetime_str = request.form.get("datetime")
 
-            # Debug logging
-            print(f"Form data received:")
-            print(f"  topic: {topic}")
-            print(f"  description: {description}")
-            print(f"  datetime_utc: {request.form.get('datetime_utc')}")
-            print(f"  datetime: {request.form.get('datetime')}")
-            print(f"  email: {email}")
-            print(f"  All form keys: {list(request.form.keys())}")
+            reminder_log.debug("Editing reminder %s with form keys %s", reminder_id, list(request.form.keys()))
 
             if not (topic and description and datetime_str and email):
                 missing_fields = []
@@ -1400,7 +3984,6 @@ def edit_reminder(reminder_id):
                 if not datetime_str: missing_fields.append("datetime")
                 if not email: missing_fields.append("email")
                 error_msg = f"Missing required fields: {', '.join(missing_fields)}"
-                print(f"Validation failed: {error_msg}")
                 return flash_and_redirect(error_msg, "error", "edit_reminder", reminder_id=reminder_id)
 
             try:
@@ -1421,7 +4004,7 @@ def edit_reminder(reminder_id):
                     raise ValueError("No datetime provided")
 
             except Exception as e:
-                print(f"DateTime conversion error: {e}")
+                reminder_log.info("DateTime conversion error for reminder %s: %s", reminder_id, e)
                 return flash_and_redirect(f"Invalid datetime format: {e}", "error", "edit_reminder", reminder_id=reminder_id)
 
             update_data = {
@@ -1451,88 +4034,163 @@ def edit_reminder(reminder_id):
 # SUPPLIER MANAGEMENT ROUTES
 # =============================================================================
 
+supplier_log = logging.getLogger('rbl.suppliers')
+
+class SupplierProductIndex:
+    """Per-worker supplier -> product ids index with buying-rate ranges, built from one products read."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.products = {}     # product id -> (supplier ids, buying rate or None)
+        self.by_supplier = {}  # supplier id -> set of product ids
+        self.loaded_at = None
+        self.replay = None     # writes made while a load runs, applied to what it read
+        self.lock = threading.Lock()       # guards the maps, never held across a network call
+        self.load_lock = threading.Lock()  # one refresh at a time
+
+    def _fresh(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def _refresh(self):
+        """Reload if stale. Only the first load is waited for; later ones serve the old index meanwhile."""
+        if self._fresh():
+            return
+        if not self.load_lock.acquire(blocking=self.loaded_at is None):
+            return
+        try:
+            if self._fresh():
+                return
+            with self.lock:
+                self.replay = []
+            records = pb.collection(PRODUCT_COLLECTION).get_full_list(
+                batch=1000, query_params={"fields": "id,supplier,buying_rate"}
+            )
+            products, by_supplier = {}, {}
+            for record in records:
+                self._add(products, by_supplier, record.id, getattr(record, 'supplier', ''), getattr(record, 'buying_rate', ''))
+            with self.lock:
+                # A product saved during the read may be missing from it or read as it was before
+                for product_id, record in self.replay:
+                    self._put(products, by_supplier, product_id, record)
+                self.products, self.by_supplier = products, by_supplier
+                self.loaded_at = time.monotonic()
+        finally:
+            with self.lock:
+                self.replay = None
+            self.load_lock.release()
+
+    @staticmethod
+    def _add(products, by_supplier, product_id, supplier, buying_rate):
+        suppliers = tuple(s for s in (supplier if isinstance(supplier, list) else [supplier]) if s)
+        try:
+            rate = float(buying_rate) if buying_rate not in (None, '') else None
+        except (TypeError, ValueError):
+            rate = None
+        products[product_id] = (suppliers, rate)
+        for supplier_id in suppliers:
+            by_supplier.setdefault(supplier_id, set()).add(product_id)
+
+    @staticmethod
+    def _remove(products, by_supplier, product_id):
+        suppliers, _ = products.pop(product_id, ((), None))
+        for supplier_id in suppliers:
+            by_supplier.get(supplier_id, set()).discard(product_id)
+
+    def _put(self, products, by_supplier, product_id, record):
+        """Apply a write to the given maps; record is None for a delete."""
+        self._remove(products, by_supplier, product_id)
+        if record is not None:
+            self._add(products, by_supplier, product_id, record.get('supplier', ''), record.get('buying_rate', ''))
+
+    def _write(self, product_id, record):
+        with self.lock:
+            self._put(self.products, self.by_supplier, product_id, record)
+            if self.replay is not None:
+                self.replay.append((product_id, record))
+
+    def put(self, record):
+        """Apply a created/updated product (record JSON as returned by PocketBase)."""
+        self._write(record['id'], record)
+
+    def discard(self, product_id):
+        self._write(product_id, None)
+
+    def stats(self, supplier_ids):
+        """{supplier id: {product_count, min_buying_rate, max_buying_rate}} for the given suppliers."""
+        try:
+            self._refresh()
+        except ClientResponseError as e:
+            supplier_log.warning("Could not refresh supplier product index: %s", e)
+        with self.lock:
+            result = {}
+            for supplier_id in supplier_ids:
+                product_ids = self.by_supplier.get(supplier_id, ())
+                rates = [self.products[pid][1] for pid in product_ids if self.products[pid][1] is not None]
+                result[supplier_id] = {
+                    'product_count': len(product_ids),
+                    'min_buying_rate': min(rates) if rates else None,
+                    'max_buying_rate': max(rates) if rates else None,
+                }
+            return result
+
+supplier_product_index = SupplierProductIndex(SUPPLIER_INDEX_TTL)
+
 @app.route('/suppliers')
 @login_required
 def suppliers():
     # Block access for Staff users
-    if session.get('user_role') == 'staff':
+    if current_role() == 'staff':
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
     
     search_query = request.args.get('search', '').strip()
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
 
     try:
-        print(f"DEBUG: Fetching suppliers, page={page}, search='{search_query}'")
         
-        # Build filter string
-        filter_str = ''
-        if search_query:
-            filter_str = (
-                f'name ~ "{search_query}" || '
-                f'email ~ "{search_query}" || '
-                f'contact ~ "{search_query}"'
-            )
-
-        # Fetch paginated supplier records - Use lowercase "suppliers"
-        if filter_str:
-            print(f"DEBUG: Using filter: {filter_str}")
-            result = pb.collection("suppliers").get_list(
-                page=page,
-                per_page=SUPPLIERS_PER_PAGE,
-                query_params={
-                    "filter": filter_str
-                }
-            )
-        else:
-            print("DEBUG: No filter, fetching all suppliers")
-            result = pb.collection("suppliers").get_list(
-                page=page,
-                per_page=SUPPLIERS_PER_PAGE
-            )
+        # Fetch one page of supplier records, newest first - Use lowercase "suppliers"
+        pager = keyset_page("suppliers", SUPPLIERS_PER_PAGE, cursor=cursor,
+                            search_fields=('name', 'email', 'contact'), search=search_query,
+                            skip_total=skip_total_requested())
 
-        print(f"DEBUG: Result - items count: {len(result.items)}, total: {result.total_items}")
+        supplier_log.debug("Suppliers page (search %r): %s of %s", search_query, len(pager["items"]), pager["total"])
         
-        records = result.items
-        total_suppliers = result.total_items
-        total_pages = ceil(total_suppliers / SUPPLIERS_PER_PAGE)
+        records = pager["items"]
+        total_suppliers = pager["total"]
 
-        # Convert Record objects to dicts
+        # Pick the fields the template uses
+        product_stats = supplier_product_index.stats([s["id"] for s in records])
         suppliers_full = []
         for s in records:
             supplier_data = {
-                "id": s.id,
-                "name": getattr(s, "name", ""),
-                "email": getattr(s, "email", ""),
-                "contact": getattr(s, "contact", ""),
-                "handle": getattr(s, "handle", ""),
-                "address": getattr(s, "address", ""),
-                "created": getattr(s, "created", None)
+                **product_stats[s["id"]],
+                "id": s["id"],
+                "name": s.get("name", ""),
+                "email": s.get("email", ""),
+                "contact": s.get("contact", ""),
+                "handle": s.get("handle", ""),
+                "address": s.get("address", ""),
+                "created": s.get("created", None),
+                "updated": s.get("updated", None)
             }
             suppliers_full.append(supplier_data)
-            print(f"DEBUG: Added supplier: {supplier_data}")
 
         # Get count for active suppliers (for now, assume all are active)
         active_suppliers = total_suppliers
-        
-        print(f"DEBUG: Final counts - total: {total_suppliers}, active: {active_suppliers}")
 
     except Exception as e:
-        print(f"ERROR: Exception fetching suppliers: {e}")
-        import traceback
-        traceback.print_exc()
+        supplier_log.exception("Error fetching suppliers")
         flash(f"Error fetching suppliers: {e}", 'error')
         suppliers_full = []
         total_suppliers = 0
-        total_pages = 1
+        pager = {"next": None, "prev": None, "total": 0}
         active_suppliers = 0
 
     return render_template('suppliers.html', 
                          suppliers=suppliers_full,
                          total_suppliers=total_suppliers,
                          active_suppliers=active_suppliers,
-                         current_page=page,
-                         total_pages=total_pages,
+                         pager=pager,
                          search_query=search_query)
 
 @app.route('/add_supplier', methods=['GET', 'POST'])
@@ -1561,21 +4219,21 @@ def add_supplier():
             
             # Send request to PocketBase API (same pattern as add_product)
             pb_url = f"{POCKETBASE_URL}/api/collections/suppliers/records"
-            resp = requests.post(pb_url, data=pb_data, headers=HEADERS)
-            
-            # Debug output to terminal
-            print("PocketBase Response:", resp.status_code, resp.text)
+            resp = pb_http.post(pb_url, data=pb_data, headers=HEADERS)
             
+            supplier_log.debug("PocketBase response %s for new supplier", resp.status_code)
+
             if resp.status_code in (200, 201):
+                replica.put(SUPPLIER_COLLECTION, resp.json())
                 flash('Supplier added successfully!', 'success')
                 return redirect(url_for('suppliers'))
             else:
                 flash(f'Error adding supplier: {resp.text}', 'error')
-                print(f"Error adding supplier: {resp.text}")
+                supplier_log.warning("Error adding supplier: HTTP %s %s", resp.status_code, resp.text)
                 
         except Exception as e:
             flash(f'Unexpected error: {str(e)}', 'error')
-            print(f"Unexpected error in add_supplier: {e}")
+            supplier_log.exception("Unexpected error in add_supplier")
     
     return render_template('add_supplier.html')
 
@@ -1608,41 +4266,43 @@ def get_supplier_details(supplier_id):
         
         return jsonify({'supplier': supplier_dict})
     except Exception as e:
-        print(f"Error in /api/suppliers/{supplier_id}/details: {e}")
+        supplier_log.warning("Error loading supplier %s details: %s", supplier_id, e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/suppliers/<supplier_id>/products')
 @login_required
 def get_supplier_products(supplier_id):
     try:
-        # Get all products for this supplier (supplier field is an array)
-        products = pb.collection("products").get_full_list(
-            query_params={
-                "filter": f'supplier ~ "{supplier_id}"'
-            }
-        )
+        # Exact match on the supplier relation (single or multiple)
+        products = report_query('supplier_products', supplier_id)
         
-        # Convert products to list of dicts
+        # Pick the fields the page shows
         products_list = []
         for product in products:
             product_dict = {
-                'id': getattr(product, 'id', ''),
-                'product_id': getattr(product, 'product_id', ''),
-                'name': getattr(product, 'name', ''),
-                'description': getattr(product, 'description', ''),
-                'price': getattr(product, 'price', ''),
-                'model': getattr(product, 'model', ''),
-                'buying_rate': getattr(product, 'buying_rate', ''),
-                'selling_rate': getattr(product, 'selling_rate', ''),
-                'specifications': getattr(product, 'specifications', ''),
-                'hs_code': getattr(product, 'hs_code', ''),
-                'created': str(getattr(product, 'created', '')),
+                'id': product.get('id', ''),
+                'product_id': product.get('product_id', ''),
+                'name': product.get('name', ''),
+                'description': product.get('description', ''),
+                'price': product.get('price', ''),
+                'model': product.get('model', ''),
+                'buying_rate': product.get('buying_rate', ''),
+                'selling_rate': product.get('selling_rate', ''),
+                'specifications': product.get('specifications', ''),
+                'hs_code': product.get('hs_code', ''),
+                'created': str(product.get('created', '')),
             }
             products_list.append(product_dict)
-        
-        return jsonify({'products': products_list})
+
+        rates = [_to_float(p['buying_rate']) for p in products_list if p['buying_rate'] not in (None, '')]
+        summary = {
+            'product_count': len(products_list),
+            'min_buying_rate': min(rates) if rates else None,
+            'max_buying_rate': max(rates) if rates else None,
+        }
+        return jsonify({'products': products_list, 'summary': summary})
     except Exception as e:
-        print(f"Error in /api/suppliers/{supplier_id}/products: {e}")
+        supplier_log.warning("Error loading supplier %s products: %s", supplier_id, e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/supplier/<supplier_id>/edit', methods=['GET', 'POST'])
@@ -1665,6 +4325,7 @@ def edit_supplier(supplier_id):
             try:
                 # Update supplier with new data
                 pb.collection(SUPPLIER_COLLECTION).update(supplier_id, updated_data)
+                replica.reload(SUPPLIER_COLLECTION, supplier_id)
                 flash("Supplier updated successfully!", "success")
                 return redirect(url_for('supplier_details', supplier_id=supplier_id))
                 
@@ -1700,9 +4361,8 @@ def delete_supplier():
         return redirect(url_for('suppliers'))
     
     try:
-        pb.collection(SUPPLIER_COLLECTION).delete(supplier_id)
-        flash('Supplier deleted successfully', 'success')
-    except ClientResponseError as e:
+        flash(*cascade_message(cascade_delete(SUPPLIER_COLLECTION, supplier_id), "supplier"))
+    except (ClientResponseError, requests.RequestException) as e:
         flash(f'Error deleting supplier: {e}', 'error')
     
     return redirect(url_for('suppliers'))
@@ -1711,61 +4371,272 @@ def delete_supplier():
 # CUSTOMER MANAGEMENT ROUTES
 # =============================================================================
 
+customer_log = logging.getLogger('rbl.customers')
+
+# Likely duplicates are found through normalised keys instead of scanning the
+# collection: digits-only phone (last 10 digits, so +977/0 prefixes don't
+# matter), lowercased email, a Soundex key of the name's words in any order,
+# and name trigrams scored by Jaccard similarity. Trigrams shared by more than
+# MATCH_TRIGRAM_LIMIT customers are too common to narrow anything down and
+# only count once a customer is a candidate through a rarer one.
+
+MATCH_NAME_SIMILARITY = 0.6
+MATCH_TRIGRAM_LIMIT = 500
+MATCH_FIELDS = "id,customer_id,name,email,phone"
+
+_SOUNDEX_CODES = {c: d for d, letters in enumerate(('aeiouyhw', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r'))
+                  for c in letters}
+
+def _phone_key(phone):
+    digits = re.sub(r'\D', '', str(phone or ''))
+    return digits[-10:] if len(digits) >= 7 else ''
+
+def _email_key(email):
+    return str(email or '').strip().lower()
+
+def _name_tokens(name):
+    return re.findall(r'[^\W\d_]+', str(name or '').lower())
+
+def _soundex(word):
+    first, last, code = word[0], _SOUNDEX_CODES.get(word[0]), ''
+    for c in word[1:]:
+        digit = _SOUNDEX_CODES.get(c)
+        if digit and digit != last:
+            code += str(digit)
+        if c not in 'hw':
+            last = digit
+    return (first + code + '000')[:4]
+
+def _name_key(tokens):
+    return ' '.join(sorted(_soundex(t) for t in tokens))
+
+def _trigrams(tokens):
+    text = f" {' '.join(tokens)} "
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+class CustomerMatchIndex:
+    """Per-worker lookup of customers by phone, email and name keys, built from one customers read."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.customers = {}  # customer id -> entry with the keys below
+        self.by_phone, self.by_email, self.by_sound, self.by_trigram = {}, {}, {}, {}
+        self.loaded_at = None
+        self.replay = None     # writes made while a load runs, applied to what it read
+        self.lock = threading.Lock()       # guards the maps, never held across a network call
+        self.load_lock = threading.Lock()  # one refresh at a time
+
+    def _fresh(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def _refresh(self):
+        """Reload if stale. Only the first load is waited for; later ones serve the old index meanwhile."""
+        if self._fresh():
+            return
+        if not self.load_lock.acquire(blocking=self.loaded_at is None):
+            return
+        try:
+            if self._fresh():
+                return
+            with self.lock:
+                self.replay = []
+            if replica.serves(CUSTOMER_COLLECTION):
+                records = replica.all(CUSTOMER_COLLECTION)
+            else:
+                records = [vars(r) for r in pb.collection(CUSTOMER_COLLECTION).get_full_list(
+                    batch=1000, query_params={"fields": MATCH_FIELDS}
+                )]
+            fresh = CustomerMatchIndex(self.ttl)
+            for record in records:
+                fresh._add(record)
+            with self.lock:
+                # A customer saved during the read may be missing from it or read as it was before
+                for customer_id, fields in self.replay:
+                    fresh._put(customer_id, fields)
+                self.customers = fresh.customers
+                self.by_phone, self.by_email, self.by_sound, self.by_trigram = (
+                    fresh.by_phone, fresh.by_email, fresh.by_sound, fresh.by_trigram)
+                self.loaded_at = time.monotonic()
+        finally:
+            with self.lock:
+                self.replay = None
+            self.load_lock.release()
+
+    def _postings(self, entry):
+        yield self.by_phone, entry['phone_key']
+        yield self.by_email, entry['email_key']
+        yield self.by_sound, entry['name_key']
+        for gram in entry['grams']:
+            yield self.by_trigram, gram
+
+    def _add(self, record):
+        tokens = _name_tokens(record.get('name'))
+        entry = {
+            'id': record['id'],
+            'customer_id': record.get('customer_id', ''),
+            'name': record.get('name', ''),
+            'email': record.get('email', ''),
+            'phone': record.get('phone', ''),
+            'phone_key': _phone_key(record.get('phone')),
+            'email_key': _email_key(record.get('email')),
+            'name_key': _name_key(tokens),
+            'grams': _trigrams(tokens) if tokens else frozenset(),
+        }
+        self.customers[entry['id']] = entry
+        for index, key in self._postings(entry):
+            if key:
+                index.setdefault(key, set()).add(entry['id'])
+
+    def _remove(self, customer_id):
+        entry = self.customers.pop(customer_id, None)
+        if entry:
+            for index, key in self._postings(entry):
+                index.get(key, set()).discard(customer_id)
+        return entry
+
+    def _ensure_loaded(self):
+        try:
+            self._refresh()
+        except ClientResponseError as e:
+            customer_log.warning("Could not refresh customer match index: %s", e)
+
+    def _put(self, customer_id, fields):
+        """Apply a write to the maps; fields is None for a delete."""
+        old = self._remove(customer_id) or {}
+        if fields is not None:
+            self._add({**{k: old.get(k, '') for k in ('customer_id', 'name', 'email', 'phone')},
+                       **fields, 'id': customer_id})
+
+    def _write(self, customer_id, fields):
+        with self.lock:
+            self._put(customer_id, fields)
+            if self.replay is not None:
+                self.replay.append((customer_id, fields))
+
+    def put(self, customer_id, fields):
+        """Apply a created/updated customer; fields not given keep their indexed values."""
+        self._write(customer_id, fields)
+
+    def discard(self, customer_id):
+        self._write(customer_id, None)
+
+    @staticmethod
+    def _public(entry):
+        return {k: entry[k] for k in ('id', 'customer_id', 'name', 'email', 'phone')}
+
+    def match(self, name='', email='', phone='', exclude=None, limit=10):
+        """Likely duplicates of the given details, strongest first, each with its matching reasons."""
+        phone_key, email_key, tokens = _phone_key(phone), _email_key(email), _name_tokens(name)
+        grams = _trigrams(tokens) if tokens else frozenset()
+        self._ensure_loaded()
+        with self.lock:
+            reasons = {}
+            for reason, ids in (('phone', self.by_phone.get(phone_key, ()) if phone_key else ()),
+                                ('email', self.by_email.get(email_key, ()) if email_key else ()),
+                                ('sounds_like', self.by_sound.get(_name_key(tokens), ()) if tokens else ())):
+                for customer_id in ids:
+                    reasons.setdefault(customer_id, []).append(reason)
+            similar = set()
+            for gram in grams:
+                ids = self.by_trigram.get(gram, ())
+                if len(ids) <= MATCH_TRIGRAM_LIMIT:
+                    similar.update(ids)
+
+            matches = []
+            for customer_id in set(reasons) | similar:
+                if customer_id == exclude:
+                    continue
+                entry = self.customers[customer_id]
+                shared = len(grams & entry['grams'])
+                similarity = shared / (len(grams) + len(entry['grams']) - shared) if shared else 0.0
+                why = reasons.get(customer_id, [])
+                if similarity >= MATCH_NAME_SIMILARITY:
+                    why = why + ['name']
+                if why:
+                    matches.append(dict(self._public(entry), reasons=why, name_similarity=round(similarity, 2)))
+        matches.sort(key=lambda m: (-sum(r in ('phone', 'email') for r in m['reasons']), -m['name_similarity']))
+        return matches[:limit]
+
+    def duplicate_groups(self):
+        """Customers linked by a shared phone or email, as groups of two or more, largest first."""
+        self._ensure_loaded()
+        with self.lock:
+            parent = {}
+
+            def root(customer_id):
+                while parent.get(customer_id, customer_id) != customer_id:
+                    customer_id = parent[customer_id]
+                return customer_id
+
+            for index in (self.by_phone, self.by_email):
+                for ids in index.values():
+                    if len(ids) < 2:
+                        continue
+                    ids = sorted(ids)
+                    first = root(ids[0])
+                    parent.setdefault(first, first)
+                    for other in ids[1:]:
+                        parent[root(other)] = first
+            members = {}
+            for customer_id in parent:
+                members.setdefault(root(customer_id), set()).add(customer_id)
+
+            groups = []
+            for ids in members.values():
+                entries = [self.customers[i] for i in sorted(ids)]
+                shared = [reason for reason, key in (('phone', 'phone_key'), ('email', 'email_key'))
+                          if len({e[key] for e in entries if e[key]}) < len([e for e in entries if e[key]])]
+                groups.append({'reasons': shared, 'customers': [self._public(e) for e in entries]})
+        groups.sort(key=lambda g: -len(g['customers']))
+        return groups
+
+customer_match_index = CustomerMatchIndex(CUSTOMER_MATCH_TTL)
+
+@app.cli.command('customer-duplicates')
+def customer_duplicates_command():
+    """List customers sharing a phone number or email address."""
+    groups = customer_match_index.duplicate_groups()
+    for group in groups:
+        click.echo(f"[{', '.join(group['reasons'])}]")
+        for c in group['customers']:
+            click.echo(f"  {c['id']}  {c['customer_id']:<16} {c['name']:<30} {c['phone']:<16} {c['email']}")
+    click.echo(f"{len(groups)} groups, {sum(len(g['customers']) for g in groups)} customers")
+
+def customer_counters():
+    """Customers added in the last 1, 7 and 30 days."""
+    now = datetime.now(timezone.utc)
+    return tuple(report_query('count', CUSTOMER_COLLECTION, now - timedelta(days=days)) for days in (1, 7, 30))
+
 @app.route('/customers', methods=['GET'])
 @login_required
 def customers():
     search_query = request.args.get('search', '').strip()
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
 
     try:
-        # Build filter string
-        filter_str = ''
-        if search_query:
-            filter_str = (
-                f'name ~ "{search_query}" || '
-                f'email ~ "{search_query}" || '
-                f'phone ~ "{search_query}" || '
-                f'customer_id ~ "{search_query}"'
-            )
-
-        # Fetch paginated customer records
-        if filter_str:
-            result = pb.collection(CUSTOMER_COLLECTION).get_list(
-                page=page,
-                per_page=CUSTOMERS_PER_PAGE,
-                query_params={
-                    "filter": filter_str,
-                    "sort": "-created"
-                }
-            )
-        else:
-            result = pb.collection(CUSTOMER_COLLECTION).get_list(
-                page=page,
-                per_page=CUSTOMERS_PER_PAGE,
-                query_params={
-                    "sort": "-created"
-                }
-            )
-
-        records = result.items
-        total_customers = result.total_items
-        total_pages = ceil(total_customers / CUSTOMERS_PER_PAGE)
+        # Fetch one page of customer records, newest first
+        pager = keyset_page(CUSTOMER_COLLECTION, CUSTOMERS_PER_PAGE, cursor=cursor,
+                            search_fields=('name', 'email', 'phone', 'customer_id'), search=search_query,
+                            skip_total=skip_total_requested())
+        total_customers = pager["total"]
+
+        # Materialised summary; count in one query until the fields are added
+        uncounted = [c["id"] for c in pager["items"] if c.get("inquiry_count") is None]
+        try:
+            counted = report_query('inquiry_counts', uncounted) if uncounted else {}
+        except (ClientResponseError, requests.RequestException) as e:
+            customer_log.warning("Could not count inquiries per customer: %s", e)
+            counted = {}
 
-        # Convert Record objects to dicts and add inquiry counts
+        # Add inquiry counts to the raw records
         customers_full = []
-        for c in records:
-            exported = vars(c)  # <-- converts Record to dictionary
-            
-            # Get inquiry count for this customer
-            try:
-                inquiry_count = len(pb.collection(INQUIRY_COLLECTION).get_full_list(
-                    query_params={"filter": f'customer_id = "{c.id}"'}
-                ))
-            except:
-                inquiry_count = 0
+        for exported in pager["items"]:
+            inquiry_count = exported.get("inquiry_count")
+            if inquiry_count is None:
+                inquiry_count = counted.get(exported["id"], 0)
             
             customers_full.append({
-                "id": c.id,
+                "id": exported["id"],
                 "customer_id": exported.get("customer_id", ""),
                 "name": exported.get("name", ""),
                 "email": exported.get("email", ""),
@@ -1773,46 +4644,27 @@ def customers():
                 "address": exported.get("address", ""),
                 "notes": exported.get("notes", ""),
                 "created": exported.get("created", None),
-                "inquiry_count": inquiry_count
+                "updated": exported.get("updated", None),
+                "inquiry_count": inquiry_count,
+                "open_count": exported.get("open_count", 0),
+                "total_amount": exported.get("total_amount", 0),
+                "last_inquiry_at": exported.get("last_inquiry_at") or None,
             })
 
         # Summary counts
-        now = datetime.now(timezone.utc)
-        recent_days_ago = now - timedelta(days=1)
-        one_week_ago = now - timedelta(days=7)
-        thirty_days_ago = now - timedelta(days=30)
+        counters, computed_at = summary_cache.get('customer_counters', customer_counters)
+        recent_count, weekly_count, monthly_count = counters
+        counters_as_of = datetime.fromtimestamp(computed_at, timezone.utc)
 
-        recent_customers = pb.collection(CUSTOMER_COLLECTION).get_full_list(
-            query_params={
-                "filter": f'created >= "{recent_days_ago.isoformat()}Z"',
-                "sort": "-created"
-            }
-        )
-        weekly_customers = pb.collection(CUSTOMER_COLLECTION).get_full_list(
-            query_params={
-                "filter": f'created >= "{one_week_ago.isoformat()}Z"',
-                "sort": "-created"
-            }
-        )
-        monthly_customers = pb.collection(CUSTOMER_COLLECTION).get_full_list(
-            query_params={
-                "filter": f'created >= "{thirty_days_ago.isoformat()}Z"',
-                "sort": "-created"
-            }
-        )
-
-        recent_count = len(recent_customers)
-        weekly_count = len(weekly_customers)
-        monthly_count = len(monthly_customers)
-
-    except ClientResponseError as e:
+    except (ClientResponseError, requests.RequestException) as e:
         flash(f"Error fetching customers: {e}", 'error')
         customers_full = []
         total_customers = 0
-        total_pages = 1
+        pager = {"next": None, "prev": None, "total": 0}
         recent_count = 0
         weekly_count = 0
         monthly_count = 0
+        counters_as_of = None
 
     return render_template(
         'customer.html',
@@ -1821,8 +4673,8 @@ def customers():
         recent_count=recent_count,
         weekly_count=weekly_count,
         monthly_count=monthly_count,
-        current_page=page,
-        total_pages=total_pages,
+        counters_as_of=counters_as_of,
+        pager=pager,
         search_query=search_query
     )
 
@@ -1912,6 +4764,8 @@ def edit_customer_page(customer_id):
             try:
                 # Update customer with new data
                 pb.collection(CUSTOMER_COLLECTION).update(customer_id, updated_data)
+                replica.reload(CUSTOMER_COLLECTION, customer_id)
+                customer_match_index.put(customer_id, updated_data)
                 flash("Customer updated successfully!", "success")
                 return redirect(url_for('customer_details', customer_id=customer_id))
                 
@@ -1938,6 +4792,23 @@ def edit_customer_page(customer_id):
     
     return render_template('edit_customer.html', customer=customer_data)
 
+@app.route('/api/customers/match')
+@login_required
+def match_customers():
+    matches = customer_match_index.match(
+        name=request.args.get('name', ''),
+        email=request.args.get('email', ''),
+        phone=request.args.get('phone', ''),
+        exclude=request.args.get('exclude'),
+        limit=min(request.args.get('limit', 10, type=int), 50),
+    )
+    return json_response(data=matches)
+
+@app.route('/api/customers/duplicates')
+@login_required
+def customer_duplicates():
+    return json_response(data=customer_match_index.duplicate_groups())
+
 @app.route('/add_customer', methods=['GET', 'POST'])
 @login_required
 def add_customer():
@@ -1947,6 +4818,15 @@ def add_customer():
         phone = request.form['phone']
         address = request.form.get('address', '')
         notes = request.form.get('notes', '')
+
+        # Same phone or email as an existing customer: show them and ask first
+        if not request.form.get('confirm_duplicate'):
+            duplicates = [m for m in customer_match_index.match(name=name, email=email, phone=phone)
+                          if 'phone' in m['reasons'] or 'email' in m['reasons']]
+            if duplicates:
+                flash("A customer with this phone number or email already exists.", 'warning')
+                return render_template('add_customer.html', form=request.form, duplicates=duplicates)
+
         customer_id = generate_next_customer_id()
 
         try:
@@ -1960,6 +4840,8 @@ def add_customer():
             }
             
             new_customer = pb.collection(CUSTOMER_COLLECTION).create(customer_data)
+            replica.reload(CUSTOMER_COLLECTION, new_customer.id)
+            customer_match_index.put(new_customer.id, customer_data)
             return flash_and_redirect('Customer added successfully!', 'success', 'customers')
             
         except ClientResponseError as e:
@@ -1975,11 +4857,585 @@ def delete_customer():
         return flash_and_redirect("Customer ID is required to delete.", "error", "customers")
 
     try:
-        pb.collection(CUSTOMER_COLLECTION).delete(customer_id)
-        return flash_and_redirect("Customer deleted successfully!", "success", "customers")
-    except ClientResponseError as e:
+        return flash_and_redirect(*cascade_message(cascade_delete(CUSTOMER_COLLECTION, customer_id), "customer"),
+                                  "customers")
+    except (ClientResponseError, requests.RequestException) as e:
         return flash_and_redirect(f"Error deleting customer: {e}", "error", "customers")
 
+# =============================================================================
+# CASCADING DELETES
+# =============================================================================
+# Deleting a customer or product also deletes the inquiries that point at it;
+# deleting a supplier detaches it from its products, which stay in the catalog
+# (the schema has no archived flag to park them under). Dependents are found
+# with one filtered read per rule and removed BULK_WRITE_CONCURRENCY at a time.
+# The parent goes last and only if every dependent went, so a failed delete
+# can simply be retried. Deletes with more than CASCADE_INLINE_LIMIT
+# dependents finish in a background thread; their progress is kept on the
+# worker that started them. The orphan sweep cleans up references left
+# behind by deletes made before this existed.
+
+cascade_log = logging.getLogger('rbl.cascade')
+
+# parent collection -> [(dependent collection, relation field, action)]
+CASCADE_RULES = {
+    CUSTOMER_COLLECTION: [(INQUIRY_COLLECTION, 'customer_id', 'delete')],
+    PRODUCT_COLLECTION: [(INQUIRY_COLLECTION, 'product_id', 'delete')],
+    SUPPLIER_COLLECTION: [(PRODUCT_COLLECTION, 'supplier', 'detach')],
+}
+CASCADE_READ_FIELDS = {INQUIRY_COLLECTION: "id,customer_id,product_id", PRODUCT_COLLECTION: "id,supplier"}
+CASCADE_JOBS_KEPT = 50
+
+cascade_jobs = OrderedDict()  # job id -> job dict, newest last
+cascade_jobs_lock = threading.Lock()
+
+def find_dependents(collection, record_id):
+    """[(dependent collection, field, action, records)] for one parent, one read per rule."""
+    return [
+        (dependent, field, action, pb.collection(dependent).get_full_list(batch=1000, query_params={
+            "filter": f'{field} ?= "{record_id}"', "fields": CASCADE_READ_FIELDS[dependent],
+        }))
+        for dependent, field, action in CASCADE_RULES[collection]
+    ]
+
+def cascade_plan(dependents):
+    """Dry-run summary of find_dependents() output."""
+    total = sum(len(records) for _, _, _, records in dependents)
+    return {
+        "dependents": [{"collection": dependent, "action": action, "count": len(records)}
+                       for dependent, _, action, records in dependents],
+        "total": total,
+        "background": total > CASCADE_INLINE_LIMIT,
+    }
+
+def forget_record(collection, record_id):
+    """Drop a deleted record from this worker's caches and indexes."""
+    replica.discard(collection, record_id)
+    if collection == PRODUCT_COLLECTION:
+        file_cache.discard_record(collection, record_id)
+        preview_cache.discard_record(collection, record_id)
+        supplier_product_index.discard(record_id)
+    elif collection == CUSTOMER_COLLECTION:
+        customer_match_index.discard(record_id)
+
+def _cascade_one(dependent, field, action, record, gone_ids, changed_by=None):
+    """Delete one dependent or strip `gone_ids` from its relation; returns an error or None."""
+    url = f"{POCKETBASE_URL}/api/collections/{dependent}/records/{record.id}"
+    try:
+        if action == 'delete':
+            resp = pb_http.delete(url, headers=HEADERS)
+            if resp.status_code not in (204, 404):
+                return f"{dependent} {record.id}: HTTP {resp.status_code}: {resp.text[:200]}"
+            forget_record(dependent, record.id)
+            if dependent == INQUIRY_COLLECTION and resp.status_code == 204:
+                record_status_transition(record.id, "", "", changed_by=changed_by)
+            return None
+        value = getattr(record, field, '')
+        remaining = [v for v in value if v not in gone_ids] if isinstance(value, list) else ''
+        resp = pb_http.patch(url, json={field: remaining}, headers=HEADERS)
+    except requests.RequestException as e:
+        return f"{dependent} {record.id}: {e}"
+    if resp.status_code == 404:
+        return None
+    if resp.status_code != 200:
+        return f"{dependent} {record.id}: HTTP {resp.status_code}: {resp.text[:200]}"
+    if dependent == PRODUCT_COLLECTION:
+        supplier_product_index.put(resp.json())
+    replica.put(dependent, resp.json())
+    return None
+
+def _remove_dependents(work, changed_by=None, deleted_customers=()):
+    """Run (dependent, field, action, record, gone_ids) items in parallel; returns (done, errors)."""
+    done, errors, customers = 0, [], set()
+    with ThreadPoolExecutor(max_workers=BULK_WRITE_CONCURRENCY, thread_name_prefix='cascade') as pool:
+        for item, error in zip(work, pool.map(lambda item: _cascade_one(*item, changed_by=changed_by), work)):
+            if error:
+                errors.append(error)
+                continue
+            done += 1
+            dependent, _, action, record, _ = item
+            if dependent == INQUIRY_COLLECTION and action == 'delete':
+                customers.add(getattr(record, 'customer_id', ''))
+    # Customers that lost inquiries (but still exist) need fresh summaries
+    schedule_summary_refresh(*(customers - set(deleted_customers)))
+    return done, errors
+
+def _run_cascade(job, dependents, changed_by):
+    collection, record_id = job["collection"], job["id"]
+    work = [(dependent, field, action, record, {record_id})
+            for dependent, field, action, records in dependents for record in records]
+    try:
+        job["removed"], errors = _remove_dependents(
+            work, changed_by, deleted_customers={record_id} if collection == CUSTOMER_COLLECTION else ())
+        if errors:
+            job.update(state="failed", failed=len(errors), errors=errors[:10])
+        else:
+            resp = pb_http.delete(f"{POCKETBASE_URL}/api/collections/{collection}/records/{record_id}",
+                                  headers=HEADERS)
+            if resp.status_code in (204, 404):
+                forget_record(collection, record_id)
+                job["state"] = "done"
+            else:
+                job.update(state="failed", errors=[f"HTTP {resp.status_code}: {resp.text[:200]}"])
+    except Exception as e:
+        cascade_log.exception("Cascade delete of %s %s failed", collection, record_id)
+        job.update(state="failed", errors=[str(e)])
+    job["finished_at"] = time.time()
+    cascade_log.info("Cascade delete of %s %s %s: %s of %s dependents removed", collection, record_id,
+                     job["state"], job["removed"], job["total"])
+
+def cascade_delete(collection, record_id):
+    """Delete a record and its dependents; returns the job, still "running" for large fan-outs."""
+    dependents = find_dependents(collection, record_id)
+    job = dict(cascade_plan(dependents), job_id=uuid.uuid4().hex, collection=collection, id=record_id,
+               state="running", removed=0, failed=0, errors=[], started_at=time.time(), finished_at=None)
+    changed_by = session.get('user_id', '') if has_request_context() else None
+    with cascade_jobs_lock:
+        cascade_jobs[job["job_id"]] = job
+        while len(cascade_jobs) > CASCADE_JOBS_KEPT:
+            cascade_jobs.popitem(last=False)
+    if job["background"]:
+        threading.Thread(target=_run_cascade, args=(job, dependents, changed_by),
+                         name=f"cascade-{record_id}", daemon=True).start()
+    else:
+        _run_cascade(job, dependents, changed_by)
+    return job
+
+def cascade_message(job, label):
+    """Flash text and category for a finished or started cascade_delete()."""
+    others = ", ".join(f"{d['count']} {d['collection'].lower()} {'detached' if d['action'] == 'detach' else 'deleted'}"
+                       for d in job["dependents"] if d["count"])
+    if job["state"] == "running":
+        return f"Deleting {label} and {job['total']} related records in the background.", "info"
+    if job["state"] == "failed":
+        return f"{label.capitalize()} was not deleted: {'; '.join(job['errors'][:3])}", "error"
+    return f"{label.capitalize()} deleted successfully!" + (f" ({others})" if others else ""), "success"
+
+def sweep_orphans(dry_run=False):
+    """Delete inquiries whose customer or product is gone and detach deleted suppliers from products.
+
+    Reads go through a client of its own signed in as admin: the shared `pb`
+    may hold a staff token that sees only part of a collection, and every
+    record it can't see would look deleted. Nothing is removed if that
+    sign-in or any read fails, or if a parent collection comes back empty
+    while records still point into it.
+    """
+    result = {"inquiries": 0, "products": 0, "failed": 0, "dry_run": dry_run}
+    ensure_admin_auth()  # the deletes go through the shared client
+    try:
+        client = PocketBase(POCKETBASE_URL)
+        client.admins.auth_with_password(os.getenv('POCKETBASE_ADMIN_EMAIL'), os.getenv('POCKETBASE_ADMIN_PASSWORD'))
+
+        def read(collection, fields):
+            return bulkhead_call(lambda: client.collection(collection).get_full_list(
+                batch=1000, query_params={"fields": fields}))
+
+        # Dependents first: a parent created after this read can't be referenced yet
+        inquiries = read(INQUIRY_COLLECTION, CASCADE_READ_FIELDS[INQUIRY_COLLECTION])
+        products = read(PRODUCT_COLLECTION, CASCADE_READ_FIELDS[PRODUCT_COLLECTION])
+        existing = {
+            CUSTOMER_COLLECTION: {r.id for r in read(CUSTOMER_COLLECTION, "id")},
+            SUPPLIER_COLLECTION: {r.id for r in read(SUPPLIER_COLLECTION, "id")},
+            PRODUCT_COLLECTION: {r.id for r in products},
+        }
+    except (ClientResponseError, BackendBusy) as e:
+        cascade_log.error("Orphan sweep skipped, could not read every collection as admin: %s", e)
+        return dict(result, refused=f"could not read every collection as admin: {e}")
+
+    referenced = {
+        CUSTOMER_COLLECTION: any(getattr(i, 'customer_id', '') for i in inquiries),
+        PRODUCT_COLLECTION: any(getattr(i, 'product_id', '') for i in inquiries),
+        SUPPLIER_COLLECTION: any(getattr(p, 'supplier', '') for p in products),
+    }
+    empty = [collection for collection, ids in existing.items() if not ids and referenced[collection]]
+    if empty:
+        cascade_log.error("Orphan sweep skipped, %s read back empty but still referenced", ", ".join(empty))
+        return dict(result, refused=f"{', '.join(empty)} read back empty but still referenced")
+
+    work = []
+    for inquiry in inquiries:
+        customer_id, product_id = getattr(inquiry, 'customer_id', ''), getattr(inquiry, 'product_id', '')
+        if (customer_id and customer_id not in existing[CUSTOMER_COLLECTION]) or \
+                (product_id and product_id not in existing[PRODUCT_COLLECTION]):
+            work.append((INQUIRY_COLLECTION, 'customer_id', 'delete', inquiry, set()))
+    for product in products:
+        value = getattr(product, 'supplier', '')
+        gone = {s for s in (value if isinstance(value, list) else [value]) if s} - existing[SUPPLIER_COLLECTION]
+        if gone:
+            work.append((PRODUCT_COLLECTION, 'supplier', 'detach', product, gone))
+
+    result["inquiries"] = sum(1 for item in work if item[0] == INQUIRY_COLLECTION)
+    result["products"] = sum(1 for item in work if item[0] == PRODUCT_COLLECTION)
+    if work and not dry_run:
+        orphaned_customers = {getattr(i, 'customer_id', '') for i in inquiries} - existing[CUSTOMER_COLLECTION]
+        _, errors = _remove_dependents(work, deleted_customers=orphaned_customers)
+        result["failed"] = len(errors)
+        for error in errors[:10]:
+            cascade_log.warning("Orphan sweep: %s", error)
+    cascade_log.info("Orphan sweep%s: %s orphaned inquiries, %s products with deleted suppliers, %s failed",
+                     " (dry run)" if dry_run else "", result["inquiries"], result["products"], result["failed"])
+    return result
+
+@app.cli.command('sweep-orphans')
+@click.option('--dry-run', is_flag=True, help='Only count what would be cleaned up.')
+def sweep_orphans_command(dry_run):
+    """Delete orphaned inquiries and detach deleted suppliers from products."""
+    result = sweep_orphans(dry_run=dry_run)
+    if result.get("refused"):
+        raise click.ClickException(f"Nothing cleaned up: {result['refused']}")
+    verb = "Would clean up" if dry_run else "Cleaned up"
+    click.echo(f"{verb} {result['inquiries']} inquiries and {result['products']} products ({result['failed']} failed)")
+
+@app.route('/api/cascade/<collection>/<record_id>')
+@login_required
+def cascade_preview(collection, record_id):
+    """Dry run: what deleting this record would also delete or detach."""
+    if collection not in CASCADE_RULES or not _RECORD_ID.match(record_id):
+        return json_response(message="Unknown record", success=False, status_code=404)
+    try:
+        plan = cascade_plan(find_dependents(collection, record_id))
+    except ClientResponseError as e:
+        return json_response(message=str(e), success=False, status_code=500)
+    return json_response(data=dict(plan, collection=collection, id=record_id))
+
+@app.route('/api/cascade/jobs/<job_id>')
+@login_required
+def cascade_job_status(job_id):
+    job = cascade_jobs.get(job_id)
+    if job is None:
+        return json_response(message="Unknown job (jobs are kept by the worker that started them)",
+                             success=False, status_code=404)
+    return json_response(data=job)
+
+# =============================================================================
+# REPORTS API ROUTES
+# =============================================================================
+
+REPORT_SORT_KEYS = ('inquiries', 'quantity', 'revenue', 'cost', 'margin', 'quoted')
+
+def _report_date(name):
+    value = request.args.get(name)
+    if value:
+        datetime.strptime(value, '%Y-%m-%d')  # ValueError -> 400
+    return value
+
+@app.route('/api/reports')
+@login_required
+def reports_index():
+    snapshot = get_analytics_snapshot()
+    return json_response(data={
+        'dimensions': REPORT_DIMENSIONS,
+        'sort_keys': REPORT_SORT_KEYS,
+        'inquiries': len(snapshot),
+        'as_of': snapshot.built_at.isoformat(),
+    })
+
+@app.route('/api/reports/<dimension>')
+@login_required
+def report_by(dimension):
+    """Revenue, cost and margin grouped by customer, supplier, product, status or month."""
+    if dimension not in REPORT_DIMENSIONS:
+        return json_response(message=f"Unknown report '{dimension}'", success=False, status_code=404)
+    sort = request.args.get('sort', 'key' if dimension == 'month' else 'revenue')
+    if sort not in REPORT_SORT_KEYS + ('key',):
+        return json_response(message=f"Cannot sort by '{sort}'", success=False, status_code=400)
+    try:
+        start, end = _report_date('from'), _report_date('to')
+    except ValueError:
+        return json_response(message="Dates must be YYYY-MM-DD", success=False, status_code=400)
+    limit = request.args.get('limit', 50, type=int)
+
+    snapshot = get_analytics_snapshot()
+    keep = snapshot.mask(start=start, end=end, status=request.args.get('status'),
+                         customer_id=request.args.get('customer_id'))
+    rows, totals = snapshot.group_by(dimension, keep, sort=sort, limit=limit if limit > 0 else None)
+    return json_response(data={
+        'dimension': dimension,
+        'as_of': snapshot.built_at.isoformat(),
+        'totals': totals,
+        'rows': rows,
+    })
+
+# =============================================================================
+# RESPONSE COMPRESSION
+# =============================================================================
+
+def _compressor(encoding):
+    """Return (compress_chunk, finish) callables for a streaming encoder."""
+    if encoding == 'br':
+        encoder = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        return encoder.process, encoder.finish
+    encoder = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+    return encoder.compress, encoder.flush
+
+def _stream_compressed(iterable, encoding):
+    compress, finish = _compressor(encoding)
+    try:
+        for chunk in iterable:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+def choose_response_encoding():
+    """Pick the best encoding the client accepts ('br', 'gzip' or None)."""
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+@app.after_request
+def compress_response(response):
+    if (not COMPRESSION_ENABLED
+            or request.method == 'HEAD'
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough  # send_file(): binary files, Range support
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_RESPONSE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_response_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _stream_compressed(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESSION_MIN_BYTES:
+            return response
+        compress, finish = _compressor(encoding)
+        response.set_data(compress(body) + finish())
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+# =============================================================================
+# POCKETBASE CALL TRACING
+# =============================================================================
+# Registered after compress_response so attach_pb_trace sees the uncompressed
+# body (Flask runs after_request hooks in reverse registration order).
+
+trace_log = logging.getLogger('rbl.trace')
+
+pb_traces = deque(maxlen=PB_TRACE_HISTORY)
+_UNTRACED_ENDPOINTS = {'static', 'fingerprinted_asset', 'metrics', 'pb_trace_list', 'pb_trace_detail'}
+
+def find_repeated_calls(calls, threshold=PB_TRACE_REPEAT_THRESHOLD):
+    """Group same-shape calls and return the groups that look like N+1 loops."""
+    groups = OrderedDict()
+    for call in calls:
+        groups.setdefault(call['shape'], []).append(call)
+    return [{
+        'shape': shape,
+        'count': len(group),
+        'total_ms': round(sum(c['duration_ms'] for c in group), 2),
+    } for shape, group in groups.items() if len(group) >= threshold]
+
+def server_timing_header(trace):
+    entries = [
+        f'pb;dur={trace["pb_ms"]};desc="{len(trace["calls"])} PocketBase calls"',
+        f'app;dur={trace["total_ms"]}',
+    ]
+    for i, repeat in enumerate(trace['repeated'], 1):
+        desc = f'{repeat["shape"].split("(", 1)[0]} x{repeat["count"]}'
+        entries.append(f'pb-repeat-{i};dur={repeat["total_ms"]};desc="{desc}"')
+    return ', '.join(entries)
+
+def _inject_trace_panel(response, trace):
+    """Append a collapsible JSON trace panel to an HTML page."""
+    body = response.get_data(as_text=True)
+    head, sep, tail = body.rpartition('</body>')
+    if not sep:
+        return
+    summary = f"PocketBase: {len(trace['calls'])} calls, {trace['pb_ms']} ms"
+    if trace['repeated']:
+        summary += f", {len(trace['repeated'])} repeated"
+    panel = (
+        '<details id="pb-trace-panel" style="position:fixed;right:0;bottom:0;z-index:9999;'
+        'max-width:48rem;max-height:60vh;overflow:auto;background:#111827;color:#e5e7eb;'
+        'font:12px monospace;padding:.5rem .75rem;opacity:.95">'
+        f'<summary>{escape(summary)}</summary><pre>{escape(json.dumps(trace, indent=2))}</pre></details>'
+    )
+    response.set_data(head + panel + sep + tail)
+
+@app.before_request
+def start_pb_trace():
+    if PB_TRACE and request.endpoint not in _UNTRACED_ENDPOINTS:
+        g.pb_trace = []
+
+@app.after_request
+def attach_pb_trace(response):
+    if 'pb_trace' not in g:
+        return response
+    calls = g.pop('pb_trace')
+    trace = {
+        'id': g.request_id,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'route': g.metrics_route,
+        'status': response.status_code,
+        'total_ms': round((time.perf_counter() - g.metrics_start) * 1000, 2),
+        'pb_ms': round(sum(c['duration_ms'] for c in calls), 2),
+        'calls': calls,
+        'repeated': find_repeated_calls(calls),
+    }
+    pb_traces.append(trace)
+
+    for repeat in trace['repeated']:
+        trace_log.warning("Possible N+1 on %s: %s called %s times (%s ms)",
+                          trace['route'], repeat['shape'], repeat['count'], repeat['total_ms'])
+
+    response.headers['Server-Timing'] = server_timing_header(trace)
+    if (PB_TRACE_PANEL and response.mimetype == 'text/html'
+            and not response.direct_passthrough and not response.is_streamed):
+        _inject_trace_panel(response, trace)
+    return response
+
+@app.route('/_debug/pb-traces')
+@login_required
+def pb_trace_list():
+    """Recent request traces, newest first, without the per-call detail."""
+    if not PB_TRACE:
+        abort(404)
+    summaries = [
+        {k: v for k, v in trace.items() if k != 'calls'} | {'call_count': len(trace['calls'])}
+        for trace in reversed(pb_traces)
+    ]
+    if request.args.get('repeated') == '1':
+        summaries = [t for t in summaries if t['repeated']]
+    return jsonify(summaries)
+
+@app.route('/_debug/pb-traces/<trace_id>')
+@login_required
+def pb_trace_detail(trace_id):
+    """Full call sequence for one traced request, by its X-Request-ID."""
+    if not PB_TRACE:
+        abort(404)
+    for trace in pb_traces:
+        if trace['id'] == trace_id:
+            return jsonify(trace)
+    abort(404)
+
+# =============================================================================
+# METRICS ROUTES
+# =============================================================================
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint."""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        abort(403)
+    return Response(
+        render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+        headers={'Cache-Control': 'no-store'}
+    )
+
+# =============================================================================
+# STATIC ASSET ROUTES
+# =============================================================================
+
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    """Serve a fingerprinted static file, precompressed when the client allows."""
+    asset = asset_files.get(filename)
+    if asset is None:
+        abort(404)
+
+    encoding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in asset['variants'] and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+
+    response = Response(asset['variants'][encoding], mimetype=asset['mimetype'])
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f"{asset['etag']}-{encoding}")
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response.make_conditional(request)
+
+# =============================================================================
+# FILE PROXY ROUTES
+# =============================================================================
+
+def _send_cached(cache, path, **kwargs):
+    """send_file() for a cached path, or None if the file was evicted since the lookup."""
+    try:
+        # Stats and (without USE_X_SENDFILE) opens the file right away; an open
+        # file survives a later eviction
+        return send_file(path, conditional=True, etag=True, **kwargs)
+    except FileNotFoundError:
+        cache.forget(path)
+        return None
+
+@app.route('/files/<collection>/<record_id>/<filename>')
+@login_required
+def proxy_file(collection, record_id, filename):
+    """Serve a PocketBase file from the local cache (supports Range requests)."""
+    if (collection not in PROXIED_FILE_COLLECTIONS
+            or not _SAFE_RECORD_ID.match(record_id)
+            or secure_filename(filename) != filename):
+        abort(404)
+
+    # conditional=True handles If-None-Match and Range. Servers whose
+    # wsgi.file_wrapper uses sendfile() (gunicorn, uWSGI) send the body from
+    # the kernel; the built-in dev server (`python app.py`) copies it in chunks
+    # unless USE_X_SENDFILE hands it to a fronting proxy. A second pass
+    # downloads the file again if another worker evicted it after the lookup.
+    for attempt in range(2):
+        try:
+            path = file_cache.fetch(collection, record_id, filename)
+        except requests.HTTPError as e:
+            abort(404 if e.response is not None and e.response.status_code == 404 else 502)
+        except requests.RequestException as e:
+            log.warning("Error fetching file %s/%s/%s: %s", collection, record_id, filename, e)
+            abort(502)
+        response = _send_cached(file_cache, path)
+        if response is not None:
+            break
+    else:
+        abort(502)
+    response.headers['Cache-Control'] = f'private, max-age={FILE_CACHE_MAX_AGE}, immutable'
+    return response
+
+@app.route('/previews/<collection>/<record_id>/<filename>')
+@login_required
+def preview_file(collection, record_id, filename):
+    """Serve a small JPEG thumbnail of a PocketBase file, rendering it if needed."""
+    if (collection not in PROXIED_FILE_COLLECTIONS
+            or not _SAFE_RECORD_ID.match(record_id)
+            or secure_filename(filename) != filename
+            or not thumbnails.can_preview(filename)):
+        abort(404)
+
+    path = preview_cache.get(preview_path_for(collection, record_id, filename))
+    response = _send_cached(preview_cache, path, mimetype='image/jpeg') if path else None
+    if response is None:
+        try:
+            path = schedule_preview(collection, record_id, filename).result(timeout=PREVIEW_WAIT_SECONDS)
+            response = _send_cached(preview_cache, path, mimetype='image/jpeg')
+        except Exception:
+            response = None
+        if response is None:
+            # No thumbnail (slow, unreadable, evicted or no worker): the browser scales the original
+            return redirect(url_for('proxy_file', collection=collection, record_id=record_id, filename=filename))
+
+    response.headers['Cache-Control'] = f'private, max-age={FILE_CACHE_MAX_AGE}, immutable'
+    return response
 
 # =============================================================================
 # ERROR HANDLERS
@@ -2025,9 +5481,14 @@ def datetimeformat(value):
 # APPLICATION STARTUP
 # =============================================================================
 
+# The scheduled jobs (reminders, orphan sweep) run in the process started by
+# `python app.py`, which is what the Docker image runs. When the app is served
+# some other way, nothing schedules them: run `flask sweep-orphans` from cron.
 if __name__ == '__main__':
     scheduler = BackgroundScheduler()
     scheduler.add_job(check_and_send_reminders, 'interval', minutes=1)
+    if ORPHAN_SWEEP_HOURS > 0:
+        scheduler.add_job(sweep_orphans, 'interval', hours=ORPHAN_SWEEP_HOURS)
     scheduler.start()
     app.run(host="0.0.0.0", port=5050, debug=DEV_MODE)
 
@@ -0,0 +1,86 @@
+# =============================================================================
+# RESPONSE COMPRESSION BENCHMARK
+# =============================================================================
+# Bytes on the wire and compression CPU cost for the heaviest HTML/JSON
+# routes, per encoding, against seeded fake PocketBase data.
+#
+#   python -m benchmarks.bench_compression [--scale 300] [--output results.json]
+
+import argparse
+import json
+import time
+
+from benchmarks.harness import start_app, logged_in_client
+from benchmarks.seed import seed
+
+ROUTES = [
+    '/api/inquiries?perPage=1000',
+    '/api/inquiries',
+    '/api/products',
+    '/api/customers',
+    '/product',
+    '/customers',
+    '/suppliers',
+    '/dashboard',
+]
+ENCODINGS = ['identity', 'gzip', 'br']
+
+def measure(module, client, repeat):
+    results = {}
+    for route in ROUTES:
+        row = {}
+        for encoding in ENCODINGS:
+            if encoding == 'br' and module.brotli is None:
+                continue
+            # CPU cost of the compression step alone, on the same body
+            plain = client.get(route, headers={'Accept-Encoding': 'identity'}).get_data()
+            with module.app.test_request_context(headers={'Accept-Encoding': encoding}):
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    if encoding != 'identity':
+                        compress, finish = module._compressor(encoding)
+                        compress(plain) + finish()
+                cpu_ms = (time.perf_counter() - start) * 1000 / repeat
+
+            response = client.get(route, headers={'Accept-Encoding': encoding})
+            row[encoding] = {
+                'status': response.status_code,
+                'bytes': len(response.get_data()),
+                'content_encoding': response.headers.get('Content-Encoding', 'identity'),
+                'compress_ms': round(cpu_ms, 3),
+            }
+        identity = row['identity']['bytes']
+        for encoding, r in row.items():
+            r['saved_pct'] = round(100 * (1 - r['bytes'] / identity), 1) if identity else 0.0
+        results[route] = row
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=300, help='number of seeded customers')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    fake, module = start_app()
+    try:
+        seed(fake, scale=args.scale)
+        results = measure(module, logged_in_client(module), args.repeat)
+    finally:
+        fake.stop()
+
+    print(f"{'route':<30}{'identity':>10}{'gzip':>10}{'saved':>7}{'cpu':>9}{'br':>10}{'saved':>7}{'cpu':>9}")
+    for route, row in results.items():
+        line = f"{route:<30}{row['identity']['bytes']:>10}"
+        for encoding in ('gzip', 'br'):
+            if encoding in row:
+                r = row[encoding]
+                line += f"{r['bytes']:>10}{r['saved_pct']:>6}%{r['compress_ms']:>6.2f}ms"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# =============================================================================
+# ROUTE BENCHMARK
+# =============================================================================
+# Latency, PocketBase call count and peak memory for the main pages, the
+# inquiries API and the reminder job, against seeded data at 1k/10k/100k
+# customers. Results are written as JSON so runs can be compared.
+#
+#   python -m benchmarks.bench_routes [--scale 1000 10000] [--repeat 10]
+#                                     [--output run.json] [--compare baseline.json]
+#
+# Peak memory is measured with tracemalloc in a separate, untimed run. The
+# fake PocketBase shares the process, so its response encoding is included.
+# Routes that scale quadratically are cut off after --budget seconds per run
+# (Linux SIGALRM) and recorded as timed out; slow routes get fewer repeats.
+
+import argparse
+import json
+import os
+import platform
+import signal
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from benchmarks.fake_pocketbase import FakePocketBase
+from benchmarks.harness import REPO_ROOT, start_app, logged_in_client, pocketbase_call_count, summarize, git_revision
+from benchmarks.seed import SCALES, ADMIN_EMAIL, seed, reset_reminders
+
+ROUTES = (
+    ('dashboard', '/dashboard'),
+    ('product_list', '/product'),
+    ('product_list_search', '/product?search=Valve'),
+    ('inquiries_api', '/api/inquiries'),
+    ('inquiries_api_search', '/api/inquiries?search=urgent'),
+    ('customers', '/customers'),
+    ('suppliers', '/suppliers'),
+)
+
+class BudgetExceeded(BaseException):
+    """Raised by SIGALRM; a BaseException so Flask's error handlers let it through."""
+
+@contextmanager
+def time_budget(seconds):
+    def expire(signum, frame):
+        raise BudgetExceeded()
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def measure(fake, module, fn, repeat, budget, before=None):
+    """Time fn up to `repeat` times after one warm-up run, then once more under tracemalloc."""
+    def run():
+        if before:
+            before()
+        calls, requests = pocketbase_call_count(module), fake.request_count
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        return result, elapsed, pocketbase_call_count(module) - calls, fake.request_count - requests
+
+    try:
+        with time_budget(budget):
+            result, first_ms, pb_calls, pb_requests = run()
+    except BudgetExceeded:
+        module._pb_call_state.depth = 0  # the interrupted call never unwound
+        return None, {'timed_out': True, 'budget_seconds': budget}
+
+    samples = []
+    for _ in range(max(1, min(repeat, int(budget * 1000 / max(first_ms, 1))))):
+        _, elapsed, pb_calls, pb_requests = run()
+        samples.append(elapsed)
+
+    if before:
+        before()
+    tracemalloc.start()
+    try:
+        with time_budget(budget * 3):  # tracing slows allocation-heavy code
+            fn()
+        peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    except BudgetExceeded:
+        module._pb_call_state.depth = 0
+        peak_kb = None
+    finally:
+        tracemalloc.stop()
+
+    return result, {
+        'latency': summarize(samples),
+        'samples': len(samples),
+        'pb_calls': pb_calls,
+        'pb_http_requests': pb_requests,
+        'peak_memory_kb': peak_kb,
+    }
+
+def print_stats(name, stats):
+    if stats.get('timed_out'):
+        print(f"  {name:<24}{'timed out after ' + str(stats['budget_seconds']) + ' s':>36}")
+        return
+    peak = f"{stats['peak_memory_kb']:.0f} KB" if stats['peak_memory_kb'] is not None else 'n/a'
+    print(f"  {name:<24}{stats['latency']['p50_ms']:>10.1f} ms{stats['pb_calls']:>7} calls{peak:>14}")
+
+def bench_scale(scale, repeat, budget):
+    fake = FakePocketBase().start()
+    try:
+        start = time.perf_counter()
+        counts = seed(fake, scale=scale)
+        seed_seconds = round(time.perf_counter() - start, 2)
+        _, module = start_app(fake)
+
+        admin = next(u for u in fake.collection('users').values() if u['email'] == ADMIN_EMAIL)
+        client = logged_in_client(module, user=admin)
+        routes = {}
+        for name, path in ROUTES:
+            response, stats = measure(fake, module, lambda: client.get(path), repeat, budget)
+            routes[name] = dict(stats, path=path)
+            if response is not None:
+                routes[name].update(status=response.status_code, bytes=len(response.data))
+            print_stats(name, stats)
+
+        # SMTP is outside the measurement; the job's PocketBase work is what scales
+        module.send_email = lambda *args: True
+        _, stats = measure(fake, module, module.check_and_send_reminders, repeat, budget,
+                           before=lambda: reset_reminders(fake))
+        routes['reminder_job'] = stats
+        print_stats('reminder_job', stats)
+        return {'seed_seconds': seed_seconds, 'counts': counts, 'routes': routes}
+    finally:
+        fake.stop()
+
+def compare(results, baseline):
+    """Print p50 latency and call-count changes against an earlier run."""
+    print(f"\n{'scale/route':<34}{'p50 before':>12}{'p50 after':>12}{'change':>9}{'calls':>14}")
+    for scale, run in results['scales'].items():
+        old_run = baseline.get('scales', {}).get(scale)
+        if not old_run:
+            continue
+        for name, stats in run['routes'].items():
+            old = old_run['routes'].get(name)
+            if not old or old.get('timed_out') or stats.get('timed_out'):
+                continue
+            before, after = old['latency']['p50_ms'], stats['latency']['p50_ms']
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"{scale + '/' + name:<34}{before:>9.1f} ms{after:>9.1f} ms{change:>+8.0f}%"
+                  f"{old['pb_calls']:>7} ->{stats['pb_calls']:>4}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, nargs='+', default=list(SCALES),
+                        help='customer counts to seed (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=60.0,
+                        help='seconds allowed per run before a route is recorded as timed out')
+    parser.add_argument('--output', help='JSON results file (default: benchmarks/results/routes-<time>.json)')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    args = parser.parse_args()
+
+    results = {
+        'benchmark': 'routes',
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'budget_seconds': args.budget,
+        'scales': {},
+    }
+    for scale in args.scale:
+        print(f"scale {scale}")
+        results['scales'][str(scale)] = bench_scale(scale, args.repeat, args.budget)
+
+    output = args.output or os.path.join(
+        REPO_ROOT, 'benchmarks', 'results', f"routes-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# =============================================================================
+# TEMPLATE RENDERING BENCHMARK
+# =============================================================================
+# Render time of the heavy list templates at 7 and 100 rows per page, with and
+# without the row fragment cache, plus cold template compile time with and
+# without the bytecode cache.
+#
+#   python -m benchmarks.bench_templates [--repeat 50] [--output results.json]
+
+import argparse
+import json
+
+from flask import render_template
+
+from benchmarks.harness import start_app, timed, summarize
+
+ROW_COUNTS = (7, 100)
+TEMPLATES = ('product_list.html', 'customer.html', 'suppliers.html')
+
+def product_rows(n):
+    return [{
+        "id": f"prod{i:011d}",
+        "product_id": f"PROD_2025_{i:04d}",
+        "name": f"Product {i}",
+        "description": "Synthetic product used for benchmarking",
+        "supplier": f"Supplier {i % 20}",
+        "supplier_id": f"supp{i % 20:011d}",
+        "supplier_data": {"name": f"Supplier {i % 20}", "email": "", "phone": "", "address": "", "notes": ""},
+        "model": f"M-{i}",
+        "price": str(100 + i),
+        "updated": "2025-01-01 00:00:00.000Z",
+        "supplier_updated": "2025-01-01 00:00:00.000Z",
+        "files": [f"/files/products/prod{i:011d}/spec_{i}.pdf", f"/files/products/prod{i:011d}/photo_{i}.jpg"],
+        "previews": [f"/previews/products/prod{i:011d}/spec_{i}.pdf", f"/previews/products/prod{i:011d}/photo_{i}.jpg"],
+    } for i in range(n)]
+
+def customer_rows(n):
+    return [{
+        "id": f"cust{i:011d}",
+        "customer_id": f"CUST_2025_{i:04d}",
+        "name": f"Customer {i}",
+        "email": f"customer{i}@example.com",
+        "phone": f"98{i:08d}",
+        "address": "Kathmandu",
+        "notes": "",
+        "created": None,
+        "updated": "2025-01-01 00:00:00.000Z",
+        "inquiry_count": i % 7,
+    } for i in range(n)]
+
+def supplier_rows(n):
+    return [{
+        "id": f"supp{i:011d}",
+        "name": f"Supplier {i}",
+        "email": f"supplier{i}@example.com",
+        "contact": f"98{i:08d}",
+        "handle": f"@supplier{i}",
+        "address": "Guangzhou",
+        "created": None,
+        "updated": "2025-01-01 00:00:00.000Z",
+        "product_count": i % 9,
+        "min_buying_rate": 50.0 + i if i % 9 else None,
+        "max_buying_rate": 150.0 + i if i % 9 else None,
+    } for i in range(n)]
+
+def first_page(module, rows):
+    """The pager keyset_page() returns for the first of several pages."""
+    return {
+        "items": rows,
+        "next": module.encode_cursor('next', "2025-01-01 00:00:00.000Z", rows[-1]["id"]),
+        "prev": None,
+        "total": len(rows) * 5,
+    }
+
+def page_context(module, template, n):
+    common = {"search_query": ""}
+    if template == 'product_list.html':
+        products = product_rows(n)
+        return dict(common, products=products, pager=first_page(module, products))
+    if template == 'customer.html':
+        customers = customer_rows(n)
+        return dict(common, customers=customers, pager=first_page(module, customers),
+                    count=n, recent_count=1, weekly_count=2, monthly_count=3)
+    suppliers = supplier_rows(n)
+    return dict(common, suppliers=suppliers, pager=first_page(module, suppliers),
+                total_suppliers=n * 5, active_suppliers=n * 5)
+
+def bench_rendering(module, repeat):
+    results = {}
+    with module.app.test_request_context('/'):
+        for template in TEMPLATES:
+            for n in ROW_COUNTS:
+                context = page_context(module, template, n)
+                render = lambda: render_template(template, **context)
+                render()  # compile outside the measurement
+
+                def uncached():
+                    module.fragment_cache.clear()
+                    render()
+
+                results[f"{template}@{n}"] = {
+                    "rows": n,
+                    "no_fragment_cache": summarize(timed(uncached, repeat)),
+                    "fragment_cache": summarize(timed(render, repeat)),
+                }
+    return results
+
+def bench_compile(module, repeat):
+    env = module.app.jinja_env
+    bytecode_cache = env.bytecode_cache
+
+    def load_all():
+        env.cache.clear()
+        for template in TEMPLATES + ('index.html',):
+            env.get_template(template)
+
+    env.bytecode_cache = None
+    cold = summarize(timed(load_all, repeat))
+    env.bytecode_cache = bytecode_cache
+    load_all()  # populate the on-disk bytecode cache
+    warm = summarize(timed(load_all, repeat))
+    return {"no_bytecode_cache": cold, "bytecode_cache": warm}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    fake, module = start_app()
+    try:
+        results = {
+            "render": bench_rendering(module, args.repeat),
+            "compile": bench_compile(module, max(args.repeat // 5, 5)),
+        }
+    finally:
+        fake.stop()
+
+    print(f"{'page':<28}{'no cache p50':>14}{'cached p50':>12}")
+    for name, r in results["render"].items():
+        print(f"{name:<28}{r['no_fragment_cache']['p50_ms']:>11.2f} ms{r['fragment_cache']['p50_ms']:>9.2f} ms")
+    c = results["compile"]
+    print(f"{'compile (4 templates)':<28}{c['no_bytecode_cache']['p50_ms']:>11.2f} ms{c['bytecode_cache']['p50_ms']:>9.2f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
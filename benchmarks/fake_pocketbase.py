@@ -0,0 +1,430 @@
+# =============================================================================
+# IN-PROCESS FAKE POCKETBASE
+# =============================================================================
+# A small threaded HTTP server implementing the parts of the PocketBase REST
+# API that app.py uses (auth, records list/filter/sort/expand, CRUD, files),
+# so the portal can be imported and exercised offline.
+
+import json
+import random
+import re
+import string
+import threading
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+def now_str():
+    """Current time in PocketBase's datetime format."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + 'Z'
+
+def new_id():
+    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=15))
+
+# -----------------------------------------------------------------------------
+# Filter expressions
+# -----------------------------------------------------------------------------
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<op>\?=|\?~|!=|!~|>=|<=|&&|\|\||[=~<>()])
+      | (?P<num>-?\d+(?:\.\d+)?)
+      | (?P<ident>[A-Za-z_@][\w.@]*)
+    )''', re.VERBOSE)
+
+def _tokenize(expr):
+    pos, tokens = 0, []
+    expr = expr.strip()
+    while pos < len(expr):
+        m = _TOKEN.match(expr, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Invalid filter near: {expr[pos:]}")
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'str':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        elif kind == 'num':
+            value = float(value)
+        tokens.append((kind, value))
+    return tokens
+
+def _compare(left, op, right):
+    if op.startswith('?'):
+        values = left if isinstance(left, list) else [left]
+        return any(_compare(v, op[1:], right) for v in values)
+    if isinstance(left, list):
+        left = left[0] if len(left) == 1 else ' '.join(map(str, left))
+    if op in ('~', '!~'):
+        found = str(right).lower() in str(left or '').lower()
+        return found if op == '~' else not found
+    if isinstance(right, float):
+        try:
+            left = float(left)
+        except (TypeError, ValueError):
+            return op == '!='
+    elif right is None:
+        left = left if left not in ('', []) else None
+    elif isinstance(right, bool):
+        left = bool(left)
+    else:
+        left = '' if left is None else str(left)
+        # PocketBase compares datetimes textually; tolerate the ISO "T" form
+        right = right.replace('T', ' ') if re.match(r'^\d{4}-\d\d-\d\dT', right) else right
+    if op == '=':
+        return left == right
+    if op == '!=':
+        return left != right
+    if left is None or right is None:
+        return False
+    if op == '>':
+        return left > right
+    if op == '>=':
+        return left >= right
+    if op == '<':
+        return left < right
+    if op == '<=':
+        return left <= right
+    raise ValueError(f"Unsupported operator {op}")
+
+class _FilterParser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        tok = self.peek()
+        self.pos += 1
+        return tok
+
+    def parse(self):
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise ValueError("Trailing tokens in filter")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == ('op', '||'):
+            self.take()
+            left, right = node, self.parse_and()
+            node = lambda r, a=left, b=right: a(r) or b(r)
+        return node
+
+    def parse_and(self):
+        node = self.parse_atom()
+        while self.peek() == ('op', '&&'):
+            self.take()
+            left, right = node, self.parse_atom()
+            node = lambda r, a=left, b=right: a(r) and b(r)
+        return node
+
+    def parse_value(self):
+        kind, value = self.take()
+        if kind == 'ident':
+            return {'true': True, 'false': False, 'null': None}.get(value, ('field', value))
+        return value
+
+    def parse_atom(self):
+        if self.peek() == ('op', '('):
+            self.take()
+            node = self.parse_or()
+            self.take()  # ')'
+            return node
+        left = self.parse_value()
+        kind, op = self.take()
+        if kind != 'op':
+            raise ValueError("Expected operator in filter")
+        right = self.parse_value()
+
+        def resolve(record, value):
+            if isinstance(value, tuple):
+                return record.get(value[1])
+            return value
+
+        return lambda r: _compare(resolve(r, left), op, resolve(r, right))
+
+def compile_filter(expr):
+    """Compile a PocketBase filter expression into a predicate over record dicts."""
+    if not expr or not expr.strip():
+        return lambda record: True
+    return _FilterParser(_tokenize(expr)).parse()
+
+# -----------------------------------------------------------------------------
+# Server
+# -----------------------------------------------------------------------------
+
+class FakePocketBase:
+    """Threaded fake PocketBase server holding collections in memory."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.collections = {}   # name -> {id: record}
+        self.files = {}         # (collection, record_id, filename) -> bytes
+        self.latency = latency  # artificial per-request delay in seconds
+        self.request_count = 0
+        self.versions = {}      # name -> write counter, keys the list cache
+        self._list_cache = {}   # (name, filter, sort) -> (version, records)
+        self.lock = threading.RLock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def collection(self, name):
+        # PocketBase resolves collection names case-insensitively
+        with self.lock:
+            return self.collections.setdefault(name.lower(), {})
+
+    def touch(self, name):
+        """Invalidate cached list results for a collection after a write."""
+        with self.lock:
+            key = name.lower()
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+    def insert(self, name, data, created=None):
+        """Insert a record directly (used by seeders); returns the stored record."""
+        ts = created or now_str()
+        record = {
+            'id': data.get('id') or new_id(),
+            'collectionId': name,
+            'collectionName': name,
+            'created': ts,
+            'updated': data.get('updated') or ts,
+        }
+        record.update({k: v for k, v in data.items() if k not in ('created', 'updated')})
+        self.collection(name)[record['id']] = record
+        self.touch(name)
+        return record
+
+    # -- request handling ------------------------------------------------------
+
+    def _matching(self, name, filter_expr, sort):
+        # get_full_list pages through the same query; filtering and sorting
+        # 100k+ records for every page would make large seeds unusable
+        cache_key = (name.lower(), filter_expr, sort)
+        version = self.versions.get(name.lower(), 0)
+        cached = self._list_cache.get(cache_key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        predicate = compile_filter(filter_expr)
+        records = [r for r in self.collection(name).values() if predicate(r)]
+        for key in reversed([k.strip() for k in sort.split(',') if k.strip()]):
+            field = key.lstrip('-+')
+            records.sort(key=lambda r: (r.get(field) is None, r.get(field, '')), reverse=key.startswith('-'))
+
+        if len(self._list_cache) >= 256:
+            self._list_cache.clear()
+        self._list_cache[cache_key] = (version, records)
+        return records
+
+    def _list(self, name, query):
+        records = self._matching(name, query.get('filter', ''), query.get('sort', ''))
+
+        page = max(int(query.get('page', 1)), 1)
+        per_page = min(max(int(query.get('perPage', 30)), 1), 1000)
+        items = records[(page - 1) * per_page: page * per_page]
+        skip_total = query.get('skipTotal') in ('1', 'true')
+        total = -1 if skip_total else len(records)
+        total_pages = -1 if skip_total else (len(records) + per_page - 1) // per_page
+        return {
+            'page': page,
+            'perPage': per_page,
+            'totalItems': total,
+            'totalPages': total_pages,
+            'items': [self._expand(r, query.get('expand', '')) for r in items],
+        }
+
+    def _expand(self, record, expand):
+        if not expand:
+            return record
+        out = dict(record)
+        out['expand'] = {}
+        for field in [f.strip() for f in expand.split(',') if f.strip()]:
+            ref = record.get(field)
+            for collection in self.collections.values():
+                if isinstance(ref, list):
+                    found = [collection[i] for i in ref if i in collection]
+                    if found:
+                        out['expand'][field] = found
+                        break
+                elif ref in collection:
+                    out['expand'][field] = collection[ref]
+                    break
+        return out
+
+    def _parse_body(self, handler):
+        length = int(handler.headers.get('Content-Length') or 0)
+        raw = handler.rfile.read(length) if length else b''
+        content_type = handler.headers.get('Content-Type', '')
+        fields, files = {}, []
+        if 'application/json' in content_type:
+            fields = json.loads(raw or b'{}')
+        elif 'application/x-www-form-urlencoded' in content_type:
+            for key, values in parse_qs(raw.decode(), keep_blank_values=True).items():
+                fields[key] = values if len(values) > 1 else values[0]
+        elif 'multipart/form-data' in content_type:
+            msg = BytesParser(policy=default_policy).parsebytes(
+                b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + raw
+            )
+            for part in msg.iter_parts():
+                key = part.get_param('name', header='content-disposition')
+                filename = part.get_filename()
+                if filename:
+                    files.append((key, filename, part.get_payload(decode=True)))
+                else:
+                    value = part.get_content()
+                    if key in fields:
+                        existing = fields[key]
+                        fields[key] = (existing if isinstance(existing, list) else [existing]) + [value]
+                    else:
+                        fields[key] = value
+        return fields, files
+
+    def _store_files(self, name, record, files):
+        for key, filename, content in files:
+            stem, dot, ext = filename.rpartition('.')
+            stored = f"{stem or ext}_{new_id()[:10]}{dot}{ext if stem else ''}"
+            self.files[(name, record['id'], stored)] = content
+            current = record.get(key) or []
+            if not isinstance(current, list):
+                current = [current]
+            record[key] = current + [stored]
+
+    def handle(self, handler, method):
+        if self.latency:
+            threading.Event().wait(self.latency)
+        with self.lock:
+            self.request_count += 1
+
+        parsed = urlparse(handler.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        path = unquote(parsed.path)
+
+        if path.endswith('/auth-with-password'):
+            fields, _ = self._parse_body(handler)
+            name = path.split('/')[3]
+            identity = fields.get('identity', '')
+            users = [u for u in self.collection(name).values() if u.get('email') == identity]
+            if name != '_superusers' and not users:
+                return 400, {'message': 'Failed to authenticate.'}
+            record = users[0] if users else {'id': 'superuser', 'email': identity}
+            return 200, {'token': f'token-{record["id"]}', 'record': record}
+
+        if path.endswith('/request-password-reset'):
+            return 204, None
+
+        if path == '/api/batch' and method == 'POST':
+            fields, _ = self._parse_body(handler)
+            results = []
+            for req in fields.get('requests', []):
+                status, body = self._record_request(req['method'], urlparse(req['url']).path, {}, req.get('body') or {}, [])
+                results.append({'status': status, 'body': body})
+            return 200, results
+
+        m = re.match(r'^/api/files/([^/]+)/([^/]+)/([^/]+)$', path)
+        if m:
+            content = self.files.get(m.groups())
+            if content is None:
+                return 404, {'message': 'File not found.'}
+            return 200, content
+
+        fields, files = ({}, []) if method in ('GET', 'DELETE') else self._parse_body(handler)
+        return self._record_request(method, path, query, fields, files)
+
+    def _record_request(self, method, path, query, fields, files):
+        m = re.match(r'^/api/collections/([^/]+)/records(?:/([^/]+))?$', path)
+        if not m:
+            return 404, {'message': 'Not found.'}
+        name, record_id = m.groups()
+        records = self.collection(name)
+
+        with self.lock:
+            if method == 'GET' and record_id is None:
+                try:
+                    return 200, self._list(name, query)
+                except ValueError as e:
+                    return 400, {'message': str(e)}
+            if method == 'GET':
+                record = records.get(record_id)
+                if record is None:
+                    return 404, {'message': "The requested resource wasn't found."}
+                return 200, self._expand(record, query.get('expand', ''))
+            if method == 'POST':
+                record = self.insert(name, fields)
+                self._store_files(name, record, files)
+                return 200, record
+            if method in ('PATCH', 'PUT'):
+                record = records.get(record_id)
+                if record is None:
+                    return 404, {'message': "The requested resource wasn't found."}
+                record.update({k: v for k, v in fields.items() if k not in ('id', 'created')})
+                self._store_files(name, record, files)
+                record['updated'] = now_str()
+                self.touch(name)
+                return 200, record
+            if method == 'DELETE':
+                if records.pop(record_id, None) is None:
+                    return 404, {'message': "The requested resource wasn't found."}
+                self.touch(name)
+                return 204, None
+        return 405, {'message': 'Method not allowed.'}
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # avoid 40ms delayed-ACK stalls on keep-alive
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, method):
+                status, body = fake.handle(self, method)
+                if isinstance(body, bytes):
+                    payload, content_type = body, 'application/octet-stream'
+                else:
+                    payload = b'' if body is None else json.dumps(body).encode()
+                    content_type = 'application/json'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def do_PATCH(self):
+                self._respond('PATCH')
+
+            def do_PUT(self):
+                self._respond('PUT')
+
+            def do_DELETE(self):
+                self._respond('DELETE')
+
+        return Handler
@@ -0,0 +1,89 @@
+# =============================================================================
+# BENCHMARK HARNESS
+# =============================================================================
+# Boots app.py against an in-process fake PocketBase so routes and templates
+# can be measured offline.
+
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import mean, median
+
+from benchmarks.fake_pocketbase import FakePocketBase
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_app(fake=None, **env):
+    """Start a fake PocketBase (unless given) and import app.py against it."""
+    fake = fake or FakePocketBase().start()
+    return fake, import_app(fake.url, **env)
+
+def import_app(pocketbase_url, **env):
+    """Import (or reload) app.py against a PocketBase URL with throwaway cache dirs."""
+    cache_root = tempfile.mkdtemp(prefix='rbl-bench-')
+    os.environ.update({
+        'POCKETBASE_URL': pocketbase_url,
+        'POCKETBASE_ADMIN_EMAIL': 'bench@example.com',
+        'POCKETBASE_ADMIN_PASSWORD': 'bench',
+        'SECRET_KEY': 'bench',
+        'DEV_MODE': 'False',
+        'FILE_CACHE_DIR': os.path.join(cache_root, 'files'),
+        'PREVIEW_CACHE_DIR': os.path.join(cache_root, 'previews'),
+        'TEMPLATE_CACHE_DIR': os.path.join(cache_root, 'jinja'),
+    })
+    os.environ.update({k: str(v) for k, v in env.items()})
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    if 'app' in sys.modules:
+        return importlib.reload(sys.modules['app'])
+    return importlib.import_module('app')
+
+def logged_in_client(module, role='admin', user=None):
+    """Flask test client with a logged-in session (as a seeded user record if given)."""
+    user = user or {'id': 'bench-user', 'email': 'bench@example.com', 'name': 'Bench', 'role': role}
+    client = module.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user['id']
+        session['_user_id'] = user['id']
+        session['user_email'] = user['email']
+        session['user_name'] = user['name']
+        session['user_role'] = user.get('role', role)
+    return client
+
+def pocketbase_call_count(module):
+    """Logical PocketBase calls recorded by app.py's metrics so far."""
+    with module.PB_CALLS.lock:
+        return sum(module.PB_CALLS.values.values())
+
+def timed(fn, repeat):
+    """Run fn `repeat` times; return per-call timings in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'mean_ms': round(mean(ordered), 3),
+        'p50_ms': round(median(ordered), 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+        'min_ms': round(ordered[0], 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+def git_revision():
+    """Short commit hash of the checkout being measured, if available."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
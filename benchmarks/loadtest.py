@@ -0,0 +1,276 @@
+# =============================================================================
+# LOAD TEST
+# =============================================================================
+# Concurrent virtual staff users walking a scripted journey through the real
+# pages and APIs:
+#
+#   log in -> dashboard -> search products -> open a product -> load the
+#   inquiry form's customer list -> create an inquiry -> advance its status
+#
+# By default a seeded fake PocketBase and the app (threaded WSGI server) are
+# started in their own processes so the load generator does not share their
+# GIL. Reports throughput, p50/p95/p99 latency and error rate per step.
+#
+#   python -m benchmarks.loadtest [--users 20] [--duration 60] [--scale 1000]
+#
+# To size real workers, start the fake on its own, point the app at it under
+# gunicorn, and aim the load test at that:
+#
+#   python -m benchmarks.loadtest --serve-pocketbase --scale 1000
+#   POCKETBASE_URL=<printed url> ... gunicorn -w 4 -b 127.0.0.1:5050 app:app
+#   python -m benchmarks.loadtest --target http://127.0.0.1:5050
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks.fake_pocketbase import FakePocketBase
+from benchmarks.harness import REPO_ROOT, import_app, summarize, git_revision
+from benchmarks.seed import ADMIN_EMAIL, STAFF_EMAILS, PRODUCT_WORDS, STATUSES, seed
+
+STEPS = ('login', 'dashboard', 'search_products', 'product_detail',
+         'load_customers', 'create_inquiry', 'advance_status')
+
+_PRODUCT_LINK = re.compile(r'href="/product/([a-z0-9]{15})"')
+
+class StepFailed(Exception):
+    pass
+
+# -----------------------------------------------------------------------------
+# Servers
+# -----------------------------------------------------------------------------
+
+def _serve_pocketbase(scale, conn):
+    fake = FakePocketBase().start()
+    seed(fake, scale=scale)
+    conn.send(fake.url)
+    fake.thread.join()
+
+def _serve_app(pocketbase_url, quiet, conn):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    if quiet:
+        # Before the import: app.py's log listener writes to the sys.stdout it finds then
+        sys.stdout = open(os.devnull, 'w')
+    module = import_app(pocketbase_url)
+    server = make_server('127.0.0.1', 0, module.app, threaded=True, request_handler=QuietHandler)
+    conn.send(f"http://127.0.0.1:{server.server_port}")
+    server.serve_forever()
+
+def start_process(target, *args):
+    """Run target in a forked daemon process and wait for the URL it reports."""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.get_context('fork').Process(target=target, args=args + (child,), daemon=True)
+    process.start()
+    if not parent.poll(600):
+        process.terminate()
+        raise RuntimeError(f"{target.__name__} did not start")
+    return process, parent.recv()
+
+# -----------------------------------------------------------------------------
+# Virtual users
+# -----------------------------------------------------------------------------
+
+class VirtualUser:
+    """One staff member repeating the journey until the deadline."""
+
+    def __init__(self, base_url, email, think, rng, timeout):
+        self.base_url = base_url
+        self.email = email
+        self.think = think
+        self.rng = rng
+        self.timeout = timeout
+        self.results = {step: [] for step in STEPS}  # (ms, error or None)
+        self.journeys = 0
+
+    def _step(self, name, method, path, check, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout,
+                                            allow_redirects=False, **kwargs)
+            value = check(response)
+            error = None
+        except (requests.RequestException, StepFailed, ValueError, KeyError) as e:
+            value, error = None, f"{type(e).__name__}: {e}"[:200]
+        self.results[name].append(((time.perf_counter() - start) * 1000, error))
+        if error:
+            raise StepFailed(error)
+        if self.think:
+            time.sleep(self.rng.uniform(0, self.think))
+        return value
+
+    @staticmethod
+    def _expect(response, status):
+        if response.status_code != status:
+            raise StepFailed(f"HTTP {response.status_code}")
+        return response
+
+    def journey(self):
+        self.session = requests.Session()
+        try:
+            def logged_in(r):
+                if r.status_code != 302 or not r.headers.get('Location', '').endswith('/dashboard'):
+                    raise StepFailed(f"login not redirected to dashboard (HTTP {r.status_code})")
+            self._step('login', 'POST', '/', logged_in, data={'email': self.email, 'password': 'loadtest'})
+            self._step('dashboard', 'GET', '/dashboard', lambda r: self._expect(r, 200))
+
+            word = self.rng.choice(PRODUCT_WORDS)
+            product_ids = self._step('search_products', 'GET', f'/product?search={word}',
+                                     lambda r: _PRODUCT_LINK.findall(self._expect(r, 200).text))
+            if not product_ids:
+                product_ids = _PRODUCT_LINK.findall(self.session.get(self.base_url + '/product').text)
+            if not product_ids:
+                raise StepFailed("no products to open")
+            product_id = self.rng.choice(product_ids)
+            self._step('product_detail', 'GET', f'/product/{product_id}', lambda r: self._expect(r, 200))
+
+            customers = self._step('load_customers', 'GET', '/api/customers',
+                                   lambda r: self._expect(r, 200).json()['data'])
+            if not customers:
+                raise StepFailed("no customers to quote")
+            inquiry_id = self._step('create_inquiry', 'POST', '/api/inquiries',
+                                    lambda r: self._expect(r, 201).json()['data']['id'],
+                                    json={'customer_id': self.rng.choice(customers)['id'],
+                                          'product_id': product_id,
+                                          'quantity': self.rng.randint(1, 100),
+                                          'remarks': 'load test'})
+            self._step('advance_status', 'PUT', f'/api/inquiries/{inquiry_id}',
+                       lambda r: self._expect(r, 200), json={'status': STATUSES[1]})
+            self.journeys += 1
+        except StepFailed:
+            pass  # recorded against the step; start the next journey
+        finally:
+            self.session.close()
+
+    def run(self, start_at, deadline):
+        time.sleep(max(0.0, start_at - time.time()))
+        while time.time() < deadline:
+            self.journey()
+
+# -----------------------------------------------------------------------------
+# Reporting
+# -----------------------------------------------------------------------------
+
+def report(users, started, finished):
+    elapsed = finished - started
+    steps = {}
+    for step in STEPS:
+        samples = [s for user in users for s in user.results[step]]
+        if not samples:
+            continue
+        errors = [s[1] for s in samples if s[1]]
+        steps[step] = {
+            'requests': len(samples),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'error_rate': round(len(errors) / len(samples), 4),
+            'latency': summarize([s[0] for s in samples]),
+            'errors': sorted(set(errors))[:5],
+        }
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'journeys_completed': sum(user.journeys for user in users),
+        'journeys_per_second': round(sum(user.journeys for user in users) / elapsed, 2),
+        'steps': steps,
+    }
+
+def print_report(result):
+    print(f"\n{'step':<18}{'reqs':>7}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>9}")
+    for step, s in result['steps'].items():
+        lat = s['latency']
+        print(f"{step:<18}{s['requests']:>7}{s['throughput_rps']:>9.1f}{lat['p50_ms']:>8.0f}ms"
+              f"{lat['p95_ms']:>8.0f}ms{lat['p99_ms']:>8.0f}ms{s['error_rate']:>8.1%}")
+        for error in s['errors']:
+            print(f"{'':<18}  {error}")
+    print(f"\n{result['journeys_completed']} journeys in {result['elapsed_seconds']} s "
+          f"({result['journeys_per_second']} journeys/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to keep starting journeys')
+    parser.add_argument('--ramp', type=float, default=5, help='seconds over which users are started')
+    parser.add_argument('--think', type=float, default=0.5, help='max random pause between steps (s)')
+    parser.add_argument('--timeout', type=float, default=30, help='per-request timeout (s)')
+    parser.add_argument('--scale', type=int, default=1000, help='customers to seed in the fake PocketBase')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for user choices')
+    parser.add_argument('--target', help='base URL of an already running app (skips starting one)')
+    parser.add_argument('--serve-pocketbase', action='store_true',
+                        help='only start the seeded fake PocketBase and print its URL')
+    parser.add_argument('--verbose', action='store_true', help="keep the app's console output")
+    parser.add_argument('--output', help='JSON results file (default: benchmarks/results/loadtest-<time>.json)')
+    args = parser.parse_args()
+
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    if args.serve_pocketbase:
+        process, url = start_process(_serve_pocketbase, args.scale)
+        print(f"fake PocketBase with {args.scale} customers at {url} (Ctrl+C to stop)")
+        try:
+            process.join()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    processes = []
+    base_url = args.target
+    try:
+        if not base_url:
+            process, pocketbase_url = start_process(_serve_pocketbase, args.scale)
+            processes.append(process)
+            process, base_url = start_process(_serve_app, pocketbase_url, not args.verbose)
+            processes.append(process)
+        print(f"{args.users} users against {base_url} for {args.duration:.0f} s")
+
+        emails = [ADMIN_EMAIL] + STAFF_EMAILS
+        users = [VirtualUser(base_url, emails[i % len(emails)], args.think,
+                             random.Random(args.seed + i), args.timeout)
+                 for i in range(args.users)]
+        started = time.time()
+        deadline = started + args.duration
+        threads = [threading.Thread(target=user.run, args=(started + args.ramp * i / args.users, deadline))
+                   for i, user in enumerate(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result = report(users, started, time.time())
+    finally:
+        for process in processes:
+            process.terminate()
+
+    print_report(result)
+    result.update({
+        'benchmark': 'loadtest',
+        'started': datetime.fromtimestamp(started, timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'target': args.target or 'local',
+        'users': args.users,
+        'duration_seconds': args.duration,
+        'ramp_seconds': args.ramp,
+        'think_seconds': args.think,
+        'scale': None if args.target else args.scale,
+    })
+    output = args.output or os.path.join(
+        REPO_ROOT, 'benchmarks', 'results', f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {output}")
+
+if __name__ == '__main__':
+    main()
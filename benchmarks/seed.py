@@ -0,0 +1,120 @@
+# =============================================================================
+# SYNTHETIC SEED DATA
+# =============================================================================
+# Deterministic customers/suppliers/products/inquiries/reminders for the fake
+# PocketBase. `scale` is the number of customers; other collections are sized
+# relative to it.
+
+import random
+from datetime import datetime, timedelta, timezone
+
+STATUSES = [
+    "Inquiry", "Quoting", "Quotation Finalized", "Payment Received",
+    "In Shipment", "Arrived KTM", "Delivered", "Closed",
+]
+
+FIRST_NAMES = ["Aarav", "Sita", "Ram", "Gita", "Hari", "Maya", "Bikash", "Anita", "Suman", "Kiran"]
+LAST_NAMES = ["Shrestha", "Thapa", "Gurung", "Rai", "Karki", "Adhikari", "Tamang", "Magar", "Joshi", "KC"]
+PRODUCT_WORDS = ["Valve", "Pump", "Motor", "Cable", "Switch", "Panel", "Bearing", "Filter", "Sensor", "Drill"]
+
+# Seeded login accounts; the fake PocketBase accepts any password
+ADMIN_EMAIL = "admin@example.com"
+STAFF_EMAILS = [f"staff{i}@example.com" for i in range(5)]
+
+# Customer counts the benchmark suite runs at
+SCALES = (1000, 10000, 100000)
+
+def _pb_time(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + 'Z'
+
+def seed(fake, scale=1000, seed_value=42, year=2025):
+    """Fill a FakePocketBase with `scale` customers and proportional related data."""
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+    counts = {
+        'users': 1 + len(STAFF_EMAILS),
+        'suppliers': max(scale // 20, 5),
+        'products': max(scale // 2, 10),
+        'Customers': scale,
+        'inquiries': scale * 3,
+        'reminders': max(scale // 10, 5),
+    }
+
+    def created_at():
+        return _pb_time(now - timedelta(days=rng.uniform(0, 365)))
+
+    fake.insert('users', {'email': ADMIN_EMAIL, 'name': "Admin", 'role': 'admin'}, created=created_at())
+    for i, email in enumerate(STAFF_EMAILS):
+        fake.insert('users', {'email': email, 'name': f"Staff {i}", 'role': 'staff'}, created=created_at())
+
+    suppliers = []
+    for i in range(counts['suppliers']):
+        suppliers.append(fake.insert('suppliers', {
+            'name': f"Supplier {i} Trading Co.",
+            'email': f"sales{i}@supplier.example.com",
+            'contact': f"+86 138{i:08d}",
+            'handle': f"@supplier{i}",
+            'address': "Guangzhou, China",
+            'notes': "",
+        }, created=created_at()))
+
+    products = []
+    for i in range(counts['products']):
+        buying = round(rng.uniform(10, 5000), 2)
+        products.append(fake.insert('products', {
+            'product_id': f"PROD_{year}_{i + 1:04d}",
+            'name': f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_WORDS)} {i}",
+            'description': "Industrial component",
+            'model': f"M-{rng.randint(100, 999)}-{i}",
+            'code': f"C{i:05d}",
+            'hs_code': f"{rng.randint(8400, 8599)}.{rng.randint(10, 99)}",
+            'buying_rate': str(buying),
+            'selling_rate': str(round(buying * rng.uniform(1.1, 1.6), 2)),
+            'price': str(round(buying * rng.uniform(1.2, 1.8), 2)),
+            'supplier': rng.choice(suppliers)['id'],
+            'uploaded_docs': [f"spec_{i}.pdf"] if i % 3 == 0 else [],
+        }, created=created_at()))
+
+    customers = []
+    for i in range(counts['Customers']):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        customers.append(fake.insert('Customers', {
+            'customer_id': f"CUST_{year}_{i + 1:04d}",
+            'name': f"{first} {last}",
+            'email': f"{first.lower()}.{last.lower()}{i}@example.com",
+            'phone': f"98{rng.randint(0, 99999999):08d}",
+            'address': "Kathmandu, Nepal",
+            'notes': "",
+        }, created=created_at()))
+
+    for i in range(counts['inquiries']):
+        customer, product = rng.choice(customers), rng.choice(products)
+        fake.insert('inquiries', {
+            'inquiry_no': f"INQ-{year}-{customer['customer_id'][-4:]}-{product['product_id'][-4:]}",
+            'customer_id': customer['id'],
+            'product_id': product['id'],
+            'quantity': rng.randint(1, 500),
+            'amount': "",
+            'remarks': rng.choice(["", "Urgent", "Sample first", "Repeat order"]),
+            'status': rng.choice(STATUSES),
+        }, created=created_at())
+
+    for i in range(counts['reminders']):
+        due = now + timedelta(minutes=rng.randint(-600, 6000))
+        fake.insert('reminders', {
+            'topic': f"Follow up #{i}",
+            'description': "Call the customer about the quotation",
+            'datetime': due.strftime('%Y-%m-%dT%H:%M'),
+            'email': STAFF_EMAILS[i % len(STAFF_EMAILS)],
+            'sent': due > now,
+        }, created=created_at())
+
+    return counts
+
+def reset_reminders(fake):
+    """Mark every past-due reminder unsent again so the reminder job has work to do."""
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M')
+    for reminder in fake.collection('reminders').values():
+        if reminder['datetime'] <= now:
+            reminder['sent'] = False
+    fake.touch('reminders')
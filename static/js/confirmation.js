@@ -0,0 +1,62 @@
+let confirmationCallback = null;
+
+function showConfirmationModal(options = {}) {
+  const {
+    title = 'Confirm Action',
+    message = 'Are you sure you want to proceed with this action?',
+    confirmText = 'Delete',
+    confirmClass = 'bg-gradient-to-r from-red-600 to-red-700 hover:from-red-700 hover:to-red-800',
+    callback = null
+  } = options;
+
+  document.getElementById('confirmationTitle').textContent = title;
+  document.getElementById('confirmationMessage').textContent = message;
+
+  const confirmButton = document.getElementById('confirmButton');
+  confirmButton.textContent = confirmText;
+  confirmButton.className = `flex-1 px-4 py-2 ${confirmClass} text-white font-medium rounded-lg focus:outline-none focus:ring-2 focus:ring-red-500 focus:ring-offset-2 transition-all`;
+
+  confirmationCallback = callback;
+  document.getElementById('confirmationModal').classList.remove('hidden');
+  document.getElementById('confirmationModal').classList.add('flex');
+}
+
+function closeConfirmationModal() {
+  document.getElementById('confirmationModal').classList.add('hidden');
+  document.getElementById('confirmationModal').classList.remove('flex');
+  confirmationCallback = null;
+}
+
+function confirmAction() {
+  if (confirmationCallback) {
+    confirmationCallback();
+  }
+  closeConfirmationModal();
+}
+
+// Close modal when clicking outside
+document.getElementById('confirmationModal').addEventListener('click', function(e) {
+  if (e.target === this) {
+    closeConfirmationModal();
+  }
+});
+
+// Sentence describing what deleting a record also removes, from the
+// server's dry run; empty if there is nothing else or the check fails
+function deleteImpact(collection, recordId) {
+  return fetch(`/api/cascade/${collection}/${recordId}`)
+    .then(response => response.json())
+    .then(result => {
+      if (!result.success || !result.data.total) {
+        return '';
+      }
+      const parts = result.data.dependents.filter(d => d.count).map(d =>
+        d.action === 'detach'
+          ? `${d.count} ${d.collection.toLowerCase()} will lose this link`
+          : `${d.count} ${d.collection.toLowerCase()} will also be deleted`
+      );
+      const background = result.data.background ? ' This will finish in the background.' : '';
+      return ` ${parts.join('; ')}.${background}`;
+    })
+    .catch(() => '');
+}
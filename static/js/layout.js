@@ -0,0 +1,95 @@
+// Sidebar toggle functionality
+const menuToggle = document.getElementById('menu-toggle');
+const sidebar = document.getElementById('sidebar');
+const sidebarOverlay = document.getElementById('sidebar-overlay');
+const mainContent = document.getElementById('main-content');
+
+// Initialize sidebar state based on screen size
+function initializeSidebar() {
+  if (window.innerWidth < 1024) {
+    // Mobile: sidebar closed by default
+    sidebar.classList.remove('open');
+    sidebar.classList.add('closed');
+    mainContent.classList.add('sidebar-closed');
+  } else {
+    // Desktop: sidebar open by default
+    sidebar.classList.add('open');
+    sidebar.classList.remove('closed');
+    mainContent.classList.remove('sidebar-closed');
+  }
+}
+
+function toggleSidebar() {
+  if (window.innerWidth < 1024) {
+    // Mobile behavior
+    sidebar.classList.toggle('open');
+    sidebarOverlay.classList.toggle('active');
+  } else {
+    // Desktop behavior
+    sidebar.classList.toggle('closed');
+    mainContent.classList.toggle('sidebar-closed');
+  }
+}
+
+function closeSidebar() {
+  if (window.innerWidth < 1024) {
+    sidebar.classList.remove('open');
+    sidebarOverlay.classList.remove('active');
+  } else {
+    sidebar.classList.add('closed');
+    mainContent.classList.add('sidebar-closed');
+  }
+}
+
+menuToggle.addEventListener('click', toggleSidebar);
+sidebarOverlay.addEventListener('click', closeSidebar);
+
+// User dropdown functionality
+const userMenuButton = document.getElementById('user-menu-button');
+const userDropdown = document.getElementById('user-dropdown');
+const dropdownArrow = document.getElementById('dropdown-arrow');
+
+function toggleUserDropdown() {
+  userDropdown.classList.toggle('active');
+  dropdownArrow.style.transform = userDropdown.classList.contains('active') ? 'rotate(180deg)' : 'rotate(0deg)';
+}
+
+function closeUserDropdown() {
+  userDropdown.classList.remove('active');
+  dropdownArrow.style.transform = 'rotate(0deg)';
+}
+
+userMenuButton.addEventListener('click', (e) => {
+  e.stopPropagation();
+  toggleUserDropdown();
+});
+
+// Close dropdown when clicking outside
+document.addEventListener('click', (e) => {
+  if (!userMenuButton.contains(e.target) && !userDropdown.contains(e.target)) {
+    closeUserDropdown();
+  }
+});
+
+// Close sidebar when clicking on nav links on mobile
+const navLinks = document.querySelectorAll('#sidebar a');
+navLinks.forEach(link => {
+  link.addEventListener('click', () => {
+    if (window.innerWidth < 1024) {
+      closeSidebar();
+    }
+  });
+});
+
+// Handle window resize
+window.addEventListener('resize', () => {
+  initializeSidebar();
+});
+
+// Initialize sidebar on page load
+initializeSidebar();
+
+// Show "as of" timestamps of cached figures in the browser's time zone
+document.querySelectorAll('time[data-as-of]').forEach(el => {
+  el.textContent = new Date(el.getAttribute('datetime')).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+});
@@ -0,0 +1,29 @@
+// "Load more" for cursor-paginated tables: fetch the next page, append its
+// rows to the table body named by data-load-more and take over its pager.
+// Falls back to a normal page load if anything goes wrong.
+document.addEventListener('click', async (event) => {
+  const link = event.target.closest('a[data-load-more]');
+  if (!link) return;
+  event.preventDefault();
+  link.classList.add('pointer-events-none', 'opacity-50');
+
+  try {
+    const response = await fetch(link.href, { headers: { 'Accept': 'text/html' } });
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    const page = new DOMParser().parseFromString(await response.text(), 'text/html');
+
+    const selector = link.dataset.loadMore;
+    document.querySelector(selector).append(...page.querySelector(selector).children);
+
+    const pager = link.closest('[data-pager]');
+    const nextPager = page.querySelector('[data-pager]');
+    if (nextPager) {
+      pager.replaceWith(document.importNode(nextPager, true));
+    } else {
+      pager.remove();
+    }
+  } catch (e) {
+    console.error('Load more failed', e);
+    window.location.href = link.href;
+  }
+});
@@ -0,0 +1,72 @@
+# =============================================================================
+# THUMBNAIL RENDERING
+# =============================================================================
+# Runs inside the preview process pool, so this module must stay importable
+# without Flask, PocketBase or any of app.py's startup side effects.
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
+PDF_EXTENSIONS = ('.pdf',)
+
+def can_preview(filename):
+    """Return True if a thumbnail can be rendered for this file type."""
+    name = filename.lower()
+    if Image is None:
+        return False
+    if name.endswith(IMAGE_EXTENSIONS):
+        return True
+    return pdfium is not None and name.endswith(PDF_EXTENSIONS)
+
+def _open_first_page(src_path, max_size):
+    pdf = pdfium.PdfDocument(src_path)
+    try:
+        page = pdf[0]
+        width, height = page.get_size()
+        # Render close to the target size instead of at full resolution
+        scale = max(max_size / max(width, height, 1) * 2, 0.1)
+        return page.render(scale=scale).to_pil()
+    finally:
+        pdf.close()
+
+def render_preview(src_path, dst_path, max_size):
+    """Write a JPEG thumbnail of src_path (image or first PDF page) to dst_path."""
+    is_pdf = src_path.lower().endswith(PDF_EXTENSIONS)
+    # Closed on the way out; workers live long enough to run out of handles
+    with (_open_first_page(src_path, max_size) if is_pdf else Image.open(src_path)) as img:
+        if not is_pdf:
+            img.draft('RGB', (max_size, max_size))  # cheap JPEG downscale on decode
+        img.thumbnail((max_size, max_size))
+        rgb = img if img.mode == 'RGB' else img.convert('RGB')
+
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        tmp_path = f"{dst_path}.tmp-{os.getpid()}"
+        rgb.save(tmp_path, 'JPEG', quality=80, optimize=True)
+    os.replace(tmp_path, dst_path)
+    return os.path.getsize(dst_path)
+
+def start_pool(workers):
+    """Start `workers` rendering processes from a fork server and return their executor."""
+    # The fork server is a fresh interpreter with only this module loaded, so
+    # workers never inherit locks held by the app's threads
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        pool.submit(can_preview, '').result()  # surface startup errors here
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    return pool